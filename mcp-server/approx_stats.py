@@ -0,0 +1,54 @@
+"""Error bounds for the approximate-answer MCP tools.
+
+All intervals are 95% (z = 1.96). They assume rows are sampled
+independently, which holds for TABLESAMPLE BERNOULLI and for ANALYZE's
+row sample. TABLESAMPLE SYSTEM samples whole pages, so on tables whose
+rows are physically clustered by the filtered column the true error can
+be larger than reported.
+"""
+
+import math
+from typing import Any, Dict, Optional, Tuple
+
+Z95 = 1.96
+
+
+def wilson_interval(successes: int, trials: int, z: float = Z95) -> Tuple[float, float]:
+    """Wilson score interval for a proportion; well-behaved near 0 and 1."""
+    if trials <= 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denom = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denom
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def fraction_estimate(matching: int, sampled: int, table_rows: Optional[float]) -> Dict[str, Any]:
+    """Fraction of rows matching a predicate, and the implied row count, from a sample."""
+    low, high = wilson_interval(matching, sampled)
+    result: Dict[str, Any] = {
+        'sample_rows': sampled,
+        'sample_matching': matching,
+        'fraction': round(matching / sampled, 6) if sampled else None,
+        'fraction_95ci': [round(low, 6), round(high, 6)],
+    }
+    if table_rows:
+        result['estimated_rows'] = round(matching / sampled * table_rows) if sampled else None
+        result['estimated_rows_95ci'] = [math.floor(low * table_rows), math.ceil(high * table_rows)]
+    return result
+
+
+def frequency_margin(freq: float, sample_rows: int, z: float = Z95) -> float:
+    """Half-width of the interval around a value frequency measured on *sample_rows* rows."""
+    if sample_rows <= 0:
+        return 1.0
+    return z * math.sqrt(max(freq * (1 - freq), 0.0) / sample_rows)
+
+
+def analyze_sample_rows(stats_target: int, table_rows: Optional[float]) -> int:
+    """Rows ANALYZE samples for a column: 300 x statistics target, at most the table."""
+    sample = 300 * max(stats_target, 1)
+    if table_rows is not None and table_rows >= 0:
+        sample = min(sample, int(table_rows))
+    return sample
@@ -0,0 +1,389 @@
+"""Thread-safe PostgreSQL connection pool for the MCP server tools.
+
+Unlike psycopg2's ``SimpleConnectionPool`` guarded by one global lock, the
+pool lock is held only for bookkeeping: connecting and validating happen
+outside it, so concurrent tool calls check out connections in parallel.
+When every connection is in use, callers wait (up to a timeout) for one to
+be returned instead of opening unpooled connections.
+
+Connections are not probed on every checkout. A connection is validated with
+``SELECT 1`` only after sitting idle longer than ``max_idle`` seconds, and is
+replaced once it is older than ``max_lifetime`` seconds.
+
+`PoolRouter` spreads checkouts over one pool per read replica, falling back
+to the primary's pool.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the checkout timeout."""
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        conn_params: Dict[str, Any],
+        minconn: int = 1,
+        maxconn: int = 20,
+        timeout: float = 10.0,
+        max_idle: float = 30.0,
+        max_lifetime: float = 1800.0,
+        name: str = 'primary',
+    ):
+        self.conn_params = conn_params
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.name = name
+
+        self._cond = threading.Condition()
+        # (connection, created_at, returned_at); most recently returned at the right
+        self._idle: Deque[Tuple[Any, float, float]] = deque()
+        # id(connection) -> created_at for checked-out connections
+        self._in_use: Dict[int, float] = {}
+        self._size = 0  # open + being-opened connections
+        self._waiting = 0
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connects': 0,
+            'discarded': 0,
+            'validation_failures': 0,
+        }
+        self._wait_total = 0.0
+
+        for _ in range(self.minconn):
+            with self._cond:
+                self._size += 1
+            self._put_idle(self._connect(), time.monotonic())
+
+    # ------------------------------------------------------------------
+    # Checkout / return
+    # ------------------------------------------------------------------
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a connection, waiting up to *timeout* seconds for one."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise psycopg2.InterfaceError("connection pool is closed")
+                    if self._idle:
+                        # LIFO keeps a small hot set and lets extras go idle
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1  # reserve the slot; connect outside the lock
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"No database connection available within {timeout:.1f}s "
+                            f"(pool '{self.name}' size {self.maxconn})"
+                        )
+                    waited = True
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if entry is None:
+                try:
+                    conn, created_at = self._connect(), time.monotonic()
+                except Exception:
+                    self._release_slot()
+                    raise
+            else:
+                conn, created_at, returned_at = entry
+                if not self._usable(conn, created_at, returned_at):
+                    self._discard(conn)
+                    continue  # try the next idle connection or open a new one
+
+            with self._cond:
+                self._in_use[id(conn)] = created_at
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['waits'] += 1
+                    self._wait_total += time.monotonic() - start
+            return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """Return a connection; *close* discards it (e.g. after a broken session)."""
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+        if created_at is None:
+            # Not ours (or returned twice); don't let it leak
+            logger.warning("Returned connection does not belong to the pool; closing it")
+            self._close_quietly(conn)
+            return
+
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+        if close or conn.closed or self._closed or time.monotonic() - created_at > self.max_lifetime:
+            self._discard(conn)
+            return
+        self._put_idle(conn, created_at)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.conn_params)
+        with self._cond:
+            self._stats['connects'] += 1
+        return conn
+
+    def _put_idle(self, conn, created_at: float) -> None:
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def _usable(self, conn, created_at: float, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - created_at > self.max_lifetime:
+            return False
+        if now - returned_at <= self.max_idle:
+            return True
+        # Idle long enough that the server or a proxy may have dropped it
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as exc:
+            logger.info(f"Discarding stale pooled connection: {exc}")
+            with self._cond:
+                self._stats['validation_failures'] += 1
+            return False
+
+    def _discard(self, conn) -> None:
+        self._close_quietly(conn)
+        with self._cond:
+            self._stats['discarded'] += 1
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Introspection / shutdown
+    # ------------------------------------------------------------------
+
+    def load(self) -> float:
+        """Share of the pool in use, counting callers waiting for a connection."""
+        with self._cond:
+            return (len(self._in_use) + self._waiting) / self.maxconn
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = self._stats['waits']
+            return {
+                'name': self.name,
+                'size': self._size,
+                'max': self.maxconn,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiting': self._waiting,
+                'avg_wait_ms': round(self._wait_total / waits * 1000, 1) if waits else 0.0,
+                **self._stats,
+            }
+
+    def closeall(self) -> None:
+        """Close idle connections now; checked-out ones are closed when returned."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+
+class PoolRouter:
+    """Routes read-only checkouts across a primary pool and replica pools.
+
+    Replicas are health-checked in the background every ``check_interval``
+    seconds. A replica counts as usable when it answers and its replay lag
+    is at most ``max_lag`` seconds. Checkouts go to a usable replica, chosen
+    by ``strategy``:
+
+      'least_loaded' — the replica with the lowest share of its pool in use
+      'round_robin'  — replicas in turn
+
+    They fall back to the primary when no replica is usable or the chosen
+    one fails to connect; a replica pool that is merely busy makes the
+    caller wait rather than spill onto the primary. Offers the same ``getconn``/``putconn``/``stats``/``closeall``
+    interface as `ConnectionPool`.
+    """
+
+    # Seconds a replica has been replaying behind the primary; 0 when it has
+    # applied everything it received (an idle primary writes no new WAL)
+    _LAG_SQL = """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """
+
+    def __init__(
+        self,
+        primary: ConnectionPool,
+        replicas: Optional[list] = None,
+        max_lag: float = 30.0,
+        check_interval: float = 10.0,
+        strategy: str = 'least_loaded',
+    ):
+        self.primary = primary
+        self.replicas = list(replicas or [])
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.strategy = strategy
+
+        self._lock = threading.Lock()
+        self._owners: Dict[int, ConnectionPool] = {}
+        self._health: Dict[str, Dict[str, Any]] = {
+            pool.name: {'usable': False, 'lag_s': None, 'error': 'not checked yet'} for pool in self.replicas
+        }
+        self._next = 0
+        self._routed = {'primary': 0, 'replica': 0, 'fallback': 0}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        if self.replicas:
+            self.check_replicas()
+            self._thread = threading.Thread(target=self._monitor, name='replica-health', daemon=True)
+            self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Health checks
+    # ------------------------------------------------------------------
+
+    def _monitor(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            self.check_replicas()
+
+    def check_replicas(self) -> None:
+        for pool in self.replicas:
+            try:
+                conn = pool.getconn(timeout=2.0)
+            except Exception as exc:
+                self._set_health(pool, False, None, str(exc))
+                continue
+            broken = False
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(self._LAG_SQL)
+                    lag = float(cur.fetchone()[0])
+                conn.rollback()
+                usable = lag <= self.max_lag
+                self._set_health(pool, usable, lag, None if usable else f"replay lag {lag:.1f}s > {self.max_lag}s")
+            except Exception as exc:
+                broken = True
+                self._set_health(pool, False, None, str(exc))
+            finally:
+                pool.putconn(conn, close=broken)
+
+    def _set_health(self, pool: ConnectionPool, usable: bool, lag: Optional[float], error: Optional[str]) -> None:
+        with self._lock:
+            previous = self._health[pool.name]['usable']
+            self._health[pool.name] = {'usable': usable, 'lag_s': None if lag is None else round(lag, 2), 'error': error}
+        if previous != usable:
+            logger.info(f"Replica '{pool.name}' is now {'usable' if usable else 'unusable'}{f': {error}' if error else ''}")
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def _pick_replica(self) -> Optional[ConnectionPool]:
+        with self._lock:
+            usable = [pool for pool in self.replicas if self._health[pool.name]['usable']]
+            if not usable:
+                return None
+            if self.strategy == 'round_robin':
+                self._next = (self._next + 1) % len(usable)
+                return usable[self._next]
+        return min(usable, key=lambda pool: pool.load())
+
+    def getconn(self, timeout: Optional[float] = None):
+        pool = self._pick_replica()
+        route = 'replica'
+        if pool is not None:
+            try:
+                conn = pool.getconn(timeout=timeout)
+            except PoolTimeout:
+                # Busy, not broken: keep agent load off the primary
+                raise
+            except Exception as exc:
+                logger.warning(f"Replica '{pool.name}' checkout failed, using primary: {exc}")
+                self._set_health(pool, False, None, str(exc))
+                pool, route = None, 'fallback'
+        else:
+            route = 'fallback' if self.replicas else 'primary'
+        if pool is None:
+            pool = self.primary
+            conn = pool.getconn(timeout=timeout)
+        with self._lock:
+            self._owners[id(conn)] = pool
+            self._routed[route] += 1
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        with self._lock:
+            pool = self._owners.pop(id(conn), self.primary)
+        pool.putconn(conn, close=close)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            health = {name: dict(h) for name, h in self._health.items()}
+            routed = dict(self._routed)
+        return {
+            **self.primary.stats(),
+            'routed': routed,
+            'replicas': [{**pool.stats(), **health[pool.name]} for pool in self.replicas],
+        }
+
+    def closeall(self) -> None:
+        self._stop.set()
+        for pool in [self.primary] + self.replicas:
+            pool.closeall()
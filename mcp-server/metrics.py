@@ -0,0 +1,179 @@
+"""In-process metrics for the MCP server, rendered in Prometheus text format.
+
+A deliberately small registry (counters and histograms with labels) so the
+server needs no metrics dependency; `render()` produces the body served at
+``GET /metrics``. Values live in the process: on Cloud Run each instance
+reports its own, and Prometheus sums them across instances.
+
+`SlowQueryLog` keeps the most recent tool calls slower than a threshold,
+with their SQL, for finding the queries behind tail latency.
+"""
+
+import bisect
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers pool checkouts (ms) through statement timeouts (tens of s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{_labels(self.labels, key)} {_number(value)}' for key, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, key)} {_number(round(total, 6))}')
+            lines.append(f'{self.name}_count{_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+class Collected:
+    """Values read from a callback at scrape time, e.g. current pool sizes.
+
+    *collect()* returns ``(label values, value)`` pairs; *kind* is the
+    Prometheus type, 'gauge' or 'counter' for totals kept elsewhere.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]],
+        kind: str = 'gauge',
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines += [f'{self.name}{_labels(self.labels, key)} {_number(value)}' for key, value in self.collect()]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def collected(self, name: str, help: str, labels: Sequence[str], collect, kind: str = 'gauge') -> Collected:
+        return self.register(Collected(name, help, labels, collect, kind))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            try:
+                lines += metric.render()
+            except Exception as exc:  # a failing gauge callback must not break the scrape
+                lines.append(f'# {metric.name} unavailable: {_escape(exc)}')
+        return '\n'.join(lines) + '\n'
+
+
+class SlowQueryLog:
+    """The last *max_samples* calls that took at least *threshold_ms*."""
+
+    def __init__(self, threshold_ms: float = 1000.0, max_samples: int = 50, max_sql_chars: int = 2000):
+        self.threshold_ms = threshold_ms
+        self.max_sql_chars = max_sql_chars
+        self._lock = threading.Lock()
+        self._samples: Deque[Dict[str, Any]] = deque(maxlen=max(max_samples, 1))
+        self.enabled = max_samples > 0
+
+    def record(self, tool: str, duration_ms: float, sql: Optional[str], error: Optional[str] = None) -> bool:
+        """Keep the call if it was slow; returns whether it was."""
+        if not self.enabled or duration_ms < self.threshold_ms:
+            return False
+        sample = {
+            'at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'tool': tool,
+            'duration_ms': round(duration_ms, 1),
+            'sql': sql[:self.max_sql_chars] if sql else None,
+        }
+        if error:
+            sample['error'] = error
+        with self._lock:
+            self._samples.append(sample)
+        return True
+
+    def samples(self) -> List[Dict[str, Any]]:
+        """Newest first."""
+        with self._lock:
+            return list(reversed(self._samples))
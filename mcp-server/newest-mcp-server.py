@@ -1,15 +1,31 @@
 import asyncio
+import base64
+import functools
+import hashlib
+import inspect
 import logging
 import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from fastmcp import FastMCP 
+from starlette.responses import JSONResponse, PlainTextResponse
 import json
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import urllib.parse
 import urllib.request
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.sql import SQL, Composable, Identifier, Literal
+
+from approx_stats import analyze_sample_rows, fraction_estimate, frequency_margin
+from metrics import Registry, SlowQueryLog
+from plan_summary import summarize_plan
+from query_cache import QueryCache, is_cacheable, referenced_tables
+from result_format import check_format, dumps, encode_rows, rows_payload
+from schema_catalog import SchemaCatalog
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(format="[%(levelname)s]: %(message)s", level=logging.INFO)
@@ -19,78 +35,597 @@ mcp = FastMCP("MCP Server on Cloud Run", stateless_http=True)
 load_dotenv(override=True)
 
 # Database configuration
-from psycopg2.pool import SimpleConnectionPool
 import threading
+from db_pool import ConnectionPool, PoolRouter, PoolTimeout
 
 DB_URL = os.getenv('DATABASE_URL')
 
 # Connection pool for better connection management
+#   PG_POOL_MIN / PG_POOL_MAX  — connections opened at start / upper bound (5 / 20)
+#   PG_POOL_TIMEOUT            — seconds a tool call waits for a free connection (10)
+#   PG_POOL_MAX_IDLE           — idle seconds after which a connection is re-validated (30)
+#   PG_POOL_MAX_LIFETIME       — seconds after which a connection is replaced (1800)
+#   DATABASE_REPLICA_URLS      — comma-separated read-replica DSNs; tools read from these
+#   PG_REPLICA_STRATEGY        — 'least_loaded' (default) or 'round_robin'
+#   PG_REPLICA_MAX_LAG         — seconds of replay lag before a replica is skipped (30)
+#   PG_REPLICA_CHECK_INTERVAL  — seconds between replica health checks (10)
 connection_pool = None
-pool_lock = threading.Lock()
+pool_lock = threading.Lock()  # guards pool creation only
+
+
+# Tools are async so the event loop keeps serving other requests; their
+# blocking psycopg2 work runs on this bounded pool. Sized to the connection
+# pool by default, since a thread without a connection would only wait.
+MCP_TOOL_THREADS = int(os.getenv('MCP_TOOL_THREADS', os.getenv('PG_POOL_MAX', '20')))
+_tool_executor = ThreadPoolExecutor(max_workers=MCP_TOOL_THREADS, thread_name_prefix='mcp-tool')
+
+# Calls waiting for a tool thread / running on one (for /healthz and /metrics)
+_tool_calls = {'queued': 0, 'running': 0}
+_tool_calls_lock = threading.Lock()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking callable on the tool thread pool and await its result."""
+    # 'queued' until a thread picks the call up, then 'running'
+    state = ['queued']
+
+    def call():
+        with _tool_calls_lock:
+            _tool_calls['queued'] -= 1
+            _tool_calls['running'] += 1
+            state[0] = 'running'
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with _tool_calls_lock:
+                _tool_calls['running'] -= 1
+                state[0] = 'done'
+
+    with _tool_calls_lock:
+        _tool_calls['queued'] += 1
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_tool_executor, call)
+    finally:
+        with _tool_calls_lock:
+            if state[0] == 'queued':  # cancelled before a thread took it
+                _tool_calls['queued'] -= 1
+                state[0] = 'done'
+
+
+def tool_thread_stats() -> Dict[str, int]:
+    with _tool_calls_lock:
+        return {'max': MCP_TOOL_THREADS, **_tool_calls}
+
+
+# ---------------------------------------------------------------------------
+# Metrics (GET /metrics, Prometheus text format)
+# ---------------------------------------------------------------------------
+#   PG_SLOW_QUERY_MS      — tool calls at least this slow are logged as [SLOW] and
+#                           kept as samples at GET /metrics/slow_queries (1000)
+#   PG_SLOW_QUERY_SAMPLES — samples kept, newest first (50; 0 disables them)
+
+metrics = Registry()
+TOOL_CALLS = metrics.counter('mcp_tool_calls_total', 'Tool calls by outcome.', ('tool', 'status'))
+TOOL_DURATION = metrics.histogram('mcp_tool_duration_seconds', 'Tool call latency.', ('tool',))
+TOOL_ERRORS = metrics.counter('mcp_tool_errors_total', 'Failed tool calls by exception class.', ('tool', 'error'))
+ROWS_RETURNED = metrics.counter('mcp_tool_rows_returned_total', 'Result rows returned to clients.', ('tool',))
+BYTES_RETURNED = metrics.counter('mcp_tool_response_bytes_total', 'UTF-8 bytes of tool results.', ('tool',))
+SLOW_CALLS = metrics.counter('mcp_slow_tool_calls_total', 'Tool calls slower than PG_SLOW_QUERY_MS.', ('tool',))
+POOL_WAIT = metrics.histogram(
+    'mcp_pool_checkout_wait_seconds', 'Time to check out a database connection.',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+slow_queries = SlowQueryLog(
+    threshold_ms=float(os.getenv('PG_SLOW_QUERY_MS', '1000')),
+    max_samples=int(os.getenv('PG_SLOW_QUERY_SAMPLES', '50')),
+)
+
+
+def _pools() -> List[Dict[str, Any]]:
+    stats = pool_stats()
+    if 'name' not in stats:  # not initialized yet
+        return []
+    return [stats] + stats.get('replicas', [])
+
+
+metrics.collected(
+    'mcp_pool_connections', 'Pooled database connections by state.', ('pool', 'state'),
+    lambda: [((p['name'], state), p[state]) for p in _pools() for state in ('in_use', 'idle', 'waiting')],
+)
+metrics.collected('mcp_pool_size', 'Open database connections.', ('pool',),
+                  lambda: [((p['name'],), p['size']) for p in _pools()])
+metrics.collected('mcp_pool_max_size', 'Configured maximum connections.', ('pool',),
+                  lambda: [((p['name'],), p['max']) for p in _pools()])
+metrics.collected('mcp_pool_timeouts_total', 'Checkouts that gave up waiting.', ('pool',),
+                  lambda: [((p['name'],), p['timeouts']) for p in _pools()], kind='counter')
+metrics.collected('mcp_replica_lag_seconds', 'Replay lag at the last replica health check.', ('pool',),
+                  lambda: [((p['name'],), p['lag_s']) for p in _pools()[1:] if p.get('lag_s') is not None])
+metrics.collected('mcp_tool_threads_queued', 'Tool calls waiting for a tool thread.', (),
+                  lambda: [((), tool_thread_stats()['queued'])])
+metrics.collected('mcp_tool_threads_running', 'Tool calls running on a tool thread.', (),
+                  lambda: [((), tool_thread_stats()['running'])])
+
+
+def _call_sql(signature: inspect.Signature, args, kwargs) -> Optional[str]:
+    """The SQL a tool call ran, for slow-query samples."""
+    try:
+        arguments = signature.bind_partial(*args, **kwargs).arguments
+    except TypeError:
+        return None
+    if arguments.get('sql'):
+        return arguments['sql']
+    if arguments.get('statements'):
+        return ';\n'.join(arguments['statements'])
+    if arguments.get('where'):
+        return f"FROM {arguments.get('table')} WHERE {arguments['where']}"
+    return None
+
+
+def instrumented(fn):
+    """Count, time and size an async tool's calls; below ``@mcp.tool()``."""
+    tool = fn.__name__
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        error = None
+        try:
+            result = await fn(*args, **kwargs)
+            if isinstance(result, str):
+                BYTES_RETURNED.inc(len(result.encode('utf-8')), tool=tool)
+            return result
+        except Exception as exc:
+            error = type(exc).__name__
+            TOOL_ERRORS.inc(tool=tool, error=error)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            TOOL_CALLS.inc(tool=tool, status='error' if error else 'ok')
+            TOOL_DURATION.observe(elapsed, tool=tool)
+            if elapsed * 1000 >= slow_queries.threshold_ms:
+                SLOW_CALLS.inc(tool=tool)
+                sql = _call_sql(signature, args, kwargs)
+                slow_queries.record(tool, elapsed * 1000, sql, error)
+                logger.warning(f"[SLOW] tool={tool} duration_ms={elapsed * 1000:.0f} query={(sql or '')[:300]!r}")
+
+    return wrapper
+
+
+# Optional result cache for repeated read-only queries (off by default)
+#   PG_CACHE_ENABLED     — '1' to cache pg_query results in memory
+#   PG_CACHE_TTL         — default seconds a result stays fresh (60)
+#   PG_CACHE_TABLE_TTLS  — per-table overrides, e.g. "emails=15,companies=3600";
+#                          0 never caches queries reading that table
+#   PG_CACHE_MAX_ENTRIES / PG_CACHE_MAX_BYTES — LRU bounds (512 / 32 MiB)
+def _parse_table_ttls(spec: str) -> Dict[str, float]:
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        table, _, ttl = item.partition('=')
+        ttls[table.strip()] = float(ttl)
+    return ttls
+
+
+query_cache = None
+if os.getenv('PG_CACHE_ENABLED') == '1':
+    query_cache = QueryCache(
+        ttl=float(os.getenv('PG_CACHE_TTL', '60')),
+        max_entries=int(os.getenv('PG_CACHE_MAX_ENTRIES', '512')),
+        max_bytes=int(os.getenv('PG_CACHE_MAX_BYTES', str(32 * 1024 * 1024))),
+        table_ttls=_parse_table_ttls(os.getenv('PG_CACHE_TABLE_TTLS', '')),
+    )
+
+
+@mcp.tool()
+@instrumented
+async def pg_cache_invalidate(table: Optional[str] = None) -> str:
+    """Drop cached pg_query results that read `table` (all results if omitted)."""
+    if query_cache is None:
+        return dumps({'enabled': False, 'invalidated': 0})
+    return dumps({'enabled': True, 'invalidated': query_cache.invalidate(table)})
+
+
+# Per-transaction limits for every tool query
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv('PG_STATEMENT_TIMEOUT_MS', '15000'))
+PG_WORK_MEM = os.getenv('PG_WORK_MEM', '16MB')
+
+# Pre-flight guard on pg_query, using the planner's EXPLAIN estimates
+#   PG_GUARD_MODE        — 'reject' (default), 'limit' (wrap in LIMIT, then reject) or 'off'
+#   PG_GUARD_MAX_COST    — max estimated total cost (default 1,000,000)
+#   PG_GUARD_MAX_ROWS    — max estimated result rows (default 100,000); paged results
+#                          (pg_query pages) are only held to it in 'limit' mode
+#   PG_GUARD_AUTO_LIMIT  — LIMIT applied in 'limit' mode (default 1000)
+PG_GUARD_MODE = os.getenv('PG_GUARD_MODE', 'reject').lower()
+PG_GUARD_MAX_COST = float(os.getenv('PG_GUARD_MAX_COST', '1000000'))
+PG_GUARD_MAX_ROWS = float(os.getenv('PG_GUARD_MAX_ROWS', '100000'))
+PG_GUARD_AUTO_LIMIT = int(os.getenv('PG_GUARD_AUTO_LIMIT', '1000'))
+
+# ---------------------------------------------------------------------------
+# Schema introspection
+# ---------------------------------------------------------------------------
+#   PG_SCHEMA_NAMESPACES     — comma-separated schemas to describe (default public)
+#   PG_SCHEMA_TTL            — seconds before the cached catalog is reloaded anyway (3600)
+#   PG_SCHEMA_CHECK_INTERVAL — seconds between DDL fingerprint checks (30)
+
+def _catalog_query(sql: Any, params: Any = None) -> List[tuple]:
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            _begin_read_only(cur)
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        return_db_connection(conn)
+
+
+schema_catalog = SchemaCatalog(
+    _catalog_query,
+    schemas=[name.strip() for name in os.getenv('PG_SCHEMA_NAMESPACES', 'public').split(',') if name.strip()],
+    ttl=float(os.getenv('PG_SCHEMA_TTL', '3600')),
+    check_interval=float(os.getenv('PG_SCHEMA_CHECK_INTERVAL', '30')),
+)
+
+
+@mcp.tool()
+@instrumented
+async def pg_schema(tables: Optional[List[str]] = None) -> str:
+    """Describe the database schema.
+
+    Without `tables`: every table and view with its estimated row count and
+    description. With `tables=[...]`: each table's columns (name, type,
+    PK / NOT NULL), unique keys, foreign keys it `references` and tables
+    `referenced_by` it. Call this before writing SQL against unfamiliar
+    tables; unknown names come back with suggestions.
+    """
+    if tables:
+        return dumps(await run_blocking(schema_catalog.describe, tables))
+    return dumps(await run_blocking(schema_catalog.overview))
+
+
+# Statements accepted by one pg_query_batch call
+PG_BATCH_MAX_STATEMENTS = int(os.getenv('PG_BATCH_MAX_STATEMENTS', '10'))
+
+# Row cap per pg_query page; callers may ask for fewer, never more
+PG_QUERY_MAX_ROWS = int(os.getenv('PG_QUERY_MAX_ROWS', '200'))
+# Count the rows past the page (MOVE FORWARD) to report total_rows. This makes
+# the server walk the result past the page, so it is off by default and stops
+# after PG_QUERY_COUNT_MAX rows (total_rows is then null); nothing beyond the
+# page is sent either way.
+PG_QUERY_COUNT_TOTAL = os.getenv('PG_QUERY_COUNT_TOTAL', '0') == '1'
+PG_QUERY_COUNT_MAX = int(os.getenv('PG_QUERY_COUNT_MAX', '10000'))
+
+# Statements that can be opened as a server-side cursor
+_CURSOR_SQL = re.compile(r'^\s*(\(\s*)*(SELECT|WITH|VALUES|TABLE)\b', re.IGNORECASE)
+# EXPLAIN ANALYZE runs its statement, past the cost guard
+_EXPLAIN_ANALYZE_SQL = re.compile(r'^\s*EXPLAIN\s*(\([^)]*\bANALY[SZ]E\b|ANALY[SZ]E\b)', re.IGNORECASE)
+
+
+def _normalize_sql(sql: str) -> str:
+    return sql.strip().rstrip(';').strip()
+
+
+def _orders_rows(sql: str) -> bool:
+    """Whether *sql* has an ORDER BY outside parentheses (i.e. on its result)."""
+    text = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    previous = None
+    while previous != text:
+        previous, text = text, re.sub(r'\([^()]*\)', '()', text)
+    return re.search(r'\bORDER\s+BY\b', text, re.IGNORECASE) is not None
+
+
+def _sql_fingerprint(sql: str) -> str:
+    return hashlib.sha256(sql.encode('utf-8')).hexdigest()[:16]
+
+
+def _encode_page_token(sql: str, offset: int) -> str:
+    raw = json.dumps({'o': offset, 'h': _sql_fingerprint(sql)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_page_token(token: str, sql: str) -> int:
+    """Offset stored in *token*; rejects tokens issued for a different query."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        offset = int(data['o'])
+        fingerprint = data['h']
+    except Exception:
+        raise ValueError("Invalid page_token")
+    if fingerprint != _sql_fingerprint(sql):
+        raise ValueError("page_token does not belong to this query; pass the same sql it was issued for")
+    if offset < 0:
+        raise ValueError("Invalid page_token")
+    return offset
 
 
 @mcp.tool()
-def pg_query(sql: str) -> str:
-    """Execute SQL queries against the Demo PostgreSQL database"""
+@instrumented
+async def pg_query(
+    sql: str,
+    max_rows: Optional[int] = None,
+    page_token: Optional[str] = None,
+    format: str = 'json',
+    max_staleness: Optional[float] = None,
+) -> str:
+    """Execute SQL queries against the Demo PostgreSQL database.
+
+    Returns at most `max_rows` rows (default and ceiling PG_QUERY_MAX_ROWS).
+    When more rows exist, `next_page_token` is set: call again with the same
+    `sql` and that token to fetch the next page. `truncated` tells whether
+    rows were left out; `total_rows` is the full result size when the server
+    counted it, otherwise null.
+
+    Each page re-runs the query and skips the earlier rows, so page N costs
+    as much as reading all rows before it. Give paged queries an ORDER BY on
+    a unique key: without one, rows can be repeated or skipped between pages
+    (a `warning` says so).
+
+    `format`: 'json' (rows as objects), 'columnar' (one value list per
+    column, fewest tokens for wide results), 'csv', 'tsv', or 'arrow'
+    (base64 Arrow IPC, for programs).
+
+    When the server's result cache is on, `cache.hit` and `cache.age_s` show
+    whether the rows were served from it. `max_staleness` (seconds) bounds
+    the age of a cached result you accept; 0 always queries the database.
+
+    Queries the planner estimates to be very expensive are refused (or, if
+    configured, capped with a LIMIT reported under `guard`); statements are
+    cancelled after PG_STATEMENT_TIMEOUT_MS.
+    """
+    return await run_blocking(_pg_query, sql, max_rows, page_token, format, max_staleness)
+
+
+def _pg_query(
+    sql: str,
+    max_rows: Optional[int],
+    page_token: Optional[str],
+    format: str,
+    max_staleness: Optional[float] = None,
+) -> str:
+    """Blocking body of `pg_query`; runs on the tool thread pool."""
     if not sql or not sql.strip():
         raise ValueError("SQL query is required")
-    
+    format = check_format(format)
+
+    sql = _normalize_sql(sql)
+    limit = PG_QUERY_MAX_ROWS if max_rows is None else max(1, min(int(max_rows), PG_QUERY_MAX_ROWS))
+    offset = _decode_page_token(page_token, sql) if page_token else 0
+
+    cache_key = None
+    if query_cache is not None and max_staleness != 0 and is_cacheable(sql):
+        cache_key = query_cache.key(sql, limit, offset)
+        hit = query_cache.get(cache_key, max_staleness)
+        if hit is not None:
+            (columns, rows, meta), age = hit
+            ROWS_RETURNED.inc(len(rows), tool='pg_query')
+            return encode_rows(columns, rows, format, {**meta, 'cache': {'hit': True, 'age_s': round(age, 1)}})
+
     conn = None
-    cursor = None
     
     try:
         # Get connection from pool
         conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute("BEGIN READ ONLY")
-        cursor.execute(sql)
-        
-        # Enhanced read-only validation
-        sql_upper = sql.strip().upper()
-
-        results = cursor.fetchall()
-        cursor.execute("COMMIT")
-
-        json_results = []
-        for row in results:
-            json_results.append(dict(row))
-        
-        return json.dumps(json_results, indent=2, default=str)
+        with conn.cursor() as control:
+            _begin_read_only(control)
+
+        columns, rows, total, remaining, guard = _fetch_page(conn, sql, limit, offset)
+
+        conn.commit()
+
+        next_offset = offset + len(rows)
+        meta = {
+            'row_count': len(rows),
+            'offset': offset,
+            'total_rows': total,
+            'truncated': remaining > 0,
+            'next_page_token': _encode_page_token(sql, next_offset) if remaining > 0 else None,
+        }
+        if remaining > 0 and not _orders_rows(sql):
+            meta['warning'] = (
+                "No ORDER BY: each page re-runs the query, possibly on another replica, and row order "
+                "is not stable between runs, so pages can repeat or skip rows. Add ORDER BY on a unique key."
+            )
+        if guard:
+            meta['guard'] = guard
+        if query_cache is not None:
+            if cache_key is not None:
+                query_cache.put(cache_key, (columns, rows, dict(meta)), referenced_tables(sql))
+            meta['cache'] = {'hit': False}
+        ROWS_RETURNED.inc(len(rows), tool='pg_query')
+        return encode_rows(columns, rows, format, meta)
 
     except Exception as e:
         if conn:
             conn.rollback()
         raise e
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+
+def _fetch_page(conn, sql: str, limit: int, offset: int):
+    """Run *sql* in the current transaction and fetch one page of its rows.
+
+    Returns ``(columns, rows, total, remaining, guard)``: *total* is None
+    when not counted, *remaining* is the number (or, uncounted, presence)
+    of rows after the page, and *guard* is the cost-guard metadata if the
+    query was limited.
+    """
+    total = None
+    guard = None
+    cursor = None
+    try:
+        if _CURSOR_SQL.match(sql):
+            # Refuse (or LIMIT) queries the planner expects to be expensive
+            with conn.cursor() as control:
+                run_sql, guard = _guard_query(control, sql)
+            # Named (server-side) cursor: rows stay in Postgres until fetched,
+            # so memory per call is bounded by the page size
+            name = f"pg_query_{uuid.uuid4().hex}"
+            cursor = conn.cursor(name=name)
+            cursor.itersize = limit
+            cursor.execute(run_sql)
+            with conn.cursor() as control:
+                if offset:
+                    control.execute(f'MOVE FORWARD {offset:d} FROM "{name}"')
+                rows = cursor.fetchmany(limit)
+                columns = [col.name for col in cursor.description or []]
+                if PG_QUERY_COUNT_TOTAL:
+                    # One row past the cap tells whether the count is complete
+                    control.execute(f'MOVE FORWARD {PG_QUERY_COUNT_MAX + 1:d} FROM "{name}"')
+                    remaining = control.rowcount
+                    if remaining <= PG_QUERY_COUNT_MAX:
+                        total = offset + len(rows) + remaining
+                else:
+                    # One extra row tells whether another page exists
+                    remaining = len(cursor.fetchmany(1))
+        else:
+            # SHOW, EXPLAIN and the like cannot be declared as cursors; their
+            # output is small, but the row cap still applies
+            if _EXPLAIN_ANALYZE_SQL.match(sql):
+                raise ValueError(
+                    "EXPLAIN ANALYZE executes the query, bypassing the cost guard; use pg_explain for the "
+                    "plan, or pg_profile_query (when the server enables it) to run and time the query"
+                )
+            cursor = conn.cursor()
+            cursor.execute(sql)
+            columns = [col.name for col in cursor.description or []]
+            if offset and cursor.description:
+                cursor.scroll(offset)
+            rows = cursor.fetchmany(limit) if cursor.description else []
+            total = cursor.rowcount if cursor.rowcount >= 0 else None
+            remaining = max(0, total - offset - len(rows)) if total is not None else 0
+        return columns, rows, total, remaining, guard
     finally:
         if cursor:
-            cursor.close()
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
+@mcp.tool()
+@instrumented
+async def pg_query_batch(statements: List[str], max_rows: Optional[int] = None, format: str = 'json') -> str:
+    """Run several read-only SQL statements in one call and one consistent snapshot.
+
+    All statements see the same REPEATABLE READ snapshot, so their results
+    agree with each other. Each entry of `results` has `ok` and either the
+    rows (first page, up to `max_rows` each, with `total_rows` and
+    `truncated`) or the `error` for that statement; one failing statement
+    does not affect the others. Only queries (SELECT, WITH, VALUES, TABLE)
+    are accepted. `format`: 'json' or 'columnar'. At most
+    PG_BATCH_MAX_STATEMENTS statements per call.
+    """
+    return await run_blocking(_pg_query_batch, statements, max_rows, format)
+
+
+def _pg_query_batch(statements: List[str], max_rows: Optional[int], format: str) -> str:
+    """Blocking body of `pg_query_batch`; runs on the tool thread pool."""
+    if not statements:
+        raise ValueError("At least one SQL statement is required")
+    if len(statements) > PG_BATCH_MAX_STATEMENTS:
+        raise ValueError(f"At most {PG_BATCH_MAX_STATEMENTS} statements per batch; split the rest into another call")
+    format = check_format(format, ('json', 'columnar'))
+    limit = PG_QUERY_MAX_ROWS if max_rows is None else max(1, min(int(max_rows), PG_QUERY_MAX_ROWS))
+
+    results = []
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as control:
+            # Must precede any query so the snapshot covers every statement
+            control.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            _begin_read_only(control)
+
+            for index, sql in enumerate(statements):
+                sql = _normalize_sql(sql or '')
+                if not sql:
+                    results.append({'index': index, 'ok': False, 'error': 'Empty statement'})
+                    continue
+                if not _CURSOR_SQL.match(sql):
+                    # Only queries go through the cursor and the cost guard
+                    results.append({'index': index, 'ok': False, 'error': (
+                        'Only SELECT, WITH, VALUES and TABLE statements can be batched; '
+                        'run other statements with pg_query')})
+                    continue
+                # A savepoint per statement keeps the transaction (and its
+                # snapshot) usable after one statement fails
+                control.execute("SAVEPOINT batch_stmt")
+                try:
+                    columns, rows, total, remaining, guard = _fetch_page(conn, sql, limit, 0)
+                    control.execute("RELEASE SAVEPOINT batch_stmt")
+                except psycopg2.Error as e:
+                    control.execute("ROLLBACK TO SAVEPOINT batch_stmt")
+                    results.append({'index': index, 'ok': False, 'error': str(e).strip()})
+                    continue
+                except ValueError as e:  # refused by the cost guard
+                    control.execute("ROLLBACK TO SAVEPOINT batch_stmt")
+                    results.append({'index': index, 'ok': False, 'error': str(e)})
+                    continue
+
+                ROWS_RETURNED.inc(len(rows), tool='pg_query_batch')
+                result = {'index': index, 'ok': True, **rows_payload(columns, rows, format),
+                          'row_count': len(rows), 'total_rows': total, 'truncated': remaining > 0}
+                if guard:
+                    result['guard'] = guard
+                results.append(result)
+
+        conn.commit()
+        return dumps({'snapshot': 'repeatable read', 'results': results})
+
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
         if conn:
             return_db_connection(conn)
 
+
 @mcp.tool()
-def pg_explain(sql: str) -> List[Dict[str, Any]]:
-    """Return EXPLAIN (FORMAT JSON) for a query as JSON from PostgreSQL."""
+@instrumented
+async def pg_explain(sql: str, format: str = 'json') -> str:
+    """Return the PostgreSQL plan for a query without executing it.
+
+    `format`: 'json' (EXPLAIN FORMAT JSON, compact) or 'text' (the indented
+    plan tree, several times smaller).
+    """
+    return await run_blocking(_pg_explain, sql, format)
+
+
+def _pg_explain(sql: str, format: str) -> str:
+    """Blocking body of `pg_explain`; runs on the tool thread pool."""
     
     # Describes the query and returns the explanation as JSON, without actually executing the query
     if not sql or not sql.strip():
         raise ValueError("SQL query is required")
+    format = check_format(format, ('json', 'text'))
 
     # Allow any statement but wrap with EXPLAIN
 
-    explain_query = f"EXPLAIN (FORMAT JSON) {sql}"
-
     conn = None
     cur = None
     try:
         conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("BEGIN READ ONLY")
-        cur.execute(explain_query)
-        result = _fetch_all_dicts(cur)
-        cur.execute("COMMIT")
-        return result
+        cur = conn.cursor()
+        _begin_read_only(cur)
+        rows = _explain(cur, _normalize_sql(sql), format)
+        conn.commit()
+        if format == 'text':
+            return '\n'.join(rows)
+        return dumps([{'QUERY PLAN': plan} for plan in rows])
     except Exception as e:
         logger.error(f"pg_explain error: {e}")
+        if conn:
+            conn.rollback()
         raise
     finally:
         if cur:
@@ -102,32 +637,520 @@ def pg_explain(sql: str) -> List[Dict[str, Any]]:
             return_db_connection(conn)
 
 
+def _explain(cur, sql: str, format: str = 'json') -> List[Any]:
+    """Run EXPLAIN (without ANALYZE) for *sql* and return the plan rows."""
+    cur.execute(f"EXPLAIN (FORMAT {format.upper()}) {sql}")
+    return [row[0] for row in cur.fetchall()]
+
+
+def _plan_estimates(cur, sql: str) -> Tuple[float, float]:
+    """Planner's total cost and row estimate for *sql*."""
+    plan = _explain(cur, sql)[0][0]['Plan']
+    return float(plan['Total Cost']), float(plan['Plan Rows'])
+
+
+def _guard_query(cur, sql: str, paged: bool = True) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Check *sql* against PG_GUARD_MAX_COST / PG_GUARD_MAX_ROWS before running it.
+
+    Returns the SQL to run and guard metadata (None when under the limits).
+    In 'limit' mode an over-limit query is wrapped in an outer LIMIT and
+    re-checked; anything still over the cost limit is refused. A *paged*
+    query only sends one page however many rows it has, so in 'reject'
+    mode only its cost is checked.
+    """
+    if PG_GUARD_MODE == 'off':
+        return sql, None
+
+    cost, rows = _plan_estimates(cur, sql)
+    check_rows = PG_GUARD_MODE == 'limit' or not paged
+    if cost <= PG_GUARD_MAX_COST and (rows <= PG_GUARD_MAX_ROWS or not check_rows):
+        return sql, None
+
+    if PG_GUARD_MODE == 'limit':
+        limited = f"SELECT * FROM ({sql}) AS guarded LIMIT {PG_GUARD_AUTO_LIMIT:d}"
+        limited_cost, _ = _plan_estimates(cur, limited)
+        if limited_cost <= PG_GUARD_MAX_COST:
+            logger.info(f"Guard limited query to {PG_GUARD_AUTO_LIMIT} rows (cost {cost:.0f}, rows {rows:.0f})")
+            return limited, {
+                'limited_to': PG_GUARD_AUTO_LIMIT,
+                'estimated_cost': round(cost),
+                'estimated_rows': round(rows),
+            }
+
+    logger.warning(f"Guard refused query (cost {cost:.0f}, rows {rows:.0f}): {sql[:200]}")
+    raise ValueError(
+        f"Query refused: the planner estimates cost {cost:,.0f} and {rows:,.0f} rows, over the limits "
+        f"(cost {PG_GUARD_MAX_COST:,.0f}, rows {PG_GUARD_MAX_ROWS:,.0f}). Narrow the query: add WHERE "
+        "filters (preferably on indexed or date columns), join tables on their keys instead of "
+        "cross-joining, aggregate with COUNT/GROUP BY rather than listing rows, select only the "
+        "columns you need, and add a LIMIT. pg_explain shows the plan and its estimates."
+    )
+
+
+def _begin_read_only(cur) -> None:
+    """Make the current transaction read-only and apply per-transaction limits.
+
+    psycopg2 has already opened the transaction, so it is marked read-only
+    rather than issuing a second BEGIN; the settings end with it.
+    """
+    cur.execute("SET TRANSACTION READ ONLY")
+    cur.execute(
+        "SELECT set_config('statement_timeout', %s, true), set_config('work_mem', %s, true)",
+        (str(PG_STATEMENT_TIMEOUT_MS), PG_WORK_MEM),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Query profiling (opt-in: runs the query for real)
+# ---------------------------------------------------------------------------
+#   PG_PROFILE_ENABLED    — '1' to register pg_profile_query
+#   PG_PROFILE_TIMEOUT_MS — statement_timeout while profiling (default 10000)
+
+PG_PROFILE_ENABLED = os.getenv('PG_PROFILE_ENABLED') == '1'
+PG_PROFILE_TIMEOUT_MS = int(os.getenv('PG_PROFILE_TIMEOUT_MS', '10000'))
+
+
+@instrumented
+async def pg_profile_query(sql: str, include_plan: bool = False) -> str:
+    """Run a SELECT under EXPLAIN (ANALYZE, BUFFERS) and summarize where time goes.
+
+    The query really executes (read-only, rolled back, cancelled after
+    PG_PROFILE_TIMEOUT_MS). Returns execution/planning time, the hottest plan
+    nodes, sequential scans over many rows, row-estimate misses and
+    candidate CREATE INDEX statements. `include_plan` adds the full JSON plan.
+    """
+    return await run_blocking(_pg_profile_query, sql, include_plan)
+
+
+def _pg_profile_query(sql: str, include_plan: bool) -> str:
+    """Blocking body of `pg_profile_query`; runs on the tool thread pool."""
+    if not sql or not sql.strip():
+        raise ValueError("SQL query is required")
+    sql = _normalize_sql(sql)
+    _ensure_select_only(sql)
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            _begin_read_only(cur)
+            cur.execute("SELECT set_config('statement_timeout', %s, true)", (str(PG_PROFILE_TIMEOUT_MS),))
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+            explain = cur.fetchone()[0]
+    finally:
+        # Nothing a profiled query did is kept
+        conn.rollback()
+        return_db_connection(conn)
+
+    summary = summarize_plan(explain)
+    logger.info(
+        f"[PROFILE] sql={_sql_fingerprint(sql)} execution_ms={summary['execution_ms']} "
+        f"hints={summary.get('index_hints', [])} query={sql[:300]!r}"
+    )
+    result = {'summary': summary}
+    if include_plan:
+        result['plan'] = explain
+    return dumps(result)
+
+
+if PG_PROFILE_ENABLED:
+    mcp.tool()(pg_profile_query)
+
+
+# ---------------------------------------------------------------------------
+# Approximate answers for large tables
+# ---------------------------------------------------------------------------
+# Planner statistics and TABLESAMPLE instead of full scans; every result
+# carries its error bound (approx_stats.py has the maths).
+#   PG_SAMPLE_TARGET_ROWS — rows pg_approx_count aims to sample (default 10000)
+#   PG_SAMPLE_MAX_ROWS    — most rows pg_sample_rows returns (default 100)
+
+PG_SAMPLE_TARGET_ROWS = int(os.getenv('PG_SAMPLE_TARGET_ROWS', '10000'))
+PG_SAMPLE_MAX_ROWS = int(os.getenv('PG_SAMPLE_MAX_ROWS', '100'))
+
+_SAMPLE_METHODS = ('system', 'bernoulli')
+
+_TABLE_ESTIMATES_SQL = """
+SELECT c.reltuples, c.relpages, s.n_live_tup, s.n_dead_tup, s.n_mod_since_analyze,
+       greatest(s.last_analyze, s.last_autoanalyze)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_all_tables s ON s.relid = c.oid
+WHERE n.nspname = %s AND c.relname = %s
+"""
+
+# Statistics ANALYZE gathered per column; arrays come back as text[] so any
+# column type can be returned
+_COLUMN_STATS_SQL = """
+SELECT DISTINCT ON (s.attname)
+       s.attname, s.null_frac, s.n_distinct, s.most_common_vals::text::text[], s.most_common_freqs,
+       s.histogram_bounds::text::text[], s.correlation,
+       coalesce(nullif(a.attstattarget, -1), current_setting('default_statistics_target')::int)
+FROM pg_stats s
+JOIN pg_namespace n ON n.nspname = s.schemaname
+JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attname = s.attname
+WHERE s.schemaname = %s AND s.tablename = %s AND s.attname = ANY(%s)
+ORDER BY s.attname, s.inherited DESC
+"""
+
+
+def _table_estimates(schema: str, relation: str) -> Dict[str, Any]:
+    reltuples, relpages, live, dead, modified, analyzed = _catalog_query(
+        _TABLE_ESTIMATES_SQL, (schema, relation)
+    )[0]
+    # reltuples is -1 (PostgreSQL 14+) or 0 before the first ANALYZE
+    rows = int(reltuples) if reltuples and reltuples > 0 else None
+    estimate: Dict[str, Any] = {
+        'estimated_rows': rows,
+        'pages': relpages,
+        'last_analyzed': analyzed.isoformat() if analyzed else None,
+    }
+    if live is not None:
+        estimate.update({'live_rows': live, 'dead_rows': dead, 'modified_since_analyze': modified})
+    if rows is None:
+        estimate['error_bound'] = "unknown: never analyzed; live_rows is the statistics collector's running count"
+    else:
+        # Each insert, update or delete since ANALYZE moves the count by at most one row
+        drift = modified or 0
+        estimate['estimated_rows_bound'] = [max(rows - drift, 0), rows + drift]
+        estimate['error_bound'] = (
+            f"±{drift:,} rows (changes since the last ANALYZE)" if drift else "exact as of the last ANALYZE"
+        )
+    return estimate
+
+
+@mcp.tool()
+@instrumented
+async def pg_table_estimates(tables: Optional[List[str]] = None) -> str:
+    """Row counts from planner statistics, in milliseconds and without scanning.
+
+    For each table (all of them if `tables` is omitted): `estimated_rows`
+    as of the last ANALYZE, a bound widened by rows modified since, and the
+    live/dead row counters. Use this instead of SELECT count(*) for sizes.
+    """
+    return await run_blocking(_pg_table_estimates, tables)
+
+
+def _pg_table_estimates(tables: Optional[List[str]]) -> str:
+    """Blocking body of `pg_table_estimates`; runs on the tool thread pool."""
+    names = tables or [name for name, info in schema_catalog.overview()['tables'].items()
+                       if info.get('kind', 'table') == 'table']
+    result = {}
+    for name in names:
+        schema, relation, _ = schema_catalog.resolve(name)
+        result[name] = _table_estimates(schema, relation)
+    return dumps({'tables': result})
+
+
+@mcp.tool()
+@instrumented
+async def pg_column_stats(table: str, columns: Optional[List[str]] = None, top_values: int = 10) -> str:
+    """Column distributions from pg_stats, without scanning the table.
+
+    Per column: share of NULLs, estimated distinct values, the `top_values`
+    most common values with their frequency and estimated row count, and
+    deciles of the remaining values. Frequencies come from ANALYZE's
+    random sample and carry a 95% interval. Answers "what are the common
+    values / how is X distributed" questions.
+    """
+    return await run_blocking(_pg_column_stats, table, columns, top_values)
+
+
+def _pg_column_stats(table: str, columns: Optional[List[str]], top_values: int) -> str:
+    """Blocking body of `pg_column_stats`; runs on the tool thread pool."""
+    schema, relation, info = schema_catalog.resolve(table)
+    wanted = list(info['columns']) if not columns else columns
+    unknown = [col for col in wanted if col not in info['columns']]
+    if unknown:
+        raise ValueError(f"Unknown columns for {table}: {', '.join(unknown)}; pg_schema lists them")
+
+    estimates = _table_estimates(schema, relation)
+    table_rows = estimates['estimated_rows']
+    rows = _catalog_query(_COLUMN_STATS_SQL, (schema, relation, wanted))
+
+    result: Dict[str, Any] = {}
+    for attname, null_frac, n_distinct, mcv, mcf, histogram, correlation, target in rows:
+        sample = analyze_sample_rows(target, table_rows)
+
+        def margin(freq: float) -> float:
+            return round(frequency_margin(freq, sample), 4)
+
+        stats: Dict[str, Any] = {'null_frac': round(null_frac, 4), 'null_frac_margin': margin(null_frac)}
+        # Negative n_distinct is a fraction of the rows, -1 meaning every value is distinct
+        if n_distinct >= 0:
+            stats['distinct'] = int(n_distinct)
+        elif table_rows:
+            stats['distinct'] = round(-n_distinct * table_rows)
+        else:
+            stats['distinct'] = f"{-n_distinct:.0%} of rows"
+        if n_distinct == -1:
+            stats['unique'] = True
+        if mcv:
+            stats['most_common'] = [
+                {
+                    'value': value,
+                    'freq': round(freq, 4),
+                    'freq_95ci': [round(max(freq - margin(freq), 0.0), 4), round(min(freq + margin(freq), 1.0), 4)],
+                    **({'estimated_rows': round(freq * table_rows)} if table_rows else {}),
+                }
+                for value, freq in list(zip(mcv, mcf))[:max(top_values, 0)]
+            ]
+            stats['most_common_total_freq'] = round(sum(mcf), 4)
+        if histogram:
+            # Equal-frequency bucket bounds over values not in most_common
+            step = (len(histogram) - 1) / 10
+            stats['deciles'] = [histogram[round(i * step)] for i in range(11)]
+        if correlation is not None:
+            stats['physical_order_correlation'] = round(correlation, 3)
+        stats['sample_rows'] = sample
+        result[attname] = stats
+
+    missing = [col for col in wanted if col not in result]
+    out: Dict[str, Any] = {
+        'table': table,
+        'estimated_rows': table_rows,
+        'last_analyzed': estimates['last_analyzed'],
+        'columns': result,
+        'error_bound': (
+            "freq_95ci and null_frac_margin are 95% intervals for ANALYZE's sample of sample_rows rows; "
+            "distinct is an estimator that can be off several-fold on skewed columns; all values are as of "
+            "last_analyzed"
+        ),
+    }
+    if missing:
+        out['no_statistics'] = missing
+        out['hint'] = "Columns without statistics have not been analyzed yet (ANALYZE the table)."
+    return dumps(out)
+
+
+def _sample_clause(method: str, percent: float) -> Composable:
+    return SQL("TABLESAMPLE {} ({})").format(SQL(method.upper()), Literal(percent))
+
+
+def _closes_early(expression: str) -> bool:
+    """Whether *expression* could end the ``WHERE (...)`` it is wrapped in.
+
+    True for unbalanced parentheses or a comment, either of which lets it
+    append more SQL; string literals and quoted identifiers are skipped.
+    """
+    depth = 0
+    i = 0
+    while i < len(expression):
+        char = expression[i]
+        if char in ("'", '"'):
+            end = expression.find(char, i + 1)
+            # '' / "" inside a literal just restart the scan at the next quote
+            i = len(expression) if end < 0 else end + 1
+            continue
+        if expression.startswith(('--', '/*'), i):
+            return True
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth < 0:
+                return True
+        i += 1
+    return depth != 0
+
+
+def _check_where(cur, schema: str, relation: str, where: str) -> None:
+    """Refuse *where* unless it is one boolean expression over the table.
+
+    The planner checks it (EXPLAIN, nothing runs) wrapped as ``WHERE (...)``.
+    """
+    if _closes_early(where):
+        raise ValueError("where must be a single boolean expression with balanced parentheses and no comments")
+    try:
+        cur.execute(SQL("EXPLAIN SELECT 1 FROM {} WHERE ({})").format(Identifier(schema, relation), SQL(where)))
+    except psycopg2.Error as e:
+        raise ValueError(f"Invalid where expression: {str(e).strip()}") from e
+
+
+def _sample_query(query: Composable, schema: str, relation: str, where: Optional[str]) -> List[tuple]:
+    """Run a sampling *query* after checking its *where* and, like pg_query, its cost."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            _begin_read_only(cur)
+            if where:
+                _check_where(cur, schema, relation, where)
+            sql, _ = _guard_query(cur, query.as_string(cur), paged=False)
+            cur.execute(sql)
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        return_db_connection(conn)
+
+
+def _check_sample_args(method: str, where: Optional[str]) -> str:
+    method = (method or 'system').lower()
+    if method not in _SAMPLE_METHODS:
+        raise ValueError(f"Unsupported method {method!r}; use one of: {', '.join(_SAMPLE_METHODS)}")
+    if where is not None and ';' in where:
+        raise ValueError("Multiple statements are not allowed.")
+    return method
+
+
+@mcp.tool()
+@instrumented
+async def pg_approx_count(
+    table: str,
+    where: str,
+    sample_percent: Optional[float] = None,
+    method: str = 'system',
+) -> str:
+    """Estimate how many / what fraction of rows in `table` match `where` from a random sample.
+
+    `where` is a SQL boolean expression over the table's columns, e.g.
+    "sent_at >= now() - interval '30 days' AND folder = 'inbox'". Returns the
+    matching fraction and row count with 95% intervals. `sample_percent`
+    defaults to enough pages for ~PG_SAMPLE_TARGET_ROWS rows; small tables
+    are counted exactly. `method`: 'system' samples whole pages (fastest)
+    or 'bernoulli' individual rows (reads every page, tighter when matching
+    rows are clustered on disk).
+    """
+    return await run_blocking(_pg_approx_count, table, where, sample_percent, method)
+
+
+def _pg_approx_count(table: str, where: str, sample_percent: Optional[float], method: str) -> str:
+    """Blocking body of `pg_approx_count`; runs on the tool thread pool."""
+    if not where or not where.strip():
+        raise ValueError("where is required; pg_table_estimates gives whole-table counts")
+    method = _check_sample_args(method, where)
+    schema, relation, _ = schema_catalog.resolve(table)
+    table_rows = _table_estimates(schema, relation)['estimated_rows']
+
+    if sample_percent is None:
+        sample_percent = min(100.0, PG_SAMPLE_TARGET_ROWS / table_rows * 100) if table_rows else 1.0
+    sample_percent = min(max(float(sample_percent), 0.0001), 100.0)
+    exact = sample_percent >= 100.0
+
+    query = SQL("SELECT count(*), count(*) FILTER (WHERE ({})) FROM {} {}").format(
+        SQL(where),
+        Identifier(schema, relation),
+        SQL('') if exact else _sample_clause(method, sample_percent),
+    )
+    sampled, matching = _sample_query(query, schema, relation, where)[0]
+
+    if exact:
+        return dumps({
+            'table': table,
+            'exact': True,
+            'rows': sampled,
+            'matching_rows': matching,
+            'fraction': round(matching / sampled, 6) if sampled else None,
+            'error_bound': "none: the table is small enough to count in full",
+        })
+
+    # Without statistics, scale the sample up by the sampling rate instead
+    basis = table_rows or sampled / (sample_percent / 100)
+    result = {
+        'table': table,
+        'exact': False,
+        'method': method,
+        'sample_percent': round(sample_percent, 4),
+        **fraction_estimate(matching, sampled, basis),
+        'table_rows_basis': 'pg_class.reltuples' if table_rows else 'sample size / sampling rate',
+        'error_bound': "95% intervals (Wilson) on the sampled fraction; row counts scale it by the table estimate",
+    }
+    if method == 'system':
+        result['note'] = (
+            "SYSTEM samples whole pages; if matching rows are clustered on disk (e.g. by insert time) the "
+            "true error can exceed the interval. Re-run with method='bernoulli' to check."
+        )
+    if sampled < 100:
+        result['note'] = (result.get('note', '') + " Few rows sampled; raise sample_percent for a usable bound.").strip()
+    return dumps(result)
+
+
+@mcp.tool()
+@instrumented
+async def pg_sample_rows(
+    table: str,
+    columns: Optional[List[str]] = None,
+    rows: int = 20,
+    where: Optional[str] = None,
+    method: str = 'system',
+    format: str = 'json',
+) -> str:
+    """A random sample of rows from `table`, read from a few pages rather than the whole table.
+
+    Use it to see typical values before writing a query. `columns` limits the
+    columns returned, `where` filters the sample, `rows` is capped at
+    PG_SAMPLE_MAX_ROWS. `method` and `format` are as for pg_approx_count
+    and pg_query.
+    """
+    return await run_blocking(_pg_sample_rows, table, columns, rows, where, method, format)
+
+
+def _pg_sample_rows(
+    table: str,
+    columns: Optional[List[str]],
+    rows: int,
+    where: Optional[str],
+    method: str,
+    format: str,
+) -> str:
+    """Blocking body of `pg_sample_rows`; runs on the tool thread pool."""
+    method = _check_sample_args(method, where)
+    fmt = check_format(format)
+    schema, relation, info = schema_catalog.resolve(table)
+    columns = columns or list(info['columns'])
+    unknown = [col for col in columns if col not in info['columns']]
+    if unknown:
+        raise ValueError(f"Unknown columns for {table}: {', '.join(unknown)}; pg_schema lists them")
+    limit = min(max(int(rows), 1), PG_SAMPLE_MAX_ROWS)
+
+    # Oversample, then shuffle, so LIMIT doesn't favour the first pages read.
+    # SYSTEM picks pages, so also read at least one page per requested row
+    estimates = _table_estimates(schema, relation)
+    table_rows, pages = estimates['estimated_rows'], estimates['pages']
+    shares = [limit * 4 / table_rows] if table_rows else []
+    if pages and (method == 'system' or not shares):
+        shares.append(limit / pages)
+    percent = min(100.0, max(shares) * 100) if shares else 100.0
+    query = SQL("SELECT {} FROM {} {} {} ORDER BY random() LIMIT {}").format(
+        SQL(', ').join(map(Identifier, columns)),
+        Identifier(schema, relation),
+        SQL('') if percent >= 100.0 else _sample_clause(method, percent),
+        SQL('WHERE ({})').format(SQL(where)) if where else SQL(''),
+        Literal(limit),
+    )
+    sample = _sample_query(query, schema, relation, where)
+    ROWS_RETURNED.inc(len(sample), tool='pg_sample_rows')
+    return encode_rows(columns, sample, fmt, {
+        'row_count': len(sample),
+        'sample_percent': round(percent, 4),
+        'method': method if percent < 100.0 else 'full',
+    })
+
+
 def get_db_connection():
-    """Get a database connection from the pool"""
-    global connection_pool
-    
-    with pool_lock:
-        if connection_pool is None:
-            initialize_connection_pool()
-        
-        try:
-            conn = connection_pool.getconn()
-            # Test if connection is still valid
-            conn.cursor().execute("SELECT 1")
-            return conn
-        except Exception as e:
-            logger.warning(f"Connection from pool failed, creating new one: {e}")
-            # If connection is bad, create a new one
-            conn_params = psycopg2.extensions.parse_dsn(DB_URL)
-            return psycopg2.connect(**conn_params)
-
-def return_db_connection(conn):
+    """Get a database connection from the pool.
+
+    Waits up to PG_POOL_TIMEOUT seconds when all connections are busy and
+    raises `PoolTimeout` after that.
+    """
+    if connection_pool is None:
+        with pool_lock:
+            if connection_pool is None:
+                initialize_connection_pool()
+    start = time.perf_counter()
+    try:
+        return connection_pool.getconn()
+    finally:
+        POOL_WAIT.observe(time.perf_counter() - start)
+
+def return_db_connection(conn, close=False):
     """Return a database connection to the pool"""
-    global connection_pool
-    
     try:
         if connection_pool is not None:
-            connection_pool.putconn(conn)
+            connection_pool.putconn(conn, close=close)
         else:
             conn.close()
     except Exception as e:
@@ -141,11 +1164,36 @@ def initialize_connection_pool():
     """Initialize the database connection pool"""
     global connection_pool
     
+    pool_options = dict(
+        maxconn=int(os.getenv('PG_POOL_MAX', '20')),
+        timeout=float(os.getenv('PG_POOL_TIMEOUT', '10')),
+        max_idle=float(os.getenv('PG_POOL_MAX_IDLE', '30')),
+        max_lifetime=float(os.getenv('PG_POOL_MAX_LIFETIME', '1800')),
+    )
     try:
         conn_params = psycopg2.extensions.parse_dsn(DB_URL)
-        # Create a pool with 5-20 connections
-        connection_pool = SimpleConnectionPool(5, 20, **conn_params)
-        logger.info("Database connection pool initialized")
+        primary = ConnectionPool(conn_params, minconn=int(os.getenv('PG_POOL_MIN', '5')), **pool_options)
+
+        replica_urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+        if not replica_urls:
+            connection_pool = primary
+            logger.info("Database connection pool initialized")
+            return
+
+        # Every tool is read-only, so all traffic can go to replicas; pools
+        # start empty so an unreachable replica doesn't block startup
+        replicas = [
+            ConnectionPool(psycopg2.extensions.parse_dsn(url), minconn=0, name=f"replica-{i + 1}", **pool_options)
+            for i, url in enumerate(replica_urls)
+        ]
+        connection_pool = PoolRouter(
+            primary,
+            replicas,
+            max_lag=float(os.getenv('PG_REPLICA_MAX_LAG', '30')),
+            check_interval=float(os.getenv('PG_REPLICA_CHECK_INTERVAL', '10')),
+            strategy=os.getenv('PG_REPLICA_STRATEGY', 'least_loaded'),
+        )
+        logger.info(f"Database connection pools initialized (primary + {len(replicas)} replicas)")
     except Exception as e:
         logger.error(f"Failed to initialize connection pool: {e}")
         raise
@@ -158,6 +1206,33 @@ def cleanup_connection_pool():
         connection_pool.closeall()
         logger.info("Database connection pool closed")
 
+def pool_stats():
+    """Checkout, wait and timeout counters of the connection pool."""
+    if connection_pool is None:
+        return {'size': 0, 'initialized': False}
+    return connection_pool.stats()
+
+
+@mcp.custom_route("/healthz", methods=["GET"])
+async def healthz(request):
+    return JSONResponse({
+        'ok': True,
+        'pool': pool_stats(),
+        'schema_catalog': schema_catalog.stats(),
+        'query_cache': query_cache.stats() if query_cache is not None else {'enabled': False},
+        'tool_threads': tool_thread_stats(),
+    })
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@mcp.custom_route("/metrics/slow_queries", methods=["GET"])
+async def slow_queries_endpoint(request):
+    return JSONResponse({'threshold_ms': slow_queries.threshold_ms, 'samples': slow_queries.samples()})
+
 def _ensure_select_only(sql: str) -> None:
     """Ensure the SQL is a single, read-only statement.
 
@@ -192,4 +1267,5 @@ if __name__ == "__main__":
         )
     finally:
         # Clean up connection pool on shutdown
+        _tool_executor.shutdown(wait=False, cancel_futures=True)
         cleanup_connection_pool()
\ No newline at end of file
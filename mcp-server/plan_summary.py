@@ -0,0 +1,169 @@
+"""Summarize EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) output for `pg_profile_query`.
+
+The raw plan of a real query runs to hundreds of lines. `summarize_plan`
+reduces it to what is usually worth acting on:
+
+  * hottest nodes   — nodes ranked by their own (exclusive) time
+  * large seq scans — sequential scans that read many rows, with the
+                      filter that discarded most of them
+  * estimate misses — nodes whose actual row count is off from the
+                      planner's estimate by a large factor (stale stats,
+                      correlated predicates)
+  * index hints     — CREATE INDEX candidates derived from the filters and
+                      sort keys above, to be checked by a human
+"""
+
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Column references in a filter/condition, e.g. "(e.sent_at > ...)" or "(status = 'x'::text)"
+_COLUMN_CMP = re.compile(
+    r'\(?\s*(?:\w+\.)?"?(\w+)"?(?:\)?::\w+(?:\s\w+)*)?\s*(=|<>|<=|>=|<|>|~~\*?|!~~\*?| IS | = ANY)',
+)
+_SQL_WORDS = {'and', 'or', 'not', 'null', 'true', 'false', 'any', 'all', 'text', 'lower', 'upper'}
+
+
+def _walk(plan: Dict[str, Any], depth: int = 0) -> Iterator[Tuple[Dict[str, Any], int]]:
+    yield plan, depth
+    for child in plan.get('Plans', []) or []:
+        yield from _walk(child, depth + 1)
+
+
+def _total_ms(node: Dict[str, Any]) -> float:
+    return float(node.get('Actual Total Time', 0.0)) * max(int(node.get('Actual Loops', 1) or 1), 1)
+
+
+def _exclusive_ms(node: Dict[str, Any]) -> float:
+    children = sum(_total_ms(child) for child in node.get('Plans', []) or []
+                   # InitPlans/SubPlans that never ran report 0 loops
+                   if child.get('Actual Loops'))
+    return max(_total_ms(node) - children, 0.0)
+
+
+def _label(node: Dict[str, Any]) -> str:
+    label = node.get('Node Type', '?')
+    if node.get('Relation Name'):
+        label += f" on {node['Relation Name']}"
+        if node.get('Alias') and node['Alias'] != node['Relation Name']:
+            label += f" {node['Alias']}"
+    if node.get('Index Name'):
+        label += f" using {node['Index Name']}"
+    return label
+
+
+def _filter_columns(condition: Optional[str]) -> List[str]:
+    if not condition:
+        return []
+    seen: List[str] = []
+    for column, _ in _COLUMN_CMP.findall(condition):
+        if column.lower() not in _SQL_WORDS and not column.isdigit() and column not in seen:
+            seen.append(column)
+    return seen
+
+
+def summarize_plan(
+    explain: List[Dict[str, Any]],
+    top_nodes: int = 5,
+    large_scan_rows: int = 10000,
+    misestimate_factor: float = 10.0,
+) -> Dict[str, Any]:
+    """Condense one EXPLAIN ANALYZE JSON document into tuning hints."""
+    doc = explain[0]
+    root = doc['Plan']
+    execution_ms = float(doc.get('Execution Time', _total_ms(root)))
+
+    hottest = []
+    seq_scans = []
+    misses = []
+    hints: List[str] = []
+
+    for node, depth in _walk(root):
+        loops = max(int(node.get('Actual Loops', 1) or 1), 1)
+        actual_rows = float(node.get('Actual Rows', 0)) * loops
+        estimated_rows = float(node.get('Plan Rows', 0)) * loops
+        relation = node.get('Relation Name')
+
+        hottest.append({
+            'node': _label(node),
+            'depth': depth,
+            'self_ms': round(_exclusive_ms(node), 2),
+            'pct': round(_exclusive_ms(node) / execution_ms * 100, 1) if execution_ms else 0.0,
+            'rows': int(actual_rows),
+            'loops': loops,
+        })
+
+        if node.get('Node Type') == 'Seq Scan' and relation:
+            removed = float(node.get('Rows Removed by Filter', 0)) * loops
+            scanned = actual_rows + removed
+            if scanned >= large_scan_rows:
+                entry = {
+                    'table': relation,
+                    'rows_scanned': int(scanned),
+                    'rows_kept': int(actual_rows),
+                    'self_ms': round(_exclusive_ms(node), 2),
+                }
+                if node.get('Filter'):
+                    entry['filter'] = node['Filter']
+                seq_scans.append(entry)
+                columns = _filter_columns(node.get('Filter'))
+                # Only worth an index if the filter throws most rows away
+                if columns and removed > actual_rows:
+                    hints.append(f"CREATE INDEX ON {relation} ({', '.join(columns[:3])});")
+
+        if node.get('Actual Loops'):
+            low, high = sorted((max(actual_rows, 1.0), max(estimated_rows, 1.0)))
+            if high / low >= misestimate_factor:
+                misses.append({
+                    'node': _label(node),
+                    'estimated_rows': int(estimated_rows),
+                    'actual_rows': int(actual_rows),
+                    'factor': round(high / low, 1),
+                })
+
+        if node.get('Node Type') == 'Sort':
+            method = node.get('Sort Method', '')
+            if 'external' in method.lower():
+                keys = ', '.join(node.get('Sort Key', []))
+                hints.append(
+                    f"Sort on ({keys}) spilled to disk ({node.get('Sort Space Used')} kB): "
+                    "raise work_mem for this query or index the sort key"
+                )
+
+        if node.get('Node Type') == 'Nested Loop' and loops == 1:
+            for child in node.get('Plans', [])[1:]:
+                child_loops = int(child.get('Actual Loops', 0) or 0)
+                if child.get('Node Type') == 'Seq Scan' and child_loops > 1 and child.get('Relation Name'):
+                    hints.append(
+                        f"Nested loop re-scans {child['Relation Name']} {child_loops} times; "
+                        "index its join column"
+                    )
+
+    hottest.sort(key=lambda n: n['self_ms'], reverse=True)
+
+    summary: Dict[str, Any] = {
+        'planning_ms': doc.get('Planning Time'),
+        'execution_ms': round(execution_ms, 2),
+        'rows_returned': int(float(root.get('Actual Rows', 0))),
+        'hottest_nodes': hottest[:top_nodes],
+    }
+
+    hit = root.get('Shared Hit Blocks')
+    read = root.get('Shared Read Blocks')
+    if hit is not None and read is not None:
+        summary['buffers'] = {
+            'shared_hit': hit,
+            'shared_read': read,
+            'cache_hit_ratio': round(hit / (hit + read), 3) if hit + read else None,
+            'temp_written': root.get('Temp Written Blocks', 0),
+        }
+    if seq_scans:
+        summary['large_seq_scans'] = sorted(seq_scans, key=lambda s: s['rows_scanned'], reverse=True)
+    if misses:
+        summary['row_estimate_misses'] = sorted(misses, key=lambda m: m['factor'], reverse=True)[:top_nodes]
+        summary.setdefault('notes', []).append(
+            "Large estimate misses usually mean stale statistics (ANALYZE the table) or correlated filters "
+            "(consider CREATE STATISTICS)."
+        )
+    if hints:
+        summary['index_hints'] = list(dict.fromkeys(hints))
+    return summary
@@ -0,0 +1,140 @@
+"""In-process TTL + LRU cache for read-only query results.
+
+Entries are keyed by normalized SQL plus the paging parameters and hold the
+decoded result (columns, rows, metadata), so one entry serves every output
+format. Each entry remembers which tables its query reads, which lets
+callers drop everything derived from a table after it changed.
+
+Freshness is bounded three ways: a default TTL, optional per-table TTLs
+(the smallest TTL among a query's tables wins; 0 disables caching for that
+table), and a per-call ``max_staleness`` that can only make a hit stricter.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from result_format import dumps
+
+# Single-quoted literals (with '' escapes) are kept verbatim when normalizing
+_QUOTED = re.compile(r"('(?:[^']|'')*')")
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN)\s+((?:"[^"]+"|\w+)(?:\.(?:"[^"]+"|\w+))?)', re.IGNORECASE)
+# Results that change from one call to the next must not be cached
+_VOLATILE = re.compile(
+    r'\b(now|random|clock_timestamp|statement_timestamp|timeofday|current_timestamp|current_time|'
+    r'localtimestamp|pg_sleep|nextval|txid_current|gen_random_uuid|uuid_generate_v4)\b',
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace outside string literals so formatting doesn't split keys."""
+    parts = _QUOTED.split(sql.strip().rstrip(';').strip())
+    return ''.join(part if i % 2 else re.sub(r'\s+', ' ', part) for i, part in enumerate(parts))
+
+
+def referenced_tables(sql: str) -> FrozenSet[str]:
+    """Lower-cased, unqualified names of tables after FROM/JOIN (best effort)."""
+    stripped = _QUOTED.sub("''", sql)
+    names = set()
+    for ref in _TABLE_REF.findall(stripped):
+        names.add(ref.split('.')[-1].strip('"').lower())
+    return frozenset(names)
+
+
+def is_cacheable(sql: str) -> bool:
+    return not _VOLATILE.search(_QUOTED.sub("''", sql))
+
+
+class QueryCache:
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        max_entries: int = 512,
+        max_bytes: int = 32 * 1024 * 1024,
+        table_ttls: Optional[Dict[str, float]] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.table_ttls = {name.lower(): value for name, value in (table_ttls or {}).items()}
+
+        self._lock = threading.Lock()
+        # key -> (value, tables, stored_at, expires_at, size)
+        self._entries: "OrderedDict[Tuple, Tuple[Any, FrozenSet[str], float, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def key(sql: str, *params: Any) -> Tuple:
+        return (normalize_sql(sql),) + params
+
+    def ttl_for(self, tables: FrozenSet[str]) -> float:
+        return min([self.table_ttls.get(t, self.ttl) for t in tables] or [self.ttl])
+
+    def get(self, key: Tuple, max_staleness: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+        """Return ``(value, age_seconds)`` for a fresh entry, else None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, _, stored_at, expires_at, _ = entry
+                age = now - stored_at
+                if now >= expires_at:
+                    self._drop(key)
+                elif max_staleness is None or age <= max_staleness:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value, age
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, key: Tuple, value: Any, tables: FrozenSet[str]) -> bool:
+        """Store *value*; returns False when its tables or size make it uncacheable."""
+        ttl = self.ttl_for(tables)
+        if ttl <= 0:
+            return False
+        size = len(dumps(value))
+        if size > self.max_bytes // 4:
+            return False  # one result shouldn't flush most of the cache
+
+        now = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, tables, now, now + ttl, size)
+            self._bytes += size
+            self._stats['stores'] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+        return True
+
+    def invalidate(self, table: Optional[str] = None) -> int:
+        """Drop entries reading *table* (every entry if None); returns how many."""
+        with self._lock:
+            if table is None:
+                keys = list(self._entries)
+            else:
+                table = table.split('.')[-1].strip('"').lower()
+                keys = [k for k, entry in self._entries.items() if table in entry[1]]
+            for k in keys:
+                self._drop(k)
+            self._stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def _drop(self, key: Tuple) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry[4]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hit_ratio': round(self._stats['hits'] / lookups, 3) if lookups else 0.0,
+                **self._stats,
+            }
@@ -0,0 +1,160 @@
+"""Encoders for tool results returned by the MCP server.
+
+`pg_query` and friends return rows as text in one of several formats:
+
+  json      — {"columns": [...], "rows": [{col: value, ...}], ...metadata}
+  columnar  — {"columns": {col: [value, ...]}, ...metadata}; each column name once
+  csv / tsv — header line plus one line per row; metadata, if any, on a
+              leading "# key=value ..." line
+  arrow     — {"format": "arrow", "data": <base64 Arrow IPC stream>, ...metadata};
+              for programmatic clients, requires pyarrow
+
+JSON is written compactly (no indentation). orjson is used when installed
+(``pip install orjson``), the standard library otherwise. Numeric values stay
+numbers, except NUMERIC values a float cannot represent exactly and integers
+beyond 2^53, which are sent as strings; dates, UUIDs and other non-JSON
+types become strings.
+Repeated column names (``SELECT a.id, b.id``) get a suffix (``id``, ``id_2``)
+so no column is lost when rows are keyed by name.
+"""
+
+import base64
+import csv
+import datetime
+import decimal
+import io
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # only needed for format='arrow'
+    pa = None
+
+FORMATS = ('json', 'columnar', 'csv', 'tsv', 'arrow')
+
+
+# Largest integer JSON clients (JavaScript, most LLM tooling) read exactly
+_MAX_SAFE_INTEGER = 2 ** 53 - 1
+
+
+def _decimal(value: decimal.Decimal) -> Any:
+    """An int or float when clients read it exactly, else the decimal's text."""
+    if not value.is_finite():
+        return str(value)
+    if value == value.to_integral_value():
+        # Wider values (e.g. SUM(bigint)) would also overflow orjson's 64 bits
+        return int(value) if value.copy_abs() <= _MAX_SAFE_INTEGER else str(value)
+    as_float = float(value)
+    return as_float if decimal.Decimal(repr(as_float)) == value else str(value)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, decimal.Decimal):
+        return _decimal(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def unique_columns(columns: Sequence[str]) -> List[str]:
+    """*columns* with repeats renamed ``name_2``, ``name_3``, ... (order kept)."""
+    seen = set(columns)
+    counts: Dict[str, int] = {}
+    result = []
+    for name in columns:
+        if name not in counts:
+            counts[name] = 1
+            result.append(name)
+            continue
+        while True:
+            counts[name] += 1
+            candidate = f'{name}_{counts[name]}'
+            if candidate not in seen:
+                break
+        seen.add(candidate)
+        result.append(candidate)
+    return result
+
+
+def dumps(obj: Any) -> str:
+    """Compact JSON text for *obj*."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, default=_default, separators=(',', ':'), ensure_ascii=False)
+
+
+def check_format(fmt: str, allowed: Sequence[str] = FORMATS) -> str:
+    fmt = (fmt or 'json').lower()
+    if fmt not in allowed:
+        raise ValueError(f"Unsupported format {fmt!r}; use one of: {', '.join(allowed)}")
+    if fmt == 'arrow' and pa is None:
+        raise ValueError("format='arrow' requires pyarrow on the server (pip install pyarrow)")
+    return fmt
+
+
+def encode_rows(
+    columns: List[str],
+    rows: Sequence[Sequence[Any]],
+    fmt: str = 'json',
+    meta: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Encode tuple *rows* with column names *columns* plus *meta* fields."""
+    fmt = check_format(fmt)
+    meta = meta or {}
+    columns = unique_columns(columns)
+
+    if fmt in ('json', 'columnar'):
+        return dumps({**rows_payload(columns, rows, fmt), **meta})
+
+    if fmt in ('csv', 'tsv'):
+        out = io.StringIO()
+        if meta:
+            out.write('# ' + ' '.join(f'{key}={_meta_value(value)}' for key, value in meta.items()) + '\n')
+        writer = csv.writer(out, delimiter=',' if fmt == 'csv' else '\t', lineterminator='\n')
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(['' if v is None else _csv_value(v) for v in row])
+        return out.getvalue()
+
+    # arrow
+    table = pa.table({name: _arrow_column([row[i] for row in rows]) for i, name in enumerate(columns)})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return dumps({'format': 'arrow', 'data': base64.b64encode(sink.getvalue()).decode('ascii'), **meta})
+
+
+def rows_payload(columns: List[str], rows: Sequence[Sequence[Any]], fmt: str = 'json') -> Dict[str, Any]:
+    """The 'json' or 'columnar' body as a dict, for embedding in larger responses."""
+    columns = unique_columns(columns)
+    if fmt == 'columnar':
+        return {'columns': {name: [row[i] for row in rows] for i, name in enumerate(columns)}}
+    return {'columns': columns, 'rows': [dict(zip(columns, row)) for row in rows]}
+
+
+def _meta_value(value: Any) -> str:
+    return 'null' if value is None else str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        return dumps(value)
+    if isinstance(value, (str, int, float)):
+        return value
+    return _default(value)
+
+
+def _arrow_column(values: List[Any]):
+    """Arrow array for one column; falls back to strings for mixed or odd types."""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else (dumps(v) if isinstance(v, (dict, list)) else str(_default(v))) for v in values])
@@ -0,0 +1,261 @@
+"""Cached database catalog behind the `pg_schema` MCP tool.
+
+The catalog (tables, columns, keys, foreign-key relationships, row
+estimates and comments) is read from ``pg_catalog`` in three queries and
+kept in memory. It is reloaded when:
+
+  * a cheap fingerprint of the catalog changes (checked at most every
+    ``check_interval`` seconds), which catches CREATE/ALTER/DROP TABLE and
+    constraint changes, or
+  * it is older than ``ttl`` seconds, as a backstop.
+"""
+
+import difflib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_RELKINDS = {'r': 'table', 'p': 'table', 'v': 'view', 'm': 'materialized view', 'f': 'foreign table'}
+
+# Changes whenever a relation, column or constraint in the schemas is
+# created, altered or dropped (catalog rows get new xmins / oids)
+_FINGERPRINT_SQL = """
+SELECT md5(
+    coalesce((SELECT string_agg(c.oid::text || ':' || c.xmin::text, ',' ORDER BY c.oid)
+              FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+              WHERE n.nspname = ANY(%(schemas)s) AND c.relkind IN ('r','p','v','m','f')), '')
+    || '|' ||
+    coalesce((SELECT string_agg(con.oid::text, ',' ORDER BY con.oid)
+              FROM pg_constraint con JOIN pg_namespace n ON n.oid = con.connamespace
+              WHERE n.nspname = ANY(%(schemas)s)), '')
+)
+"""
+
+_TABLES_SQL = """
+SELECT c.oid, n.nspname, c.relname, c.relkind, c.reltuples::bigint, obj_description(c.oid, 'pg_class')
+FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = ANY(%(schemas)s) AND c.relkind IN ('r','p','v','m','f')
+ORDER BY n.nspname, c.relname
+"""
+
+_COLUMNS_SQL = """
+SELECT a.attrelid, a.attnum, a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull,
+       col_description(a.attrelid, a.attnum)
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = ANY(%(schemas)s) AND c.relkind IN ('r','p','v','m','f')
+  AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY a.attrelid, a.attnum
+"""
+
+_CONSTRAINTS_SQL = """
+SELECT con.conrelid, con.contype, con.conkey, con.confrelid, con.confkey
+FROM pg_constraint con
+JOIN pg_namespace n ON n.oid = con.connamespace
+WHERE n.nspname = ANY(%(schemas)s) AND con.contype IN ('p', 'u', 'f')
+ORDER BY con.conrelid, con.contype
+"""
+
+
+class SchemaCatalog:
+    def __init__(
+        self,
+        run_query: Callable[[str, Dict[str, Any]], List[tuple]],
+        schemas: Sequence[str] = ('public',),
+        ttl: float = 3600.0,
+        check_interval: float = 30.0,
+    ):
+        """*run_query(sql, params)* executes a catalog query and returns its rows."""
+        self.run_query = run_query
+        self.schemas = list(schemas)
+        self.ttl = ttl
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()  # guards the fields below; never held across a query
+        self._load_lock = threading.Lock()  # one reload at a time
+        self._tables: Dict[str, Dict[str, Any]] = {}
+        self._fingerprint: Optional[str] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _current(self) -> Dict[str, Dict[str, Any]]:
+        """Return the cached catalog, reloading it if stale or changed.
+
+        Database round trips happen outside `_lock`, so callers keep reading
+        the cached catalog while one of them checks or reloads it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            fresh = self._fingerprint is not None and now - self._loaded_at < self.ttl
+            if fresh and now - self._checked_at < self.check_interval:
+                return self._tables
+            if fresh:
+                self._checked_at = now  # this caller checks; the others keep the cache
+            tables, fingerprint, generation = self._tables, self._fingerprint, self.reloads
+
+        if fresh:
+            if self._read_fingerprint() == fingerprint:
+                return tables
+            logger.info("Schema change detected; reloading catalog")
+
+        with self._load_lock:
+            with self._lock:
+                if self.reloads != generation and self._fingerprint is not None:
+                    return self._tables  # reloaded by another caller meanwhile
+            self._load()
+        with self._lock:
+            return self._tables
+
+    def _read_fingerprint(self) -> str:
+        return self.run_query(_FINGERPRINT_SQL, {'schemas': self.schemas})[0][0]
+
+    def _load(self) -> None:
+        params = {'schemas': self.schemas}
+        fingerprint = self._read_fingerprint()
+        relations = self.run_query(_TABLES_SQL, params)
+        columns = self.run_query(_COLUMNS_SQL, params)
+        constraints = self.run_query(_CONSTRAINTS_SQL, params)
+
+        by_oid: Dict[int, Dict[str, Any]] = {}
+        names: Dict[int, str] = {}
+        for oid, schema, name, relkind, reltuples, comment in relations:
+            qualified = name if schema == 'public' else f'{schema}.{name}'
+            names[oid] = qualified
+            by_oid[oid] = {
+                'kind': _RELKINDS.get(relkind, relkind),
+                # -1 means never analyzed
+                'rows': int(reltuples) if reltuples is not None and reltuples >= 0 else None,
+                'comment': comment,
+                'columns': {},
+                'primary_key': [],
+                'unique': [],
+                'references': [],
+                'referenced_by': [],
+            }
+
+        attnames: Dict[int, Dict[int, str]] = {}
+        for relid, attnum, attname, coltype, notnull, comment in columns:
+            if relid not in by_oid:
+                continue
+            attnames.setdefault(relid, {})[attnum] = attname
+            by_oid[relid]['columns'][attname] = {'type': coltype, 'not_null': notnull, 'comment': comment}
+
+        for relid, contype, conkey, confrelid, confkey in constraints:
+            if relid not in by_oid:
+                continue
+            cols = [attnames.get(relid, {}).get(k, str(k)) for k in conkey or []]
+            if contype == 'p':
+                by_oid[relid]['primary_key'] = cols
+            elif contype == 'u':
+                by_oid[relid]['unique'].append(cols)
+            elif contype == 'f' and confrelid in names:
+                ref_cols = [attnames.get(confrelid, {}).get(k, str(k)) for k in confkey or []]
+                target = f"{names[confrelid]}({', '.join(ref_cols)})"
+                by_oid[relid]['references'].append(f"({', '.join(cols)}) -> {target}")
+                by_oid[confrelid]['referenced_by'].append(f"{names[relid]}({', '.join(cols)})")
+
+        tables = {names[oid]: info for oid, info in by_oid.items()}
+        with self._lock:
+            self._tables = tables
+            self._fingerprint = fingerprint
+            self._loaded_at = self._checked_at = time.monotonic()
+            self.reloads += 1
+        logger.info(f"Loaded schema catalog: {len(tables)} relations")
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._fingerprint = None
+
+    # ------------------------------------------------------------------
+    # Views
+    # ------------------------------------------------------------------
+
+    def overview(self) -> Dict[str, Any]:
+        """Every relation with its kind, row estimate and comment."""
+        tables = self._current()
+        return {
+            'tables': {
+                name: {k: v for k, v in (('kind', t['kind']), ('rows', t['rows']), ('comment', t['comment']))
+                       if v is not None and not (k == 'kind' and v == 'table')}
+                for name, t in tables.items()
+            },
+            'hint': "Call pg_schema with tables=[...] for columns, keys and relationships.",
+        }
+
+    @staticmethod
+    def _key(name: str) -> str:
+        """Lookup key for a table name; public tables are stored unqualified."""
+        key = name.strip().strip('"').lower()
+        return key[len('public.'):] if key.startswith('public.') else key
+
+    def describe(self, requested: Sequence[str]) -> Dict[str, Any]:
+        """Compact column, key and relationship info for the *requested* tables."""
+        tables = self._current()
+        lookup = {name.lower(): name for name in tables}
+        result: Dict[str, Any] = {}
+        unknown: Dict[str, List[str]] = {}
+
+        for raw in requested:
+            name = lookup.get(self._key(raw))
+            if name is None:
+                unknown[raw] = difflib.get_close_matches(self._key(raw), list(lookup), n=3)
+                continue
+            t = tables[name]
+            pk = set(t['primary_key'])
+            columns = []
+            for col, info in t['columns'].items():
+                # "name type [PK] [NOT NULL] [-- comment]"
+                entry = f"{col} {info['type']}"
+                if col in pk:
+                    entry += ' PK'
+                elif info['not_null']:
+                    entry += ' NOT NULL'
+                if info['comment']:
+                    entry += f" -- {info['comment']}"
+                columns.append(entry)
+            described = {'columns': columns}
+            for key in ('kind', 'rows', 'comment'):
+                if t[key] is not None and not (key == 'kind' and t[key] == 'table'):
+                    described[key] = t[key]
+            for key in ('unique', 'references', 'referenced_by'):
+                if t[key]:
+                    described[key] = t[key]
+            result[name] = described
+
+        out: Dict[str, Any] = {'tables': result}
+        if unknown:
+            out['unknown'] = {name: {'did_you_mean': matches} for name, matches in unknown.items()}
+        return out
+
+    def resolve(self, name: str) -> Tuple[str, str, Dict[str, Any]]:
+        """Schema, relation name and cached info for table *name*.
+
+        Raises ValueError, with close matches, when the table is unknown;
+        callers use this to validate identifiers before quoting them.
+        """
+        tables = self._current()
+        lookup = {qualified.lower(): qualified for qualified in tables}
+        qualified = lookup.get(self._key(name))
+        if qualified is None:
+            matches = difflib.get_close_matches(self._key(name), list(lookup), n=3)
+            hint = f"; did you mean {', '.join(matches)}?" if matches else "; pg_schema lists the tables"
+            raise ValueError(f"Unknown table {name!r}{hint}")
+        schema, _, relation = qualified.rpartition('.')
+        return schema or 'public', relation, tables[qualified]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'relations': len(self._tables),
+                'reloads': self.reloads,
+                'age_s': round(time.monotonic() - self._loaded_at, 1) if self._fingerprint else None,
+            }
@@ -0,0 +1,91 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# The server modules are flat files next to this directory
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+class FakeCursor:
+    """Records executed SQL; fetchall() answers from the connection's canned results."""
+
+    description = None
+    rowcount = -1
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, params=None):
+        sql = str(sql)
+        self.conn.executed.append(sql)
+        if self.conn.error is not None:
+            raise self.conn.error
+        self._rows = next((rows for prefix, rows in self.conn.results if sql.startswith(prefix)), [])
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchmany(self, size):
+        return list(self._rows[:size])
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    closed = 0
+
+    def __init__(self, results=()):
+        # (SQL prefix, rows) pairs, first match wins
+        self.results = list(results)
+        self.executed = []
+        self.error = None  # raised by every execute() when set, e.g. a dropped session
+
+    def cursor(self, name=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+    def get_transaction_status(self):
+        return 0  # psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+@pytest.fixture
+def server():
+    """newest-mcp-server.py loaded as a module (its file name is not importable)."""
+    pytest.importorskip('fastmcp')
+    spec = importlib.util.spec_from_file_location('newest_mcp_server', os.path.join(SERVER_DIR, 'newest-mcp-server.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def connect(server, monkeypatch):
+    """Route the server's pool to a FakeConnection built from canned results."""
+    def connect(results=()):
+        conn = FakeConnection(results)
+        monkeypatch.setattr(server, 'get_db_connection', lambda: conn)
+        monkeypatch.setattr(server, 'return_db_connection', lambda _conn: None)
+        return conn
+    return connect
@@ -0,0 +1,82 @@
+"""ConnectionPool checkout, validation and return rules."""
+
+import threading
+
+import psycopg2
+import pytest
+
+import db_pool
+from conftest import FakeConnection
+from db_pool import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Connections handed out by a fake psycopg2.connect, in order."""
+    conns = []
+
+    def connect(**params):
+        conns.append(FakeConnection())
+        return conns[-1]
+
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', connect)
+    return conns
+
+
+def test_checkout_times_out_when_pool_is_exhausted(opened):
+    pool = ConnectionPool({}, minconn=0, maxconn=1)
+    pool.getconn()
+    with pytest.raises(PoolTimeout, match="pool 'primary' size 1"):
+        pool.getconn(timeout=0.05)
+    assert pool.stats()['timeouts'] == 1
+    assert len(opened) == 1  # no unpooled connection was opened
+
+
+def test_waiter_gets_the_returned_connection(opened):
+    pool = ConnectionPool({}, minconn=0, maxconn=1)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+    assert pool.getconn(timeout=5) is conn
+    stats = pool.stats()
+    assert stats['waits'] == 1 and stats['connects'] == 1
+
+
+def test_recently_used_connection_is_not_probed(opened):
+    pool = ConnectionPool({}, minconn=1, max_idle=60)
+    assert pool.getconn() is opened[0]
+    assert opened[0].executed == []
+
+
+def test_idle_connection_is_validated_and_discarded_when_dead(opened):
+    pool = ConnectionPool({}, minconn=1, max_idle=-1)
+    stale = opened[0]
+    stale.error = psycopg2.OperationalError('server closed the connection unexpectedly')
+
+    conn = pool.getconn()
+
+    assert conn is opened[1]
+    assert stale.executed == ['SELECT 1'] and stale.closed
+    stats = pool.stats()
+    assert stats['validation_failures'] == 1
+    assert stats['discarded'] == 1
+    assert stats['size'] == 1
+
+
+def test_idle_connection_that_answers_is_reused(opened):
+    pool = ConnectionPool({}, minconn=1, max_idle=-1)
+    assert pool.getconn() is opened[0]
+    assert opened[0].executed == ['SELECT 1']
+
+
+def test_connection_from_another_pool_is_closed_not_pooled(opened):
+    pool = ConnectionPool({}, minconn=0, maxconn=1)
+    other = ConnectionPool({}, minconn=0, maxconn=1, name='other')
+    foreign = other.getconn()
+
+    pool.putconn(foreign)
+
+    assert foreign.closed
+    stats = pool.stats()
+    assert stats['idle'] == 0 and stats['size'] == 0
+    assert pool.getconn() is not foreign
+
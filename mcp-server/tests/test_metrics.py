@@ -0,0 +1,68 @@
+"""Prometheus text exposition of the metrics registry."""
+
+from metrics import Registry, SlowQueryLog
+
+
+def test_counter_renders_labels_escaped_and_sorted():
+    registry = Registry()
+    calls = registry.counter('mcp_tool_calls_total', 'Tool calls.', ['tool', 'status'])
+    calls.inc(tool='pg_query', status='ok')
+    calls.inc(2, tool='pg_query', status='ok')
+    calls.inc(tool='pg_schema', status='bad "x"\nline')
+
+    assert registry.render() == (
+        '# HELP mcp_tool_calls_total Tool calls.\n'
+        '# TYPE mcp_tool_calls_total counter\n'
+        'mcp_tool_calls_total{tool="pg_query",status="ok"} 3\n'
+        'mcp_tool_calls_total{tool="pg_schema",status="bad \\"x\\"\\nline"} 1\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    registry = Registry()
+    latency = registry.histogram('mcp_tool_seconds', 'Tool latency.', ['tool'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, tool='pg_query')
+
+    lines = registry.render().splitlines()
+
+    assert lines[1] == '# TYPE mcp_tool_seconds histogram'
+    assert lines[2:] == [
+        'mcp_tool_seconds_bucket{tool="pg_query",le="0.1"} 2',
+        'mcp_tool_seconds_bucket{tool="pg_query",le="1"} 3',
+        'mcp_tool_seconds_bucket{tool="pg_query",le="+Inf"} 4',
+        'mcp_tool_seconds_sum{tool="pg_query"} 3.65',
+        'mcp_tool_seconds_count{tool="pg_query"} 4',
+    ]
+
+
+def test_collected_values_are_read_at_scrape_time():
+    sizes = {'primary': 3}
+    registry = Registry()
+    registry.collected('mcp_pool_size', 'Open connections.', ['pool'],
+                       lambda: [((name,), value) for name, value in sizes.items()])
+    assert 'mcp_pool_size{pool="primary"} 3\n' in registry.render()
+    sizes['primary'] = 5
+    assert 'mcp_pool_size{pool="primary"} 5\n' in registry.render()
+
+
+def test_failing_collector_does_not_break_the_scrape():
+    registry = Registry()
+    registry.collected('mcp_broken', 'Broken.', [], lambda: 1 / 0)
+    registry.counter('mcp_ok_total', 'Fine.').inc()
+
+    body = registry.render()
+
+    assert '# mcp_broken unavailable: division by zero\n' in body
+    assert body.endswith('mcp_ok_total 1\n')
+
+
+def test_slow_query_log_keeps_recent_slow_calls_newest_first():
+    log = SlowQueryLog(threshold_ms=100, max_samples=2, max_sql_chars=8)
+    assert not log.record('pg_query', 99, 'SELECT 1')
+    for n in range(3):
+        assert log.record('pg_query', 150 + n, f'SELECT {n} FROM emails')
+
+    samples = log.samples()
+    assert [s['duration_ms'] for s in samples] == [152, 151]
+    assert samples[0]['sql'] == 'SELECT 2'
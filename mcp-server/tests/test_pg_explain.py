@@ -0,0 +1,26 @@
+"""pg_explain output in both formats."""
+
+import json
+
+TEXT_PLAN = [
+    ('Seq Scan on orders  (cost=0.00..35.50 rows=2550 width=12)',),
+    ('  Filter: (total > 100)',),
+]
+JSON_PLAN = [([{'Plan': {'Node Type': 'Seq Scan', 'Total Cost': 35.5, 'Plan Rows': 2550}}],)]
+
+
+def test_text_plan_is_the_plan_lines(server, connect):
+    conn = connect([('EXPLAIN (FORMAT TEXT)', TEXT_PLAN)])
+
+    out = server._pg_explain('SELECT * FROM orders WHERE total > 100;', 'text')
+
+    assert out == 'Seq Scan on orders  (cost=0.00..35.50 rows=2550 width=12)\n  Filter: (total > 100)'
+    assert conn.executed[-1] == 'EXPLAIN (FORMAT TEXT) SELECT * FROM orders WHERE total > 100'
+
+
+def test_json_plan_keeps_the_whole_document(server, connect):
+    connect([('EXPLAIN (FORMAT JSON)', JSON_PLAN)])
+
+    out = json.loads(server._pg_explain('SELECT * FROM orders', 'json'))
+
+    assert out == [{'QUERY PLAN': [{'Plan': {'Node Type': 'Seq Scan', 'Total Cost': 35.5, 'Plan Rows': 2550}}]}]
@@ -0,0 +1,31 @@
+"""pg_query statements outside the server-side cursor path."""
+
+import pytest
+
+
+@pytest.mark.parametrize('sql', [
+    'EXPLAIN ANALYZE SELECT * FROM orders',
+    'explain (buffers, analyse) SELECT 1',
+])
+def test_explain_analyze_is_refused_before_it_runs(server, connect, sql):
+    conn = connect()
+    with pytest.raises(ValueError, match='pg_profile_query'):
+        server._fetch_page(conn, sql, 10, 0)
+    assert conn.executed == []
+
+
+def test_plain_explain_still_runs(server, connect):
+    conn = connect([('EXPLAIN', [('Seq Scan on orders',)])])
+    server._fetch_page(conn, 'EXPLAIN SELECT * FROM orders', 10, 0)
+    assert conn.executed == ['EXPLAIN SELECT * FROM orders']
+
+
+@pytest.mark.parametrize('sql, ordered', [
+    ('SELECT * FROM orders ORDER BY id', True),
+    ('select id from orders order\n by id desc limit 5', True),
+    ('SELECT * FROM (SELECT * FROM orders ORDER BY id) o', False),
+    ("SELECT 'ORDER BY' AS label FROM orders", False),
+    ('SELECT id, row_number() OVER (ORDER BY id) FROM orders', False),
+])
+def test_paging_warning_needs_a_result_order_by(server, sql, ordered):
+    assert server._orders_rows(sql) is ordered
@@ -0,0 +1,23 @@
+"""pg_query_batch accepts queries only, statement by statement."""
+
+import json
+
+
+def test_non_query_statements_are_refused_individually(server, connect, monkeypatch):
+    conn = connect()
+    pages = []
+
+    def fetch_page(_conn, sql, limit, offset):
+        pages.append(sql)
+        return ['n'], [(1,)], 1, 0, None
+
+    monkeypatch.setattr(server, '_fetch_page', fetch_page)
+
+    out = json.loads(server._pg_query_batch(
+        ['SELECT 1 AS n', 'DELETE FROM orders', 'SHOW work_mem', '(SELECT 1 AS n);'], None, 'json'))
+
+    assert [r['ok'] for r in out['results']] == [True, False, False, True]
+    assert 'can be batched' in out['results'][1]['error']
+    assert 'can be batched' in out['results'][2]['error']
+    assert pages == ['SELECT 1 AS n', '(SELECT 1 AS n)']
+    assert not any('DELETE' in sql or 'SHOW' in sql for sql in conn.executed)
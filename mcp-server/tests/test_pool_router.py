@@ -0,0 +1,94 @@
+"""PoolRouter replica selection, lag exclusion and primary fallback."""
+
+import psycopg2
+import pytest
+
+import db_pool
+from conftest import FakeConnection
+from db_pool import ConnectionPool, PoolRouter
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    """Replay lag per DSN; DSNs in ``down`` refuse connections."""
+    state = {'lag': {}, 'down': set(), 'opened': []}
+
+    def connect(dsn):
+        if dsn in state['down']:
+            raise psycopg2.OperationalError(f'could not connect to {dsn}')
+        conn = FakeConnection([('', [(state['lag'].get(dsn, 0.0),)])])
+        conn.dsn = dsn
+        state['opened'].append(conn)
+        return conn
+
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', connect)
+    return state
+
+
+@pytest.fixture
+def make_router():
+    routers = []
+
+    def make(*replicas, **kwargs):
+        pools = [ConnectionPool({'dsn': name}, minconn=0, maxconn=2, name=name) for name in replicas]
+        router = PoolRouter(ConnectionPool({'dsn': 'primary'}, minconn=0, maxconn=2), pools,
+                            check_interval=3600, **kwargs)
+        routers.append(router)
+        return router
+
+    yield make
+    for router in routers:
+        router.closeall()
+
+
+def test_lagging_replica_is_excluded(servers, make_router):
+    servers['lag'] = {'r1': 45.0, 'r2': 2.0}
+    router = make_router('r1', 'r2', max_lag=30)
+
+    assert router.getconn().dsn == 'r2'
+    health = {r['name']: r for r in router.stats()['replicas']}
+    assert not health['r1']['usable'] and 'replay lag' in health['r1']['error']
+    assert health['r2']['usable'] and health['r2']['lag_s'] == 2.0
+
+
+def test_falls_back_to_primary_when_no_replica_is_usable(servers, make_router):
+    servers['lag'] = {'r1': 45.0}
+    servers['down'] = {'r2'}
+    router = make_router('r1', 'r2', max_lag=30)
+
+    assert router.getconn().dsn == 'primary'
+    assert router.stats()['routed'] == {'primary': 0, 'replica': 0, 'fallback': 1}
+
+
+def test_failed_replica_checkout_falls_back_and_marks_it_unusable(servers, make_router):
+    router = make_router('r1')
+    for conn in servers['opened']:
+        conn.closed = 1  # the health-check connection died while idle
+    servers['down'] = {'r1'}
+
+    assert router.getconn().dsn == 'primary'
+    replica = router.stats()['replicas'][0]
+    assert not replica['usable'] and 'could not connect' in replica['error']
+
+
+def test_connection_goes_back_to_the_pool_it_came_from(servers, make_router):
+    router = make_router('r1')
+    conn = router.getconn()
+    router.putconn(conn)
+
+    stats = router.stats()
+    assert stats['replicas'][0]['idle'] == 1 and stats['replicas'][0]['in_use'] == 0
+    assert stats['idle'] == 0 and stats['routed']['replica'] == 1
+
+
+def test_replica_recovers_on_the_next_health_check(servers, make_router):
+    servers['lag'] = {'r1': 45.0}
+    router = make_router('r1', max_lag=30)
+    assert router.getconn().dsn == 'primary'
+
+    for conn in servers['opened']:
+        if conn.dsn == 'r1':
+            conn.results = [('', [(0.0,)])]  # caught up
+    router.check_replicas()
+
+    assert router.getconn().dsn == 'r1'
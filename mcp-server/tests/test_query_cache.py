@@ -0,0 +1,95 @@
+"""QueryCache freshness, byte-bounded LRU eviction and table invalidation."""
+
+import pytest
+
+import query_cache
+from query_cache import QueryCache, referenced_tables
+from result_format import dumps
+
+VALUE = {'columns': ['n'], 'rows': [['x' * 100]]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(query_cache, 'time', clock)
+    return clock
+
+
+def store(cache, sql):
+    key = cache.key(sql)
+    assert cache.put(key, VALUE, referenced_tables(sql))
+    return key
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = QueryCache(ttl=10)
+    key = store(cache, 'SELECT count(*) FROM emails')
+    clock.now += 9
+    assert cache.get(key) == (VALUE, 9)
+    clock.now += 1
+    assert cache.get(key) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_shortest_table_ttl_wins_and_zero_disables(clock):
+    cache = QueryCache(ttl=60, table_ttls={'jobs': 5, 'audit': 0})
+    key = store(cache, 'SELECT * FROM emails JOIN jobs ON jobs.email_id = emails.id')
+    clock.now += 5
+    assert cache.get(key) is None
+    assert not cache.put(cache.key('SELECT * FROM audit'), VALUE, frozenset({'audit'}))
+
+
+def test_max_staleness_only_tightens(clock):
+    cache = QueryCache(ttl=60)
+    key = store(cache, 'SELECT 1 FROM emails')
+    clock.now += 20
+    assert cache.get(key, max_staleness=10) is None
+    assert cache.get(key, max_staleness=30) is not None
+
+
+def test_byte_budget_evicts_least_recently_used(clock):
+    size = len(dumps(VALUE))
+    cache = QueryCache(max_bytes=size * 4 + size // 2)
+    keys = [store(cache, f'SELECT {i} FROM emails') for i in range(4)]
+    assert cache.get(keys[0]) is not None  # now the most recently used
+
+    store(cache, 'SELECT 4 FROM emails')
+
+    assert cache.get(keys[1]) is None
+    assert all(cache.get(k) is not None for k in (keys[0], keys[2], keys[3]))
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['bytes'] == size * 4
+
+
+def test_oversized_result_is_not_cached(clock):
+    cache = QueryCache(max_bytes=len(dumps(VALUE)) * 3)
+    assert not cache.put(cache.key('SELECT * FROM emails'), VALUE, frozenset({'emails'}))
+    assert cache.stats()['entries'] == 0
+
+
+def test_invalidating_a_table_drops_only_its_entries(clock):
+    cache = QueryCache()
+    emails = store(cache, 'SELECT * FROM emails')
+    joined = store(cache, 'SELECT * FROM companies c JOIN public."Emails" e ON e.company_id = c.id')
+    companies = store(cache, 'SELECT * FROM companies')
+
+    assert cache.invalidate('public.emails') == 2
+
+    assert cache.get(emails) is None and cache.get(joined) is None
+    assert cache.get(companies) is not None
+    assert cache.invalidate() == 1
+
+
+def test_whitespace_outside_literals_shares_a_key():
+    assert QueryCache.key('SELECT  *\n FROM emails ;') == QueryCache.key('SELECT * FROM emails')
+    assert QueryCache.key("SELECT 'a  b'") != QueryCache.key("SELECT 'a b'")
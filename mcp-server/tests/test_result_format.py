@@ -0,0 +1,36 @@
+"""Encoding of NUMERIC values and repeated column names."""
+
+import json
+from decimal import Decimal
+
+import pytest
+
+import result_format
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(result_format, 'orjson', None)
+    return request.param
+
+
+def test_wide_numeric_is_sent_as_text(encoder):
+    wide = [Decimal('123456789012345678901234567890'), Decimal('-123456789012345678901234567890')]
+    out = json.loads(result_format.encode_rows(['total'], [(value,) for value in wide]))
+    assert out['rows'] == [{'total': '123456789012345678901234567890'},
+                           {'total': '-123456789012345678901234567890'}]
+
+
+def test_numeric_stays_a_number_when_exact(encoder):
+    values = [Decimal(2 ** 53 - 1), Decimal(2 ** 53), Decimal('12.34'), Decimal('0.1000000000000000055511151231257827')]
+    out = json.loads(result_format.encode_rows(['v'], [(v,) for v in values], 'columnar'))
+    assert out['columns']['v'] == [2 ** 53 - 1, '9007199254740992', 12.34, '0.1000000000000000055511151231257827']
+
+
+def test_repeated_columns_are_all_kept(encoder):
+    out = json.loads(result_format.encode_rows(['id', 'id', 'id_2'], [(1, 2, 3)]))
+    assert out['columns'] == ['id', 'id_3', 'id_2']
+    assert out['rows'] == [{'id': 1, 'id_3': 2, 'id_2': 3}]
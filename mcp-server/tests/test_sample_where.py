@@ -0,0 +1,23 @@
+"""The `where` argument of the sampling tools is one boolean expression."""
+
+import pytest
+
+
+@pytest.mark.parametrize('where', [
+    "true) UNION SELECT usename, passwd FROM pg_shadow WHERE (true",
+    "folder = 'inbox' -- ",
+    "(folder = 'inbox'",
+])
+def test_where_that_escapes_its_parentheses_is_refused(server, connect, where):
+    conn = connect()
+    with pytest.raises(ValueError, match='single boolean expression'):
+        server._check_where(conn.cursor(), 'public', 'emails', where)
+    assert conn.executed == []
+
+
+@pytest.mark.parametrize('where', [
+    "folder = 'inbox' AND subject LIKE '%)%'",
+    "(sent_at >= now() - interval '30 days') OR \"Folder\" = 'sent'",
+])
+def test_balanced_where_is_accepted(server, where):
+    assert not server._closes_early(where)
@@ -0,0 +1,86 @@
+"""SchemaCatalog name resolution and fingerprint checks."""
+
+import threading
+import time
+
+import pytest
+
+import schema_catalog
+from schema_catalog import SchemaCatalog
+
+_RELATIONS = [
+    (1, 'public', 'emails', 'r', 120, None),
+    (2, 'archive', 'emails', 'r', 40, None),
+]
+_COLUMNS = [
+    (1, 1, 'id', 'integer', True, None),
+    (2, 1, 'id', 'integer', True, None),
+]
+
+
+class FakeCatalogQueries:
+    def __init__(self):
+        self.fingerprint = 'v1'
+        self.calls = []
+        self.gate = None  # set to an Event to hold the fingerprint query
+
+    def __call__(self, sql, params):
+        self.calls.append(sql)
+        if sql == schema_catalog._FINGERPRINT_SQL:
+            if self.gate is not None:
+                self.gate.wait(5)
+            return [(self.fingerprint,)]
+        if sql == schema_catalog._TABLES_SQL:
+            return _RELATIONS
+        if sql == schema_catalog._COLUMNS_SQL:
+            return _COLUMNS
+        return []
+
+
+@pytest.fixture
+def queries():
+    return FakeCatalogQueries()
+
+
+@pytest.mark.parametrize('name', ['emails', 'public.emails', 'Public.Emails', '"public.emails"'])
+def test_public_tables_resolve_with_or_without_schema(queries, name):
+    catalog = SchemaCatalog(queries, schemas=('public', 'archive'))
+    assert catalog.resolve(name)[:2] == ('public', 'emails')
+    out = catalog.describe([name])
+    assert list(out['tables']) == ['emails']
+    assert 'unknown' not in out
+
+
+def test_other_schemas_stay_qualified(queries):
+    catalog = SchemaCatalog(queries, schemas=('public', 'archive'))
+    assert catalog.resolve('archive.emails')[:2] == ('archive', 'emails')
+    out = catalog.describe(['archive.emails', 'emails_archive'])
+    assert list(out['tables']) == ['archive.emails']
+    assert out['unknown']['emails_archive']['did_you_mean']
+
+
+def test_fingerprint_check_does_not_block_readers(queries):
+    catalog = SchemaCatalog(queries, check_interval=0.0)
+    catalog.overview()
+    queries.gate = threading.Event()
+    checker = threading.Thread(target=catalog.overview)
+    checker.start()
+    try:
+        while queries.calls.count(schema_catalog._FINGERPRINT_SQL) < 2:
+            time.sleep(0.001)
+        # The checker is parked inside its fingerprint query
+        assert catalog.stats()['relations'] == 2
+        catalog.check_interval = 60.0
+        assert 'emails' in catalog.overview()['tables']
+    finally:
+        queries.gate.set()
+        checker.join()
+    assert catalog.reloads == 1
+
+
+def test_changed_fingerprint_reloads(queries):
+    catalog = SchemaCatalog(queries, check_interval=0.0)
+    catalog.overview()
+    queries.fingerprint = 'v2'
+    catalog.overview()
+    assert catalog.reloads == 2
@@ -0,0 +1,127 @@
+"""Long-lived API clients shared by every request of the UI app.
+
+Building an ``OpenAI`` or Supabase client opens a fresh HTTP connection pool,
+so doing it per request costs a TLS handshake on every call. ``AppClients`` is
+created once at import time of ``persistence_ui_memory.py`` and closed on
+process exit; request handlers only ever borrow it.
+
+Environment variables:
+  OPENAI_API_KEY        — OpenAI key used for /ask_mcp (only needed there; the
+                          client is built on first use)
+  SUPABASE_URL          — Supabase project URL (chat persistence)
+  SUPABASE_ANON_KEY     — Supabase anon key
+  MCP_SERVER_URL        — MCP server endpoint (default http://localhost:8080/mcp/)
+  HTTP_MAX_CONNECTIONS  — Max pooled HTTP connections to OpenAI (default 100)
+  HTTP_KEEPALIVE_EXPIRY — Seconds an idle keep-alive connection is kept (default 60)
+  HEALTH_CHECK_TTL      — Seconds a health-check result is reused (default 30)
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import OpenAI
+from supabase import Client, create_client
+
+logger = logging.getLogger(__name__)
+
+
+class AppClients:
+    """Owns the OpenAI, Supabase and MCP configuration for the process."""
+
+    def __init__(self):
+        self.supabase_url = os.getenv('SUPABASE_URL')
+        self.supabase_key = os.getenv('SUPABASE_ANON_KEY')
+        if not self.supabase_url or not self.supabase_key:
+            raise ValueError("Please set SUPABASE_URL and SUPABASE_ANON_KEY environment variables")
+
+        self.mcp_server_url = os.getenv('MCP_SERVER_URL', 'http://localhost:8080/mcp/')
+        self.health_check_ttl = float(os.getenv('HEALTH_CHECK_TTL', '30'))
+
+        max_connections = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+        self.http = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60')),
+            ),
+            # Hosted MCP tool runs can take well over a minute end to end
+            timeout=httpx.Timeout(300.0, connect=10.0),
+        )
+
+        self._openai: Optional[OpenAI] = None
+        self._openai_lock = threading.Lock()
+        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+
+        self._health: Dict[str, Any] = {}
+        self._health_checked_at = 0.0
+        self._health_lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def openai(self) -> OpenAI:
+        """The shared OpenAI client, built on first use.
+
+        Raises ValueError when OPENAI_API_KEY is unset, so only the requests
+        that need OpenAI fail, not the whole app.
+        """
+        if self._openai is None:
+            with self._openai_lock:
+                if self._openai is None:
+                    api_key = os.getenv('OPENAI_API_KEY')
+                    if not api_key:
+                        raise ValueError("Please set the OPENAI_API_KEY environment variable")
+                    self._openai = OpenAI(api_key=api_key, http_client=self.http)
+        return self._openai
+
+    # ------------------------------------------------------------------
+    # Health checks
+    # ------------------------------------------------------------------
+
+    def health(self, force: bool = False) -> Dict[str, Any]:
+        """Return cached reachability of each dependency, re-probing after the TTL."""
+        with self._health_lock:
+            stale = time.monotonic() - self._health_checked_at > self.health_check_ttl
+            if force or stale or not self._health:
+                self._health = {
+                    'openai': self._check(lambda: self.openai.models.list()),
+                    'supabase': self._check(
+                        lambda: self.supabase.table('openai_memory_chats').select('id').limit(1).execute()
+                    ),
+                    # The MCP endpoint only speaks POST; any HTTP answer means it is up
+                    'mcp': self._check(lambda: self.http.get(self.mcp_server_url, timeout=5.0)),
+                }
+                self._health_checked_at = time.monotonic()
+            return dict(self._health)
+
+    @staticmethod
+    def _check(probe) -> Dict[str, Any]:
+        start = time.monotonic()
+        try:
+            probe()
+            return {'ok': True, 'latency_ms': round((time.monotonic() - start) * 1000, 1)}
+        except Exception as exc:
+            return {'ok': False, 'error': str(exc)}
+
+    # ------------------------------------------------------------------
+    # Shutdown
+    # ------------------------------------------------------------------
+
+    def close(self) -> None:
+        """Close pooled HTTP connections. Safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+
+        session: Optional[httpx.Client] = getattr(getattr(self.supabase, 'postgrest', None), 'session', None)
+        for client in (session, self.http):
+            if client is None:
+                continue
+            try:
+                client.close()
+            except Exception as exc:
+                logger.warning(f"Error closing HTTP client: {exc}")
+        logger.info("Shared API clients closed")
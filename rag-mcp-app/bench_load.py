@@ -0,0 +1,83 @@
+"""Closed-loop load test for the UI endpoints.
+
+Sends the same question to `/ask` (or `/ask_mcp`) from N concurrent clients
+for a fixed duration at each concurrency level and prints throughput and
+latency percentiles, so serving modes can be compared:
+
+    python bench_load.py --url http://127.0.0.1:5000 --levels 1 4 16 64
+    python bench_load.py --endpoint /ask_mcp --question "How many companies are there?"
+
+Run it against the Flask dev server and against gunicorn (see
+gunicorn.conf.py); with the threaded server, requests/s should keep rising
+with concurrency until the upstream APIs or pool sizes become the limit.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def _client_loop(session, url, payload, deadline, latencies, errors, lock):
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            resp = session.post(url, json=payload, timeout=300)
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.monotonic() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors.append(elapsed)
+
+
+def run_level(url, payload, concurrency, duration):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(_client_loop, requests.Session(), url, payload, deadline, latencies, errors, lock)
+
+    completed = len(latencies)
+    qs = statistics.quantiles(latencies, n=100) if completed >= 2 else [0.0] * 99
+    return {
+        "concurrency": concurrency,
+        "completed": completed,
+        "errors": len(errors),
+        "rps": completed / duration,
+        "p50": qs[49],
+        "p95": qs[94],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the RAG/MCP UI endpoints.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--endpoint", default="/ask", choices=["/ask", "/ask_mcp"])
+    parser.add_argument("--question", default="How many vacation days do employees get?")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per concurrency level")
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/") + args.endpoint
+    payload = {"question": args.question}
+
+    print(f"{'conc':>5} {'done':>6} {'err':>5} {'req/s':>8} {'p50 s':>7} {'p95 s':>7}")
+    for level in args.levels:
+        r = run_level(url, payload, level, args.duration)
+        print(
+            f"{r['concurrency']:>5} {r['completed']:>6} {r['errors']:>5} "
+            f"{r['rps']:>8.2f} {r['p50']:>7.2f} {r['p95']:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
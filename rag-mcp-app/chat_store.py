@@ -0,0 +1,580 @@
+"""Supabase-backed chat persistence helpers for persistence_ui_memory.py."""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+try:  # POSIX only; used to tell live journals from orphaned ones
+    import fcntl
+except ImportError:  # pragma: no cover - Windows dev machines
+    fcntl = None
+
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseIdConflict(Exception):
+    """A session's conversation kept moving on in other workers during a turn."""
+
+    def __init__(self, session_id: str):
+        super().__init__(f"Session {session_id} was updated concurrently; retry the question")
+        self.session_id = session_id
+
+
+class ResponseIdCache:
+    """Cache of each session's latest OpenAI response id, with compare-and-set writes.
+
+    Reads are served from process memory, so an /ask_mcp turn makes no
+    Supabase call to find `previous_response_id`. Each entry remembers the
+    `response_version` of the `chat_sessions` row it came from. A turn reads
+    ``(response_id, version)`` with `current()` and stores its own response
+    with ``set(session_id, new_id, version)``, which writes through the
+    `set_session_response_id` RPC only if the row still has that version.
+
+    If another worker moved the conversation on in the meantime, the cached
+    id was stale and the turn was answered on an old branch. `set()` then
+    refuses the write, adopts the row's current id, and returns False so the
+    caller re-runs the turn on that id instead of forking the conversation.
+
+    Entries expire after RESPONSE_ID_CACHE_TTL seconds (default 60), which
+    bounds how long a worker keeps offering a stale id (and paying for
+    re-runs) after another worker answered in the same session.
+    """
+
+    def __init__(self, supabase: Client, ttl: Optional[float] = None):
+        self.supabase = supabase
+        self.ttl = ttl if ttl is not None else float(os.getenv('RESPONSE_ID_CACHE_TTL', '60'))
+        # session_id -> (response_id, response_version, loaded_at)
+        self._entries: Dict[str, Tuple[Optional[str], int, float]] = {}
+        self._lock = threading.Lock()
+
+    def current(self, session_id: str) -> Tuple[Optional[str], int]:
+        """Latest response id for *session_id* and its version, loading them on a miss."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+        if entry and time.monotonic() - entry[2] < self.ttl:
+            return entry[0], entry[1]
+
+        try:
+            result = (
+                self.supabase.table('chat_sessions')
+                .select('latest_response_id, response_version')
+                .eq('session_id', session_id)
+                .limit(1)
+                .execute()
+            )
+        except Exception as e:
+            logger.warning(f"Error getting latest response_id: {e}")
+            return (entry[0], entry[1]) if entry else (None, 0)
+
+        row = result.data[0] if result.data else {'latest_response_id': None, 'response_version': 0}
+        self._remember(session_id, row, force=True)
+        return row['latest_response_id'], row['response_version']
+
+    def get(self, session_id: str) -> Optional[str]:
+        """Latest response id for *session_id*."""
+        return self.current(session_id)[0]
+
+    def set(self, session_id: str, response_id: str, expected_version: int) -> bool:
+        """Store *response_id* if the session is still at *expected_version*.
+
+        Returns False, with the cache now holding the session's current id,
+        when another turn got there first. The write happens before
+        returning, never behind a queue, so other workers see it at once.
+        Storage errors are logged and count as stored, as before.
+        """
+        try:
+            row = self._write(session_id, response_id, expected_version)
+        except Exception as e:
+            logger.warning(f"Error storing response_id: {e}")
+            with self._lock:
+                self._entries[session_id] = (response_id, expected_version, time.monotonic())
+            return True
+
+        if row is None:
+            return True
+        self._remember(session_id, row)
+        stored = row['latest_response_id'] == response_id and row['response_version'] == expected_version + 1
+        if not stored:
+            logger.warning(
+                f"Session {session_id} moved on in another turn (version {row['response_version']}, "
+                f"expected {expected_version}); not overwriting it"
+            )
+        return stored
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def _write(self, session_id: str, response_id: str, expected_version: int):
+        result = self.supabase.rpc(
+            'set_session_response_id',
+            {
+                'p_session_id': session_id,
+                'p_response_id': response_id,
+                'p_expected_version': expected_version,
+            },
+        ).execute()
+        return result.data[0] if result.data else None
+
+    def _remember(self, session_id: str, row, force: bool = False) -> None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            # Never step back to an older version a concurrent turn already passed
+            if not force and entry and entry[1] > row['response_version']:
+                return
+            self._entries[session_id] = (
+                row['latest_response_id'],
+                row['response_version'],
+                time.monotonic(),
+            )
+
+
+MESSAGE_COLUMNS = 'id, order, content, response_id, timestamp'
+
+
+def session_messages_etag(supabase: Client, session_id: str) -> Optional[str]:
+    """Weak ETag value for a session's messages, derived from its summary row.
+
+    Any append or delete bumps `message_count`/`last_order`/`last_activity`,
+    so the tag is a version of the whole session: it stays valid across
+    queries (the client revalidates a newest-page tag with an `after=` delta
+    query) and changes exactly when any query's result could.
+    Returns None for sessions without a summary row.
+    """
+    result = (
+        supabase.table('chat_sessions')
+        .select('message_count, last_order, last_activity')
+        .eq('session_id', session_id)
+        .limit(1)
+        .execute()
+    )
+    if not result.data:
+        return None
+    row = result.data[0]
+    raw = json.dumps([row['message_count'], row['last_order'], row['last_activity']])
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def load_messages_page(
+    supabase: Client,
+    session_id: str,
+    limit: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+) -> Dict[str, Any]:
+    """One page of a session's messages in chronological order.
+
+    With *after*, the (up to *limit*) messages following that order (delta
+    mode); otherwise the newest *limit* messages, those before *before* if
+    given.
+    """
+    query = supabase.table('openai_memory_chats').select(MESSAGE_COLUMNS).eq('session_id', session_id)
+    if after is not None:
+        rows = query.gt('order', after).order('order').limit(limit + 1).execute().data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        if before is not None:
+            query = query.lt('order', before)
+        rows = query.order('order', desc=True).limit(limit + 1).execute().data or []
+        has_more = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+
+    return {
+        'messages': rows,
+        'has_more': has_more,
+        'oldest_order': rows[0]['order'] if rows else None,
+        'newest_order': rows[-1]['order'] if rows else None,
+    }
+
+
+class PersistenceQueue:
+    """Durable write-behind queue for chat bookkeeping writes.
+
+    Request handlers `submit()` an operation and return immediately; a single
+    background thread applies operations through the handler registered for
+    their kind (e.g. 'append' or 'job'). Because one thread applies them in
+    submission order, writes for a session land in the order they were made.
+    Consecutive 'append' operations for the same session are merged into one
+    call. Response ids are not queued: `ResponseIdCache` writes them
+    synchronously so other workers see them immediately.
+
+    A failed write does not hold up the queue: the session's remaining
+    operations are parked and retried with exponential backoff (0.5 s
+    doubling to 30 s) while other sessions keep draining, and later writes
+    for that session queue up behind them so its order is kept. After
+    PERSIST_QUEUE_MAX_ATTEMPTS a write is moved to the dead-letter file
+    (``dead-letters.log`` in PERSIST_QUEUE_DIR) and the session moves on.
+    `cancel()` discards a session's queued writes, e.g. before deleting it.
+
+    Every operation is journaled to a per-process file in PERSIST_QUEUE_DIR
+    before `submit()` returns. Journal I/O happens outside the queue lock,
+    and concurrent submitters share one fsync (group commit). Operations still pending when a process dies
+    are replayed by the next process that starts. Each process holds an
+    exclusive lock on its own journal, so only orphaned journals are picked
+    up. Replays may repeat a write that already succeeded; appends carry a
+    `client_msg_id` so the database skips duplicates.
+
+    Environment variables:
+      PERSIST_QUEUE_DIR           — Journal directory (default .persist_queue)
+      PERSIST_QUEUE_FSYNC         — '0' to skip fsync per journal write (default '1')
+      PERSIST_QUEUE_BATCH         — Max operations applied per batch (default 100)
+      PERSIST_QUEUE_MAX_ATTEMPTS  — Attempts per write before dead-lettering it (default 8)
+      PERSIST_QUEUE_FLUSH_TIMEOUT — Seconds close() waits to drain the queue (default 10)
+    """
+
+    def __init__(self, handlers: Optional[Dict[str, Callable[[str, Any], None]]] = None):
+        self.handlers: Dict[str, Callable[[str, Any], None]] = dict(handlers or {})
+        self.journal_dir = os.getenv('PERSIST_QUEUE_DIR', '.persist_queue')
+        self.fsync = os.getenv('PERSIST_QUEUE_FSYNC', '1') != '0'
+        self.max_batch = int(os.getenv('PERSIST_QUEUE_BATCH', '100'))
+        self.max_attempts = int(os.getenv('PERSIST_QUEUE_MAX_ATTEMPTS', '8'))
+        self.flush_timeout = float(os.getenv('PERSIST_QUEUE_FLUSH_TIMEOUT', '10'))
+
+        self._pending: Deque[Dict[str, Any]] = deque()
+        # session_id -> {'ops': [...], 'attempts': n, 'retry_at': monotonic time}
+        self._parked: Dict[str, Dict[str, Any]] = {}
+        self._batch: List[Dict[str, Any]] = []  # taken by the writer, not yet done
+        self._applying: Optional[str] = None  # session whose write is running
+        self._cancelled: set = set()  # ids of in-flight ops cancelled meanwhile
+        self._cond = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._journal = None
+        # Journal records written / known to be fsynced, for group commit
+        self._write_seq = 0
+        self._synced_seq = 0
+        self._syncing = False
+        self._sync_cond = threading.Condition()
+        # Operations journaled / then queued: while they differ an operation
+        # is in the journal but not yet in the queue, so compaction waits
+        self._journaled = 0
+        self._queued = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop_deadline: Optional[float] = None
+
+        self.stats_counters = {
+            'submitted': 0, 'written': 0, 'retries': 0, 'dropped': 0, 'dead_lettered': 0, 'cancelled': 0,
+        }
+
+    def register(self, kind: str, handler: Callable[[str, Any], None]) -> None:
+        self.handlers[kind] = handler
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Open this process's journal, adopt orphaned journals and start the writer."""
+        os.makedirs(self.journal_dir, exist_ok=True)
+        path = os.path.join(self.journal_dir, f"queue-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+        self._journal = open(path, 'a+', encoding='utf-8')
+        if fcntl:
+            fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        self._recover_orphans()
+
+        self._thread = threading.Thread(target=self._run, name='persistence-queue', daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Flush pending writes (bounded by PERSIST_QUEUE_FLUSH_TIMEOUT) and stop.
+
+        Anything not written in time stays in the journal for the next start.
+        """
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stop_deadline = time.monotonic() + self.flush_timeout
+            self._cond.notify_all()
+        self._thread.join(self.flush_timeout + 1)
+        self._thread = None
+
+        with self._cond, self._journal_lock:
+            path = self._journal.name
+            left = self._unfinished() + self._journaled - self._queued
+            self._journal.close()
+            if not left:
+                os.remove(path)
+        logger.info(f"Persistence queue closed ({left} writes left in journal)")
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def submit(self, kind: str, session_id: str, payload: Any) -> None:
+        """Journal and enqueue one write; returns without waiting for storage."""
+        op = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'session_id': session_id,
+            'payload': payload,
+            'queued_at': time.time(),
+        }
+        self._journal_write(op, is_op=True)
+        with self._cond:
+            self._pending.append(op)
+            self._queued += 1
+            self.stats_counters['submitted'] += 1
+            # notify_all: cancel() may be waiting on the same condition
+            self._cond.notify_all()
+
+    def cancel(self, session_id: str) -> int:
+        """Discard every queued write for *session_id*; returns how many.
+
+        Waits for a write for the session that is already running, so once
+        this returns nothing queued before the call can touch the session.
+        """
+        with self._cond:
+            cancelled = [op for op in self._pending if op['session_id'] == session_id]
+            if cancelled:
+                self._pending = deque(op for op in self._pending if op['session_id'] != session_id)
+            parked = self._parked.pop(session_id, None)
+            if parked:
+                cancelled += parked['ops']
+            in_batch = [op['id'] for op in self._batch if op['session_id'] == session_id]
+            self._cancelled.update(in_batch)
+            while self._applying == session_id:
+                self._cond.wait()
+            self.stats_counters['cancelled'] += len(cancelled) + len(in_batch)
+        if cancelled:
+            self._journal_write({'done': [op['id'] for op in cancelled]})
+            logger.info(f"Cancelled {len(cancelled)} queued writes for session {session_id}")
+        return len(cancelled) + len(in_batch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queued = [self._pending[0]['queued_at']] if self._pending else []
+            queued += [p['ops'][0]['queued_at'] for p in self._parked.values() if p['ops']]
+            oldest = min(queued) if queued else None
+            return {
+                'pending': self._unfinished(),
+                'parked_sessions': len(self._parked),
+                'oldest_pending_s': round(time.time() - oldest, 3) if oldest else 0.0,
+                **self.stats_counters,
+            }
+
+    def _unfinished(self) -> int:
+        """Writes not yet applied; call with the queue lock held."""
+        return len(self._pending) + len(self._batch) + sum(len(p['ops']) for p in self._parked.values())
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [sid for sid, p in self._parked.items() if p['retry_at'] <= now]
+                    if self._pending or due:
+                        break
+                    next_retry = min((p['retry_at'] for p in self._parked.values()), default=None)
+                    if self._stop_deadline is not None:
+                        if next_retry is None or next_retry > self._stop_deadline:
+                            return  # drained, or only retries due after the deadline (the journal keeps them)
+                    if self._stop_deadline is not None and now > self._stop_deadline:
+                        return  # out of time; the journal keeps the rest
+                    self._cond.wait(None if next_retry is None else next_retry - now)
+                if self._stop_deadline is not None and time.monotonic() > self._stop_deadline:
+                    return  # out of time; the journal keeps the rest
+
+                # Due retries first, then new writes; writes for a parked
+                # session join it so they stay behind the failing one
+                retries = {sid: self._parked.pop(sid) for sid in due}
+                fresh: List[Dict[str, Any]] = []
+                while self._pending and len(fresh) < self.max_batch:
+                    op = self._pending.popleft()
+                    if op['session_id'] in self._parked:
+                        self._parked[op['session_id']]['ops'].append(op)
+                    else:
+                        fresh.append(op)
+                self._batch = [op for p in retries.values() for op in p['ops']] + fresh
+
+            try:
+                self._apply_batch(self._batch, {sid: p['attempts'] for sid, p in retries.items()})
+            finally:
+                with self._cond:
+                    self._batch = []
+                    self._cancelled.clear()
+                self._compact_journal()
+
+    def _apply_batch(self, batch: List[Dict[str, Any]], attempts: Dict[str, int]) -> None:
+        # Group by session, keeping each session's submission order
+        by_session: Dict[str, List[Dict[str, Any]]] = {}
+        for op in batch:
+            by_session.setdefault(op['session_id'], []).append(op)
+
+        for session_id, ops in by_session.items():
+            groups = self._coalesce(ops)
+            for index, (kind, payload, op_ids) in enumerate(groups):
+                with self._cond:
+                    skip = bool(self._cancelled.intersection(op_ids))
+                    if not skip:
+                        self._applying = session_id
+                if skip:
+                    self._journal_write({'done': op_ids})
+                    continue
+                try:
+                    error = self._apply(kind, session_id, payload)
+                finally:
+                    with self._cond:
+                        self._applying = None
+                        self._cond.notify_all()
+
+                if error is None:
+                    self._journal_write({'done': op_ids})
+                    continue
+
+                tries = attempts.get(session_id, 0) + 1
+                if tries >= self.max_attempts:
+                    logger.error(f"Dead-lettering {kind} write for session {session_id} after {tries} attempts: {error}")
+                    self._dead_letter([op for op in ops if op['id'] in op_ids], error)
+                    self._journal_write({'done': op_ids})
+                    attempts[session_id] = 0
+                    continue
+
+                # Park this write and the session's later ones; other sessions go on
+                logger.warning(f"{kind} write for session {session_id} failed (attempt {tries}): {error}")
+                later = {op_id for _, _, ids in groups[index:] for op_id in ids}
+                with self._cond:
+                    self.stats_counters['retries'] += 1
+                    parked = [op for op in ops if op['id'] in later and op['id'] not in self._cancelled]
+                    if parked:
+                        self._parked[session_id] = {
+                            'ops': parked,
+                            'attempts': tries,
+                            'retry_at': time.monotonic() + min(0.5 * 2 ** (tries - 1), 30.0),
+                        }
+                break
+
+    @staticmethod
+    def _coalesce(ops: List[Dict[str, Any]]):
+        """Merge adjacent appends."""
+        merged: List[Tuple[str, Any, List[str]]] = []
+        for op in ops:
+            if op['kind'] == 'append' and merged and merged[-1][0] == 'append':
+                merged[-1][1].extend(op['payload'])
+                merged[-1][2].append(op['id'])
+            else:
+                payload = list(op['payload']) if op['kind'] == 'append' else op['payload']
+                merged.append((op['kind'], payload, [op['id']]))
+        return merged
+
+    def _apply(self, kind: str, session_id: str, payload: Any) -> Optional[Exception]:
+        """Run the handler for one write; returns the error, or None once it is done."""
+        handler = self.handlers.get(kind)
+        if handler is None:
+            logger.error(f"No persistence handler for {kind!r}; dropping write for session {session_id}")
+            self.stats_counters['dropped'] += 1
+            return None
+        try:
+            handler(session_id, payload)
+        except Exception as e:
+            return e
+        self.stats_counters['written'] += 1
+        return None
+
+    def _dead_letter(self, ops: List[Dict[str, Any]], error: Exception) -> None:
+        path = os.path.join(self.journal_dir, 'dead-letters.log')
+        try:
+            with open(path, 'a', encoding='utf-8') as fh:
+                for op in ops:
+                    fh.write(json.dumps({**op, 'error': str(error), 'failed_at': time.time()}, default=str) + '\n')
+        except OSError as e:
+            logger.error(f"Could not write dead letters to {path}: {e}")
+        self.stats_counters['dead_lettered'] += len(ops)
+
+    # ------------------------------------------------------------------
+    # Journal
+    # ------------------------------------------------------------------
+
+    def _journal_write(self, record: Dict[str, Any], is_op: bool = False) -> None:
+        """Append *record* to the journal; returns once it is on disk."""
+        line = json.dumps(record, default=str) + '\n'
+        with self._journal_lock:
+            self._journal.write(line)
+            self._journal.flush()
+            self._write_seq += 1
+            seq = self._write_seq
+            if is_op:
+                self._journaled += 1
+        if self.fsync:
+            self._sync(seq)
+
+    def _sync(self, seq: int) -> None:
+        """fsync the journal up to record *seq*, sharing one fsync between concurrent callers."""
+        while True:
+            with self._sync_cond:
+                while self._syncing and self._synced_seq < seq:
+                    self._sync_cond.wait()
+                if self._synced_seq >= seq:
+                    return  # covered by another caller's fsync
+                self._syncing = True
+            synced = 0
+            try:
+                with self._journal_lock:
+                    target = self._write_seq
+                    fileno = self._journal.fileno()
+                os.fsync(fileno)
+                synced = target
+            finally:
+                with self._sync_cond:
+                    self._syncing = False
+                    self._synced_seq = max(self._synced_seq, synced)
+                    self._sync_cond.notify_all()
+
+    def _compact_journal(self) -> None:
+        """Truncate the journal once every journaled write has been applied."""
+        with self._cond, self._journal_lock:
+            # Checked under the journal lock so no submit can journal in between
+            if self._unfinished() or self._journaled != self._queued:
+                return
+            self._journal.seek(0)
+            self._journal.truncate()
+            self._journal.flush()
+
+    def _recover_orphans(self) -> None:
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, '*.jsonl'))):
+            if path == self._journal.name:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as fh:
+                    if fcntl:
+                        try:
+                            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except OSError:
+                            continue  # owned by a live process
+                        if os.fstat(fh.fileno()).st_nlink == 0:
+                            continue  # already recovered by another process
+                    ops, done = [], set()
+                    for line in fh:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # torn final line from a crash
+                        if 'done' in record:
+                            done.update(record['done'])
+                        else:
+                            ops.append(record)
+                    pending = [op for op in ops if op['id'] not in done]
+                    for op in pending:
+                        self._journal_write(op, is_op=True)
+                    with self._cond:
+                        self._pending.extend(pending)
+                        self._queued += len(pending)
+                    # Remove while still holding the lock so no one else replays it
+                    os.remove(path)
+                if pending:
+                    logger.info(f"Recovered {len(pending)} pending chat writes from {path}")
+            except Exception as e:
+                logger.warning(f"Could not recover persistence journal {path}: {e}")
@@ -0,0 +1,204 @@
+"""Concurrency helpers shared by the RAG service and the UI endpoints."""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Hashable, Iterator, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait and receive the leader's result, or its
+    exception. Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run *fn* once per in-flight *key*. Returns `(result, shared)`."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted before its deadline."""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: float):
+        super().__init__(f"{endpoint}: {reason}")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded FIFO wait queue and deadlines.
+
+    At most *max_concurrent* requests run at once; up to *max_queue* more
+    wait in arrival order. A request is rejected straight away when the
+    queue is full or when the expected wait (queue position times the
+    average service time, spread over the slots) already exceeds its
+    deadline, and rejected later if the deadline passes while queued.
+    """
+
+    # Weight of the newest sample in the moving averages
+    _ALPHA = 0.2
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+
+        self._cond = threading.Condition()
+        self._waiters: Deque[object] = deque()
+        self._active = 0
+
+        self._admitted = 0
+        self._rejected: Dict[str, int] = {'queue_full': 0, 'deadline': 0, 'timeout': 0}
+        self._avg_service = 0.0
+        self._avg_wait = 0.0
+        self._max_wait_seen = 0.0
+
+    def _expected_wait(self, position: int) -> float:
+        return position * self._avg_service / self.max_concurrent
+
+    def _reject(self, reason: str, retry_after: float) -> AdmissionRejected:
+        self._rejected[reason] += 1
+        return AdmissionRejected(self.name, reason, retry_after)
+
+    def _acquire(self, timeout: Optional[float]) -> float:
+        """Take a slot, waiting in line if needed. Returns seconds waited."""
+        budget = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        start = time.monotonic()
+        deadline = start + budget
+
+        with self._cond:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self._admitted += 1
+                return 0.0
+
+            position = len(self._waiters) + 1
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject('queue_full', self._expected_wait(position))
+            expected = self._expected_wait(position)
+            if expected > budget:
+                raise self._reject('deadline', expected)
+
+            ticket = object()
+            self._waiters.append(ticket)
+            while not (self._waiters[0] is ticket and self._active < self.max_concurrent):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(ticket)
+                    # The head may have changed; let the new head re-check
+                    self._cond.notify_all()
+                    raise self._reject('timeout', self._expected_wait(len(self._waiters) + 1))
+                self._cond.wait(remaining)
+
+            self._waiters.popleft()
+            self._active += 1
+            self._admitted += 1
+            waited = time.monotonic() - start
+            self._avg_wait += self._ALPHA * (waited - self._avg_wait)
+            self._max_wait_seen = max(self._max_wait_seen, waited)
+            self._cond.notify_all()
+            return waited
+
+    def _release(self, service_time: float) -> None:
+        with self._cond:
+            self._active -= 1
+            if self._avg_service:
+                self._avg_service += self._ALPHA * (service_time - self._avg_service)
+            else:
+                self._avg_service = service_time
+            self._cond.notify_all()
+
+    def check(self, timeout: Optional[float] = None) -> None:
+        """Raise `AdmissionRejected` if a request arriving now would be turned away at once.
+
+        For work admitted later on another thread (background jobs), so the
+        submitter still gets an immediate 503 when the endpoint is saturated.
+        """
+        budget = self.max_wait if timeout is None else min(timeout, self.max_wait)
+        with self._cond:
+            if self._active < self.max_concurrent and not self._waiters:
+                return
+            position = len(self._waiters) + 1
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject('queue_full', self._expected_wait(position))
+            expected = self._expected_wait(position)
+            if expected > budget:
+                raise self._reject('deadline', expected)
+
+    @contextmanager
+    def admit(self, timeout: Optional[float] = None) -> Iterator[float]:
+        """Hold a slot for the duration of the block; yields seconds spent queued.
+
+        *timeout* is the caller's own deadline in seconds and is capped at
+        *max_wait*. Raises `AdmissionRejected` if no slot frees up in time.
+        """
+        waited = self._acquire(timeout)
+        start = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self._release(time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'active': self._active,
+                'queued': len(self._waiters),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'max_wait_s': self.max_wait,
+                'admitted': self._admitted,
+                'rejected': dict(self._rejected),
+                'avg_wait_ms': round(self._avg_wait * 1000, 1),
+                'max_wait_ms': round(self._max_wait_seen * 1000, 1),
+                'avg_service_ms': round(self._avg_service * 1000, 1),
+                'expected_wait_ms': round(self._expected_wait(len(self._waiters) + 1) * 1000, 1),
+            }
@@ -0,0 +1,74 @@
+"""In-memory index of the local `documents/` folder served by the /doc route."""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+class DocumentIndex:
+    """Cached listing of every file under *root*, keyed by POSIX relative path.
+
+    Lookups never touch the filesystem directly. The index checks for changes
+    at most every *ttl* seconds, and also on every miss, by stat-ing the
+    directories it saw during the last scan. A new, removed or renamed file
+    changes its parent directory's mtime, so the tree is rescanned only when
+    something actually changed.
+    """
+
+    def __init__(self, root: Path, ttl: float = 5.0):
+        self.root = Path(root)
+        self.ttl = ttl
+        self._files: Dict[str, Tuple[int, float]] = {}
+        self._dir_mtimes: Dict[str, float] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.refresh(force=True)
+
+    def lookup(self, rel_path: str) -> Optional[Tuple[int, float]]:
+        """Return `(size, mtime)` for *rel_path*, or None if no such file."""
+        if time.monotonic() - self._checked_at > self.ttl:
+            self.refresh()
+        entry = self._files.get(rel_path)
+        if entry is None and self.refresh():
+            entry = self._files.get(rel_path)
+        return entry
+
+    def names(self, limit: int = 10) -> List[str]:
+        return sorted(self._files)[:limit]
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rescan if any indexed directory changed. Returns True if rescanned."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if not force and not self._changed():
+                return False
+
+            files: Dict[str, Tuple[int, float]] = {}
+            dir_mtimes: Dict[str, float] = {}
+            if self.root.is_dir():
+                for dirpath, _dirs, filenames in os.walk(self.root):
+                    dir_mtimes[dirpath] = os.stat(dirpath).st_mtime
+                    for name in filenames:
+                        full = os.path.join(dirpath, name)
+                        try:
+                            st = os.stat(full)
+                        except OSError:
+                            continue
+                        rel = Path(os.path.relpath(full, self.root)).as_posix()
+                        files[rel] = (st.st_size, st.st_mtime)
+
+            self._files, self._dir_mtimes = files, dir_mtimes
+            return True
+
+    def _changed(self) -> bool:
+        if not self._dir_mtimes:
+            return self.root.is_dir()
+        for dirpath, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(dirpath).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
@@ -0,0 +1,18 @@
+-- Setup for the documents database (DATABASE_URL, used by rag_system.py)
+-- Run once with a role that may create tables, e.g.:
+--   psql "$DATABASE_URL" -f documents_setup.sql
+
+-- 1. Shared single-flight results (RAG_SINGLEFLIGHT_SHARED=1)
+-- The worker holding a question's advisory lock stores its answer here and
+-- workers asking the same question read it instead of recomputing. Rows are
+-- only needed for a few seconds, so the table is unlogged.
+CREATE UNLOGGED TABLE IF NOT EXISTS rag_answer_flights (
+    key TEXT PRIMARY KEY,
+    result JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_rag_answer_flights_created_at ON rag_answer_flights(created_at);
+
+-- The app role only needs to read, write and expire rows:
+-- GRANT SELECT, INSERT, UPDATE, DELETE ON rag_answer_flights TO <app_role>;
@@ -0,0 +1,47 @@
+"""Extractive answering for high-confidence vector hits (no LLM call).
+
+Kept free of service dependencies so the thresholds can be tuned and
+tested on their own; `RAGService` reads the settings from the environment.
+"""
+
+import re
+from typing import Any, Dict, List
+
+# Words ignored when matching question terms against candidate sentences
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or "
+    "our the their there to was we what when where which who why will with you".split()
+)
+
+
+def is_extractive_hit(hits: List[Dict[str, Any]], max_distance: float, min_gap: float) -> bool:
+    """Return True when the top vector hit is close enough to answer directly.
+
+    Requires the top hit's distance to be under *max_distance* and, when
+    there is a runner-up, a lead of at least *min_gap* over it.
+    """
+    if not hits or hits[0].get('distance') is None:
+        return False
+
+    top = float(hits[0]['distance'])
+    if top > max_distance:
+        return False
+
+    if len(hits) > 1 and hits[1].get('distance') is not None:
+        return float(hits[1]['distance']) - top >= min_gap
+    return True
+
+
+def best_sentence(question: str, text: str) -> str:
+    """Pick the sentence in *text* sharing the most content words with *question*."""
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+|\n+', text) if s.strip()]
+    if not sentences:
+        return text.strip()
+
+    terms = {w for w in re.findall(r'\w+', question.lower()) if w not in _STOPWORDS}
+
+    def overlap(sentence: str) -> int:
+        return len(terms & set(re.findall(r'\w+', sentence.lower())))
+
+    # max() keeps the earliest sentence on ties, which favours lead sentences
+    return max(sentences, key=overlap)
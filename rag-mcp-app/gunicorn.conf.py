@@ -0,0 +1,32 @@
+"""Gunicorn settings for serving persistence_ui_memory.py in production.
+
+Usage (from the rag-mcp-app directory):
+
+    gunicorn -c gunicorn.conf.py persistence_ui_memory:app
+
+`/ask` and `/ask_mcp` spend nearly all of their time waiting on OpenAI,
+Supabase and Postgres, so each worker runs a pool of threads (gthread) that
+share one RAGService, one Postgres pool and one set of HTTP clients. Scale
+WEB_THREADS for concurrency and WEB_WORKERS for CPU; bench_load.py measures
+throughput at increasing concurrency (figures in README_UI.md).
+"""
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+
+worker_class = "gthread"
+workers = int(os.getenv("WEB_WORKERS", min(4, multiprocessing.cpu_count())))
+threads = int(os.getenv("WEB_THREADS", "32"))
+
+# MCP answers with several tool calls can take tens of seconds
+timeout = int(os.getenv("WEB_TIMEOUT", "180"))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app inside each worker so every process opens its own
+# connection pools instead of inheriting sockets across fork().
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
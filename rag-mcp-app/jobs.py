@@ -0,0 +1,222 @@
+"""Background job runner for long MCP questions (backs /api/jobs).
+
+A job is submitted from a request handler and runs on a small thread pool,
+so the web worker that accepted it returns in milliseconds. While it runs the
+job collects progress events (e.g. each `mcp_call` the model makes), which
+clients read by polling `GET /api/jobs/<id>?since=<n>` or by streaming
+`GET /api/jobs/<id>/events`.
+
+Job state lives in the process that runs it. Snapshots are also handed to an
+optional ``persist`` callback when a job is queued and when it finishes, so
+other workers can answer status requests for jobs they do not own.
+
+Environment variables:
+  MCP_JOB_WORKERS     — Jobs run concurrently per process (default 4)
+  MCP_JOB_MAX_PENDING — Jobs allowed to wait for a worker before new ones are rejected (default 64)
+  MCP_JOB_TTL         — Seconds a finished job stays queryable in memory (default 600)
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from concurrency import AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = ('succeeded', 'failed', 'cancelled')
+
+
+class Job:
+    """State of one submitted job; mutate only through `JobManager`."""
+
+    def __init__(self, kind: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def snapshot(self, since: int = 0) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'error': self.error,
+            'events': self.events[since:],
+            'next_event': len(self.events),
+        }
+
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and keeps their state and events."""
+
+    def __init__(self, persist: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.max_workers = int(os.getenv('MCP_JOB_WORKERS', '4'))
+        self.max_pending = int(os.getenv('MCP_JOB_MAX_PENDING', '64'))
+        self.ttl = float(os.getenv('MCP_JOB_TTL', '600'))
+        self.persist = persist
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='mcp-job')
+        self._jobs: Dict[str, Job] = {}
+        self._cond = threading.Condition()
+        self._avg_runtime = 0.0
+
+    # ------------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------------
+
+    def submit(self, kind: str, fn: Callable[..., Any], params: Dict[str, Any]) -> Job:
+        """Queue ``fn(emit, **params)``; *emit* records a progress event dict.
+
+        Raises `AdmissionRejected` when MCP_JOB_MAX_PENDING jobs are already
+        waiting for a worker.
+        """
+        with self._cond:
+            self._prune()
+            queued = sum(1 for job in self._jobs.values() if job.status == 'queued')
+            if queued >= self.max_pending:
+                retry_after = (queued + 1) * (self._avg_runtime or 10.0) / self.max_workers
+                raise AdmissionRejected('jobs', 'queue_full', retry_after)
+            job = Job(kind, params)
+            self._jobs[job.id] = job
+
+        self._persist(job)
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any]) -> None:
+        with self._cond:
+            if job.status == 'cancelled':  # close() got to it first
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+            self._cond.notify_all()
+
+        def emit(event: Dict[str, Any]) -> None:
+            with self._cond:
+                job.events.append({'at': time.time(), **event})
+                self._cond.notify_all()
+
+        try:
+            result = fn(emit, **job.params)
+            status, error = 'succeeded', None
+        except Exception as exc:
+            logger.exception(f"Job {job.id} ({job.kind}) failed")
+            result, status, error = None, 'failed', str(exc)
+
+        with self._cond:
+            job.result = result
+            job.error = error
+            job.status = status
+            job.finished_at = time.time()
+            runtime = job.finished_at - job.started_at
+            self._avg_runtime = runtime if not self._avg_runtime else 0.8 * self._avg_runtime + 0.2 * runtime
+            self._cond.notify_all()
+        self._persist(job)
+
+    def _persist(self, job: Job) -> None:
+        if self.persist is None:
+            return
+        try:
+            with self._cond:
+                snapshot = job.snapshot()
+            self.persist(snapshot)
+        except Exception as exc:
+            logger.warning(f"Failed to persist job {job.id}: {exc}")
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the TTL. Caller holds ``_cond``."""
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def get(self, job_id: str, since: int = 0, wait: float = 0.0) -> Optional[Dict[str, Any]]:
+        """Snapshot of a local job, or None if this process does not own it.
+
+        With *wait* > 0, blocks up to that many seconds for a new event or
+        for the job to finish (long polling).
+        """
+        deadline = time.monotonic() + wait
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            while not job.done and len(job.events) <= since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return job.snapshot(since)
+
+    def stream(self, job_id: str, since: int = 0, heartbeat: float = 15.0) -> Iterator[Dict[str, Any]]:
+        """Yield events of a local job as they arrive, then a final status record.
+
+        Yields ``None`` every *heartbeat* seconds without news so callers can
+        keep an idle connection alive.
+        """
+        while True:
+            snapshot = self.get(job_id, since=since, wait=heartbeat)
+            if snapshot is None:
+                return
+            for event in snapshot['events']:
+                yield event
+            since = snapshot['next_event']
+            if snapshot['status'] in TERMINAL_STATES:
+                yield {'type': 'job.' + snapshot['status'], 'result': snapshot['result'], 'error': snapshot['error']}
+                return
+            if not snapshot['events']:
+                yield None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'avg_runtime_ms': round(self._avg_runtime * 1000, 1),
+                **counts,
+            }
+
+    def close(self) -> None:
+        """Stop accepting jobs; running jobs finish, queued ones are cancelled.
+
+        Cancelled jobs are persisted as such, so other workers stop
+        reporting them as queued.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._cond:
+            cancelled = [job for job in self._jobs.values() if job.status == 'queued']
+            for job in cancelled:
+                job.status = 'cancelled'
+                job.error = 'Server shut down before the job started; please resubmit'
+                job.finished_at = time.time()
+            self._cond.notify_all()
+        for job in cancelled:
+            self._persist(job)
+        if cancelled:
+            logger.info(f"Cancelled {len(cancelled)} queued jobs at shutdown")
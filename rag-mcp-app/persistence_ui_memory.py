@@ -1,35 +1,117 @@
 from flask import Flask, request, jsonify, render_template_string, send_from_directory
 from pathlib import Path
+import atexit
+import base64
+from datetime import datetime, timezone
+import functools
+import hashlib
+import logging
 import os
+import threading
+import time
 import uuid
 import json
-from datetime import datetime
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
 
-from rag_system import RAGService
+from app_clients import AppClients
+from chat_store import (
+    PersistenceQueue,
+    ResponseIdCache,
+    ResponseIdConflict,
+    load_messages_page,
+    session_messages_etag,
+)
+from concurrency import AdmissionController, AdmissionRejected
+from doc_index import DocumentIndex
+from jobs import TERMINAL_STATES, JobManager
+from rag_system import RAGService, log_token_usage
+from prompts import MCP_PROMPT_VERSION, MCP_SCHEMA_CONTEXT, MCP_SCHEMA_TOOL_PROMPT, MCP_SYSTEM_PROMPT
 # from hybrid_service import HybridRAGEmailService
 
 # Load environment variables
 load_dotenv(override=True)
 
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 rag_service = RAGService()
+atexit.register(rag_service.close)
 # hybrid_service = HybridRAGEmailService()
 
-# Initialize Supabase client
-SUPABASE_URL = os.getenv('SUPABASE_URL')
-SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
-
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("Please set SUPABASE_URL and SUPABASE_ANON_KEY environment variables")
+# Long-lived OpenAI / Supabase clients and MCP config, reused by every request
+clients = AppClients()
+atexit.register(clients.close)
 
-print(SUPABASE_URL)
-print(SUPABASE_KEY)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = clients.supabase
 
 # Directory where original documents (PDF, DOCX, etc.) reside. Update as needed.
 DOC_DIR = Path("documents")  # make sure this folder exists and contains the source files
+doc_index = DocumentIndex(DOC_DIR, ttl=float(os.getenv('DOC_INDEX_TTL', '5')))
+
+# Browser cache lifetime for /doc responses; revalidated with ETag afterwards
+DOC_CACHE_MAX_AGE = int(os.getenv('DOC_CACHE_MAX_AGE', '3600'))
+
+# Behind nginx/Apache, let the proxy send files itself (X-Sendfile). Otherwise
+# gunicorn's wsgi.file_wrapper delivers them with sendfile().
+app.use_x_sendfile = os.getenv('USE_X_SENDFILE') == '1'
+
+# Admission control: per-endpoint concurrency limits with a bounded wait
+# queue. /ask_mcp gets fewer slots because each call can fan out into many
+# tool calls against the MCP server's (20-connection) database pool.
+admission = {
+    'ask': AdmissionController(
+        'ask',
+        max_concurrent=int(os.getenv('ASK_MAX_CONCURRENCY', '16')),
+        max_queue=int(os.getenv('ASK_MAX_QUEUE', '64')),
+        max_wait=float(os.getenv('ASK_MAX_WAIT', '10')),
+    ),
+    'ask_mcp': AdmissionController(
+        'ask_mcp',
+        max_concurrent=int(os.getenv('ASK_MCP_MAX_CONCURRENCY', '4')),
+        max_queue=int(os.getenv('ASK_MCP_MAX_QUEUE', '16')),
+        max_wait=float(os.getenv('ASK_MCP_MAX_WAIT', '15')),
+    ),
+}
+
+
+def admitted(endpoint):
+    """Run the view inside *endpoint*'s admission slot.
+
+    Clients may shorten how long they are willing to queue with an
+    ``X-Request-Timeout`` header (seconds).
+    """
+    controller = admission[endpoint]
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                timeout = float(request.headers['X-Request-Timeout'])
+            except (KeyError, ValueError):
+                timeout = None
+            with controller.admit(timeout) as waited:
+                if waited:
+                    logger.info(f"Admitted {endpoint} after {waited * 1000:.0f} ms in queue")
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(exc):
+    logger.warning(f"Rejected {exc.endpoint} request ({exc.reason}), retry after {exc.retry_after}s")
+    response = jsonify({'error': 'Server busy, please retry shortly', 'reason': exc.reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(exc.retry_after)
+    return response
+
+@app.errorhandler(ResponseIdConflict)
+def response_id_conflict(exc):
+    logger.warning(str(exc))
+    return jsonify({'error': str(exc)}), 409
 
 HTML_PAGE = """
 <!doctype html>
@@ -78,6 +160,11 @@ HTML_PAGE = """
             background: white; 
             border-left: 4px solid #4caf50; 
         }
+        .progress-message { 
+            color: #666; 
+            font-style: italic; 
+            padding: 4px 15px; 
+        }
         .message h3 { margin-top: 0; margin-bottom: 10px; }
         pre, code { background: #f4f4f4; padding: 12px; overflow-x: auto; display: block; }
         .session-info { 
@@ -123,6 +210,8 @@ HTML_PAGE = """
 // Global state
 let currentSessionId = null;
 let conversationHistory = [];
+let loadedSessions = [];
+let sessionsCursor = null;
 
 // Initialize the app
 document.addEventListener('DOMContentLoaded', async function() {
@@ -170,42 +259,42 @@ async function createNewSession() {
   }
 }
 
+// Per-session cache of loaded messages so switching back only fetches deltas
+const sessionCache = {};
+
 async function loadSession(sessionId) {
   try {
-    const response = await fetch(`/api/sessions/${sessionId}/messages`);
-    if (response.ok) {
+    let cached = sessionCache[sessionId];
+    let url = `/api/sessions/${sessionId}/messages`;
+    const headers = {};
+    if (cached) {
+      url += `?after=${cached.newestOrder}`;
+      if (cached.etag) headers['If-None-Match'] = cached.etag;
+    }
+    
+    const response = await fetch(url, { headers });
+    if (response.status === 304) {
+      renderSession(cached);
+    } else if (response.ok) {
       const data = await response.json();
-      clearConversation();
-      
-      // Small delay to ensure DOM is cleared
-      await new Promise(resolve => setTimeout(resolve, 10));
-      
-      // Load messages in order
-      for (const message of data.messages) {
-        let content, role, type;
-        
-        // Parse the content - it should be a JSON object
-        if (typeof message.content === 'string') {
-          try {
-            const parsedContent = JSON.parse(message.content);
-            content = parsedContent.content || message.content;
-            role = parsedContent.role || 'assistant';
-            type = parsedContent.type || 'regular';
-          } catch (e) {
-            // If parsing fails, treat as plain text
-            content = message.content;
-            role = 'assistant';
-            type = 'regular';
-          }
-        } else {
-          // If it's already an object
-          content = message.content.content || JSON.stringify(message.content);
-          role = message.content.role || 'assistant';
-          type = message.content.type || 'regular';
-        }
-        
-        addMessage(role, content, type, true); // Skip saving when loading from database
+      if (cached && data.has_more) {
+        // Too far behind for one delta page; start over from the newest page
+        delete sessionCache[sessionId];
+        return loadSession(sessionId);
       }
+      if (!cached) {
+        cached = sessionCache[sessionId] = {
+          messages: [],
+          oldestOrder: data.oldest_order,
+          newestOrder: 0,
+          hasOlder: data.has_more
+        };
+      }
+      cached.messages = cached.messages.concat(data.messages);
+      if (data.newest_order !== null) cached.newestOrder = data.newest_order;
+      if (cached.oldestOrder === null) cached.oldestOrder = data.oldest_order;
+      cached.etag = response.headers.get('ETag');
+      renderSession(cached);
     } else {
       console.error('Failed to load session');
     }
@@ -214,12 +303,71 @@ async function loadSession(sessionId) {
   }
 }
 
-async function loadSessionsList() {
+async function loadOlderMessages() {
+  const cached = sessionCache[currentSessionId];
+  if (!cached || !cached.hasOlder) return;
+  
   try {
-    const response = await fetch('/api/sessions');
+    const response = await fetch(`/api/sessions/${currentSessionId}/messages?before=${cached.oldestOrder}`);
     if (response.ok) {
       const data = await response.json();
-      displaySessionsList(data.sessions);
+      cached.messages = data.messages.concat(cached.messages);
+      cached.oldestOrder = data.oldest_order;
+      cached.hasOlder = data.has_more;
+      renderSession(cached);
+    }
+  } catch (error) {
+    console.error('Error loading older messages:', error);
+  }
+}
+
+function renderSession(cached) {
+  clearConversation();
+  
+  if (cached.hasOlder) {
+    document.getElementById('conversation').innerHTML =
+      '<button onclick="loadOlderMessages()">Load older messages</button>';
+  }
+  
+  // Load messages in order
+  for (const message of cached.messages) {
+    let content, role, type;
+    
+    // Parse the content - it should be a JSON object
+    if (typeof message.content === 'string') {
+      try {
+        const parsedContent = JSON.parse(message.content);
+        content = parsedContent.content || message.content;
+        role = parsedContent.role || 'assistant';
+        type = parsedContent.type || 'regular';
+      } catch (e) {
+        // If parsing fails, treat as plain text
+        content = message.content;
+        role = 'assistant';
+        type = 'regular';
+      }
+    } else {
+      // If it's already an object
+      content = message.content.content || JSON.stringify(message.content);
+      role = message.content.role || 'assistant';
+      type = message.content.type || 'regular';
+    }
+    
+    addMessage(role, content, type, true); // Skip saving when loading from database
+  }
+}
+
+async function loadSessionsList(append = false) {
+  try {
+    const url = append && sessionsCursor
+      ? `/api/sessions?cursor=${encodeURIComponent(sessionsCursor)}`
+      : '/api/sessions';
+    const response = await fetch(url);
+    if (response.ok) {
+      const data = await response.json();
+      loadedSessions = append ? loadedSessions.concat(data.sessions) : data.sessions;
+      sessionsCursor = data.next_cursor;
+      displaySessionsList(loadedSessions);
     } else {
       console.error('Failed to load sessions list');
     }
@@ -250,6 +398,10 @@ function displaySessionsList(sessions) {
       </button>
     `;
   }).join('');
+
+  if (sessionsCursor) {
+    sessionsListEl.innerHTML += '<button onclick="loadSessionsList(true)">Load more</button>';
+  }
 }
 
 async function switchToSession(sessionId) {
@@ -275,14 +427,15 @@ function clearConversation() {
   conversationHistory = [];
 }
 
-async function saveMessage(content, type = 'user', responseId = null) {
-  if (!currentSessionId) return;
+// Persist one or more messages (e.g. a user/assistant pair) in one request
+async function saveMessages(messages) {
+  if (!currentSessionId || !messages.length) return;
   
   try {
     const response = await fetch(`/api/sessions/${currentSessionId}/messages`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ content, type, response_id: responseId })
+      body: JSON.stringify({ messages })
     });
     
     if (!response.ok) {
@@ -310,16 +463,25 @@ function addMessage(role, content, type = 'regular', skipSave = false, responseI
   conversationEl.appendChild(messageDiv);
   conversationEl.scrollTop = conversationEl.scrollHeight;
   
-  // Save message to database (unless we're loading from database)
+  const messageContent = {
+    role: role,
+    content: content,
+    type: type,
+    timestamp: new Date().toISOString()
+  };
+  
+  // Save message to database (unless we're loading from database or the
+  // caller batches it with the reply)
   if (!skipSave) {
-    const messageContent = {
-      role: role,
-      content: content,
-      type: type,
-      timestamp: new Date().toISOString()
-    };
-    saveMessage(messageContent, role, responseId);
+    saveMessages([{ content: messageContent, response_id: responseId }]);
   }
+  return messageContent;
+}
+
+// 503 responses from admission control carry a Retry-After header
+function errorMessage(res, data) {
+  const wait = res.headers.get('Retry-After');
+  return `${data.error || 'Request failed'}${wait ? ` (try again in ${wait}s)` : ''}`;
 }
 
 async function submitQ() {
@@ -327,17 +489,26 @@ async function submitQ() {
   const question = qEl.value.trim();
   if (!question) return;
   
-  addMessage('user', question);
+  const userMessage = addMessage('user', question, 'regular', true);
   qEl.value = '';
   
-  const res = await fetch('/ask', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ question })
-  });
-  const data = await res.json();
+  let res, data;
+  try {
+    res = await fetch('/ask', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ question })
+    });
+    data = await res.json();
+  } catch (error) {
+    await saveMessages([{ content: userMessage }]);
+    throw error;
+  }
   
-  let answer = data.answer;
+  let answer = res.ok ? data.answer : errorMessage(res, data);
+  if (data.extractive) {
+    answer += '\\n\\n_Quoted directly from the best-matching document._';
+  }
   if (data.references && data.references.length) {
     answer += '\\n\\n**References:**\\n';
     data.references.forEach(r => {
@@ -358,7 +529,62 @@ async function submitQ() {
     });
   }
   
-  addMessage('assistant', answer, 'regular');
+  const assistantMessage = addMessage('assistant', answer, 'regular', true);
+  await saveMessages([{ content: userMessage }, { content: assistantMessage }]);
+}
+
+// Transient progress line (not saved with the conversation)
+function addProgress(text) {
+  const conversationEl = document.getElementById('conversation');
+  const div = document.createElement('div');
+  div.className = 'message progress-message';
+  div.textContent = text;
+  conversationEl.appendChild(div);
+  conversationEl.scrollTop = conversationEl.scrollHeight;
+}
+
+// Long MCP questions run as background jobs; poll until done, showing each
+// tool call as it happens
+async function runMCPJob(question, onEvent) {
+  let res = await fetch('/api/jobs/ask_mcp', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ question, session_id: currentSessionId })
+  });
+  let data = await res.json();
+  if (!res.ok) return { res, data };
+
+  const jobId = data.job_id;
+  let since = 0;
+  let status = data.status;
+  let delay = 500;
+  const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+  while (true) {
+    res = await fetch(`/api/jobs/${jobId}?since=${since}&wait=20`);
+    data = await res.json();
+    if (!res.ok) {
+      if (res.status === 404) {
+        // The job record may not be stored yet when another worker answers
+        await sleep(1000);
+        continue;
+      }
+      return { res, data };
+    }
+    data.events.forEach(onEvent);
+    if (data.status === 'succeeded') return { res, data: data.result };
+    if (data.status === 'failed' || data.status === 'cancelled') {
+      return { res, data: { error: data.error || `Job ${data.status}` } };
+    }
+    if (data.next_event === since && data.status === status) {
+      // Nothing new (the server may have answered without waiting): back off
+      await sleep(delay);
+      delay = Math.min(delay * 2, 5000);
+    } else {
+      delay = 500;
+    }
+    since = data.next_event;
+    status = data.status;
+  }
 }
 
 async function submitMCP() {
@@ -366,17 +592,24 @@ async function submitMCP() {
   const question = qEl.value.trim();
   if (!question) return;
   
-  addMessage('user', question);
+  const userMessage = addMessage('user', question, 'regular', true);
   qEl.value = '';
   
-  const res = await fetch('/ask_mcp', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ question, session_id: currentSessionId })
-  });
-  const data = await res.json();
+  let res, data;
+  try {
+    ({ res, data } = await runMCPJob(question, event => {
+      if (event.type === 'mcp_call.started') {
+        addProgress(`Calling tool ${event.name}…`);
+      } else if (event.type === 'turn.retry') {
+        addProgress('This chat was updated elsewhere; answering again from the latest turn…');
+      }
+    }));
+  } catch (error) {
+    await saveMessages([{ content: userMessage }]);
+    throw error;
+  }
   
-  let answer = data.answer;
+  let answer = (res.ok && !data.error) ? data.answer : errorMessage(res, data);
   if (data.email_references && data.email_references.length) {
     answer += '\\n\\n**Email References:**\\n';
     data.email_references.forEach(email => {
@@ -385,8 +618,13 @@ async function submitMCP() {
     });
   }
   
-  // The response_id will be stored by the backend after the MCP call
-  addMessage('assistant', answer, 'mcp');
+  // Store the response_id on the assistant message so the next turn can
+  // continue the conversation from it
+  const assistantMessage = addMessage('assistant', answer, 'mcp', true);
+  await saveMessages([
+    { content: userMessage },
+    { content: assistantMessage, response_id: data.response_id }
+  ]);
 }
 </script>
 </body>
@@ -399,7 +637,28 @@ def index():
     return render_template_string(HTML_PAGE)
 
 
+@app.route('/healthz')
+def healthz():
+    """Report reachability of OpenAI, Supabase and the MCP server."""
+    checks = clients.health(force=request.args.get('force') == '1')
+    healthy = all(check['ok'] for check in checks.values())
+    return jsonify({
+        'ok': healthy,
+        'checks': checks,
+        'persistence_queue': persist_queue.stats(),
+        'admission': {name: c.stats() for name, c in admission.items()},
+        'jobs': jobs.stats(),
+    }), (200 if healthy else 503)
+
+
+@app.route('/api/admission')
+def admission_stats():
+    """Queue depth, wait times and rejection counts per endpoint."""
+    return jsonify({name: c.stats() for name, c in admission.items()})
+
+
 @app.route('/ask', methods=['POST'])
+@admitted('ask')
 def ask():
     payload = request.get_json(force=True)
     question = payload.get('question', '').strip()
@@ -408,386 +667,96 @@ def ask():
     result = rag_service.answer_question(question)
     return jsonify(result)
 
+# By default the model looks tables up with the MCP server's pg_schema tool;
+# set MCP_SCHEMA_IN_PROMPT=1 to send the hand-maintained schema instead
+MCP_SCHEMA_IN_PROMPT = os.getenv('MCP_SCHEMA_IN_PROMPT') == '1'
+MCP_PROMPT_LABEL = f"{MCP_PROMPT_VERSION}{'+schema' if MCP_SCHEMA_IN_PROMPT else ''}"
+
+
+def build_mcp_input(question, previous_response_id=None):
+    """Build the Responses API input for an /ask_mcp turn.
+
+    The first turn of a session carries the static system prompt (and, with
+    MCP_SCHEMA_IN_PROMPT=1, the schema) ahead of the question so they form a
+    cacheable prefix. Continuation turns already inherit both through
+    ``previous_response_id``, so only the new question is sent.
+    """
+    if previous_response_id:
+        return [{"role": "user", "content": f"Question: {question}"}]
+    if not MCP_SCHEMA_IN_PROMPT:
+        return [
+            {"role": "system", "content": f"{MCP_SYSTEM_PROMPT}\n{MCP_SCHEMA_TOOL_PROMPT}"},
+            {"role": "user", "content": f"Question: {question}"},
+        ]
+    return [
+        {"role": "system", "content": MCP_SYSTEM_PROMPT},
+        {"role": "system", "content": f"Context:\n{MCP_SCHEMA_CONTEXT}"},
+        {"role": "user", "content": f"Question: {question}"},
+    ]
+
+
 # ---------------------------------------------------------------------------
 # MCP search endpoint - query demo db, make api calls to tmdb
 # ---------------------------------------------------------------------------
-current_response_id = None
-@app.route('/ask_mcp', methods=['POST'])
-def ask_mcp():
-    global current_response_id
-    payload = request.get_json(force=True)
-    question = payload.get('question', '').strip()
-    session_id = payload.get('session_id')
-    if not question:
-        return jsonify({'error': 'No question provided'}), 400
 
-    from openai import OpenAI
-    import os
-    import logging
-    from dotenv import load_dotenv, find_dotenv
+def _mcp_call_event(item, phase):
+    """Progress event for an `mcp_call` output item (outputs are truncated)."""
+    event = {
+        'type': f'mcp_call.{phase}',
+        'name': getattr(item, 'name', None),
+        'server_label': getattr(item, 'server_label', None),
+    }
+    if phase == 'completed':
+        event['arguments'] = getattr(item, 'arguments', None)
+        event['error'] = getattr(item, 'error', None)
+        output = getattr(item, 'output', None) or ''
+        event['output_preview'] = output[:500]
+    return event
+
+
+# Times a turn is re-run when another worker answered in the same session
+# while it ran (the turn's previous_response_id had gone stale)
+MCP_TURN_MAX_RETRIES = int(os.getenv('MCP_TURN_MAX_RETRIES', '2'))
 
-    # Configure logging
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
-    logger = logging.getLogger(__name__)
 
-    load_dotenv(override=True)
-    client = OpenAI(api_key=os.environ['OPENAI_API_KEY'])
+def run_mcp_question(question, session_id=None, emit=None):
+    """Answer *question* with the hosted MCP tools; shared by /ask_mcp and jobs.
 
-    CLOUD_RUN_URL = os.getenv('MCP_SERVER_URL', 'http://localhost:8080/mcp/')
+    With *emit*, the response is streamed and each `mcp_call` the model
+    starts or finishes is reported through ``emit(event)`` as it happens.
 
+    The session's response id is only advanced if no other turn advanced it
+    meanwhile; otherwise the turn is re-run on the newer id (at most
+    MCP_TURN_MAX_RETRIES times, then `ResponseIdConflict`), so concurrent
+    workers never fork the conversation.
+    """
     # Log the incoming question
     logger.info(f"MCP Query Request: {question}")
 
-    system_prompt = (
-        '''You are an assistant that can query the demo database by converting the user's prompt into a series of SQL queries. Answer the user's question strictly based on the provided context regarding the demo database. Use the MCP tool.
+    for attempt in range(MCP_TURN_MAX_RETRIES + 1):
+        # Get the most recent response_id for this session, and its version
+        previous_response_id, version = response_ids.current(session_id) if session_id else (None, 0)
+        resp = _create_mcp_response(question, previous_response_id, emit)
+
+        # Store the response_id for this session (the client also keeps it on the
+        # assistant message it saves for this turn)
+        if not session_id or store_response_id_for_session(session_id, resp.id, version):
+            return {'answer': resp.output_text, 'response_id': resp.id}
+
+        logger.warning(f"Re-running MCP turn for session {session_id} on its newer response id (attempt {attempt + 1})")
+        if emit is not None:
+            emit({'type': 'turn.retry', 'reason': 'session updated by another request'})
+    raise ResponseIdConflict(session_id)
+
+
+def _create_mcp_response(question, previous_response_id, emit=None):
+    """One Responses API call continuing from *previous_response_id*."""
+    client = clients.openai
+    CLOUD_RUN_URL = clients.mcp_server_url
 
-        Do not take the user prompt too literally (e.g. if the user prompt mentions find companies that are upset, no need to literally search for the “upset” label if it doesn’t exist. Instead, use whatever related labels, information, etc. that you find fit.)
-        '''
-    )
-    
-    context = '''
-# DATABASE SCHEMA OVERVIEW
-
-## Available Tables (by Category)
-
-### 🔔 Alert Management
-- `alerts` - Main alert records
-- `alert_assignments` - Alert assignments to people
-- `approved_alerts` - Approved alert templates
-- `tag_definitions_on_alerts` - Tags applied to alerts
-
-### 🏢 Company & Organization
-- `companies` - Company information and details
-- `company_assignments` - People assigned to companies
-- `teams` - Team definitions
-- `team_members` - Team membership
-
-### 📧 Email & Communication
-- `emails` - Email records and metadata
-- `threads` - Email thread management
-- `email_anaylsis` - Email analysis results
-- `email_cluster_mapping` - Email clustering
-- `email_question_extractions` - Questions extracted from emails
-- `tags_on_emails` - Tags applied to emails
-- `notes_on_threads` - Notes on email threads
-
-### 👥 People & Employees
-- `people` - People records
-- `employees` - Employee information
-- `user_roles` - User role assignments
-- `role_permissions` - Role-based permissions
-
-### 💰 Payroll & Financial
-- `payroll` - Payroll records
-- `payroll_files` - Payroll file processing
-- `payroll_import` - Imported payroll data
-- `payitems` - Payroll item definitions
-
-### 📊 Analytics & Intelligence
-- `sentiment_trend_data` - Sentiment analysis trends
-- `sentiment_trend_view` - Sentiment trend views
-- `thread_analytics` - Thread analysis metrics
-- `thread_evaluations` - Thread evaluation results
-- `qa_pairs` - Q&A pairs for training
-- `stored_answers` - Cached answers
-
-### 🏷️ Tagging & Classification
-- `tag_definitions` - Tag definition templates
-- `dynamic_tag_definitions` - Dynamic tag definitions
-- `keywords` - Keyword definitions
-- `parent_clusters` - Parent clustering
-- `child_cluster` - Child clustering
-
-### 📄 Document Management
-- `documents` - Document metadata
-- `document_chunks` - Document text chunks
-- `buckets` - Storage buckets
-
-### ⚙️ System & Configuration
-- `app_config` - Application configuration
-- `prompts` - System prompts
-- `assignment_types` - Assignment type definitions
-- `assignments` - General assignments
-
-### 🔧 Utility & Testing
-- `test` - Test data
-- `amiup` - System status
-
----
-
-## DETAILED TABLE SCHEMAS
-
-### 🔔 Alert Management
-
-#### alerts
-- `id` (integer) - Primary key
-- `date` (timestamp with time zone) - Alert date
-- `company` (text) - Company name
-- `body` (text) - Alert content
-- `status` (text) - Alert status
-- `sender` (text) - Sender information
-- `assignee` (text) - Assigned person
-- `client_status` (text) - Client status
-- `approved` (boolean) - Approval status
-- `email_id` (text) - Related email ID
-- `thread_id` (text) - Related thread ID
-- `tags` (ARRAY) - Applied tags
-- `company_id` (text) - Company reference
-- `is_company_alert` (boolean) - Company-level alert flag
-- `ai_approved` (boolean) - AI approval status
-- `is_sent` (boolean) - Sent status
-
-#### alert_assignments
-- `id` (integer) - Primary key
-- `person_id` (text) - Person reference
-- `subscription_type` (character varying) - Subscription type
-- `company_id` (text) - Company reference
-- `tag_definition_id` (integer) - Tag definition reference
-- `alert_id` (integer) - Alert reference
-- `receive_emails` (boolean) - Email preference
-
-### 🏢 Company & Organization
-
-#### companies
-- `id` (text) - Primary key
-- `name` (text) - Company name
-- `status` (text) - Company status
-- `is_customer` (boolean) - Customer flag
-- `summary` (text) - Company summary
-- `num_employees` (text) - Employee count
-- `client_code` (text) - Client identifier
-- `company_code` (text) - Company code
-- `strategicaccount` (boolean) - Strategic account flag
-- `created_at` (timestamp with time zone) - Creation date
-- `updated_at` (timestamp with time zone) - Last update
-- `last_contacted` (date) - Last contact date
-- `assignee` (text) - Assigned person
-- `payroll_schema` (jsonb) - Payroll configuration
-
-### 📧 Email & Communication
-
-#### emails
-- `id` (text) - Primary key
-- `sent_at` (timestamp without time zone) - Sent date
-- `subject` (text) - Email subject
-- `from_address` (text) - Sender address
-- `body` (text) - Email content
-- `thread_id` (text) - Thread reference
-- `company_id` (text) - Company reference
-- `nps` (smallint) - Net Promoter Score
-- `author_id` (double precision) - Author reference
-- `case_id` (double precision) - Case reference
-- `ai_analysis` (double precision) - AI analysis score
-- `processed_at` (double precision) - Processing timestamp
-- `created_at` (timestamp with time zone) - Creation date
-- `updated_at` (timestamp with time zone) - Last update
-- `customer_complaints` (ARRAY) - Complaint tags
-- `feature_requests` (ARRAY) - Feature request tags
-- `feedback` (ARRAY) - Feedback tags
-- `other_topics` (ARRAY) - Other topic tags
-- `cc_addresses` (ARRAY) - CC recipients
-- `to_addresses` (ARRAY) - TO recipients
-- `processed_for_keywords` (boolean) - Keyword processing status
-
-#### threads
-- `id` (text) - Primary key
-- `subject` (text) - Thread subject
-- `status` (text) - Thread status
-- `company_id` (text) - Company reference
-- `assignee_id` (text) - Assigned person
-- `is_public` (boolean) - Public visibility
-- `created_at` (timestamp with time zone) - Creation date
-- `updated_at` (timestamp with time zone) - Last update
-
-### 👥 People & Employees
-
-#### people
-- `id` (text) - Primary key
-- `firstname` (text) - First name
-- `lastname` (text) - Last name
-- `email` (text) - Email address
-- `phone` (text) - Phone number
-- `title` (text) - Job title
-- `is_internal` (boolean) - Internal employee flag
-- `is_deleted` (boolean) - Deletion status
-- `assignable` (boolean) - Assignment capability
-- `can_follow_alerts` (boolean) - Alert following permission
-- `tags` (jsonb) - Associated tags
-- `created_at` (text) - Creation date
-- `updated_at` (text) - Last update
-
-#### employees
-- `id` (text) - Primary key
-- `first_name` (character varying) - First name
-- `last_name` (character varying) - Last name
-- `middle_name` (text) - Middle name
-- `name_lookup` (ARRAY) - Name search terms
-- `work_location` (character varying) - Work location
-- `state_residency` (character varying) - State of residence
-- `pay_group` (character varying) - Payroll group
-- `pay_type` (character varying) - Payment type
-- `hourly_rate` (numeric) - Hourly rate
-- `emp_number` (numeric) - Employee number
-- `company_code` (text) - Company reference
-- `employment_status` (text) - Employment status
-- `company_id` (text) - Company reference
-- `date_added` (timestamp without time zone) - Hire date
-
-### 💰 Payroll & Financial
-
-#### payroll
-- `id` (integer) - Primary key
-- `session_id` (character varying) - Session identifier
-- `employee_id` (text) - Employee reference
-- `pay_group` (character varying) - Payroll group
-- `pay_item` (character varying) - Payroll item
-- `hours` (numeric) - Hours worked
-- `hourly_rate` (numeric) - Hourly rate
-- `total_dollar_amount` (numeric) - Total amount
-- `override_rate` (numeric) - Override rate
-- `date_added` (timestamp without time zone) - Entry date
-
-#### payroll_files
-- `id` (integer) - Primary key
-- `company_id` (text) - Company reference
-- `company_name` (text) - Company name
-- `email_id` (text) - Related email
-- `date` (timestamp with time zone) - File date
-- `file_id` (text) - File identifier
-- `original_file_name` (text) - Original filename
-- `processed` (boolean) - Processing status
-- `file_type` (character varying) - File type
-- `file_has_payroll_data` (boolean) - Payroll data flag
-- `email_body_has_payroll_data` (boolean) - Email payroll data flag
-- `email_body` (text) - Email content
-- `result` (jsonb) - Processing results
-- `current_data` (jsonb) - Current data
-- `original_data` (jsonb) - Original data
-- `submission_status` (USER-DEFINED) - Submission status
-- `submission_details` (jsonb) - Submission details
-
-### 📊 Analytics & Intelligence
-
-#### sentiment_trend_data
-- `month` (date) - Month
-- `average_nps` (numeric) - Average NPS score
-- `nps_count` (integer) - NPS response count
-- `last_updated` (timestamp with time zone) - Last update
-
-#### thread_analytics
-- `thread_id` (character varying) - Thread reference
-- `total_emails` (integer) - Total email count
-- `questions_extracted` (integer) - Questions extracted
-- `questions_answered` (integer) - Questions answered
-- `avg_resolution_time_hours` (numeric) - Average resolution time
-- `participants` (jsonb) - Participant data
-- `thread_start` (timestamp without time zone) - Thread start
-- `thread_end` (timestamp without time zone) - Thread end
-- `resolution_status` (character varying) - Resolution status
-- `last_analyzed` (timestamp with time zone) - Last analysis
-
-### 🏷️ Tagging & Classification
-
-#### tag_definitions
-- `id` (bigint) - Primary key
-- `prompt_id` (bigint) - Prompt reference
-- `name` (text) - Tag name
-- `display_name` (text) - Display name
-- `type` (text) - Tag type
-- `is_alert` (boolean) - Alert tag flag
-- `bucket_id` (numeric) - Bucket reference
-- `function_name` (text) - Function name
-- `is_company_level_tag` (boolean) - Company-level flag
-- `is_active` (boolean) - Active status
-
-#### keywords
-- `id` (bigint) - Primary key
-- `keyword_name` (text) - Keyword name
-- `bucket_id` (bigint) - Bucket reference
-- `created_at` (timestamp with time zone) - Creation date
-- `updated_at` (timestamp with time zone) - Last update
-
-### 📄 Document Management
-
-#### documents
-- `id` (uuid) - Primary key
-- `bucket` (text) - Storage bucket
-- `object_path` (text) - Object path
-- `filename` (text) - Filename
-- `mime_type` (text) - MIME type
-- `size_bytes` (bigint) - File size
-- `uploaded_at` (timestamp with time zone) - Upload date
-- `text_content` (text) - Document content
-- `owner` (uuid) - Owner reference
-- `created_at` (timestamp with time zone) - Creation date
-
-#### document_chunks
-- `id` (bigint) - Primary key
-- `document_id` (uuid) - Document reference
-- `chunk_index` (integer) - Chunk position
-- `start_char` (integer) - Start character
-- `end_char` (integer) - End character
-- `text` (text) - Chunk text
-- `tokens` (smallint) - Token count
-- `tsv` (tsvector) - Text search vector
-- `embedding` (USER-DEFINED) - Vector embedding
-
-### ⚙️ System & Configuration
-
-#### app_config
-- `key` (text) - Configuration key
-- `value` (text) - Configuration value
-- `description` (text) - Configuration description
-- `updated_at` (timestamp with time zone) - Last update
-
-#### prompts
-- `id` (bigint) - Primary key
-- `name` (text) - Prompt name
-- `prompt` (text) - Prompt content
-- `tag_name` (text) - Associated tag
-- `required` (text) - Required fields
-- `type` (text) - Prompt type
-- `bucket_id` (text) - Bucket reference
-- `display_names` (text) - Display names
-- `created_at` (timestamp with time zone) - Creation date
-- `updated_at` (timestamp with time zone) - Last update
-
----
-
-## KEY RELATIONSHIPS
-
-### Company Relationships
-- `companies` ↔ `company_assignments` (via company_id)
-- `companies` ↔ `employees` (via company_id)
-- `companies` ↔ `alerts` (via company_id)
-
-### Email Relationships
-- `emails` ↔ `threads` (via thread_id)
-- `emails` ↔ `companies` (via company_id)
-- `emails` ↔ `tags_on_emails` (via email_id)
-
-### People Relationships
-- `people` ↔ `employees` (via id)
-- `people` ↔ `alert_assignments` (via person_id)
-- `people` ↔ `company_assignments` (via person_id)
-
-### Payroll Relationships
-- `payroll` ↔ `employees` (via employee_id)
-- `payroll_files` ↔ `companies` (via company_id)
-- `payroll_import` ↔ `payroll` (via session_id)
-
-### Tagging Relationships
-- `tag_definitions` ↔ `tags_on_emails` (via tag_definition_id)
-- `tag_definitions` ↔ `tag_definitions_on_alerts` (via tag_definition_id)
-- `keywords` ↔ `tags_on_emails` (via keyword_id)
-    '''
-
-        # Get the most recent response_id for this session
-    previous_response_id = get_latest_response_id_for_session(session_id) if session_id else None
-    
     # test_mcp_server
     # "allowed_tools":["query_demo_db"], under server_url
-    resp = client.responses.create(
+    request_args = dict(
         model="gpt-4.1",
         tools=[
             {
@@ -797,13 +766,31 @@ def ask_mcp():
                 "require_approval": "never",
             },
         ],
-        input=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"}
-        ],
+        input=build_mcp_input(question, previous_response_id),
         previous_response_id=previous_response_id,
     )
 
+    if emit is None:
+        resp = client.responses.create(**request_args)
+    else:
+        resp = None
+        for event in client.responses.create(stream=True, **request_args):
+            etype = getattr(event, 'type', '')
+            item = getattr(event, 'item', None)
+            if etype == 'response.output_item.added' and getattr(item, 'type', None) == 'mcp_call':
+                emit(_mcp_call_event(item, 'started'))
+            elif etype == 'response.output_item.done' and getattr(item, 'type', None) == 'mcp_call':
+                emit(_mcp_call_event(item, 'completed'))
+            elif etype == 'response.completed':
+                resp = event.response
+            elif etype in ('response.failed', 'response.incomplete', 'error'):
+                error = getattr(getattr(event, 'response', None), 'error', None) or getattr(event, 'message', None)
+                raise RuntimeError(f"MCP response {etype}: {error}")
+        if resp is None:
+            raise RuntimeError("MCP response stream ended without a completed response")
+
+    log_token_usage('ask_mcp', MCP_PROMPT_LABEL, getattr(resp, 'usage', None))
+
     # Logging for MCP tool calls
     for output_item in resp.output:
       if getattr(output_item, "type", None) == "mcp_call":
@@ -811,14 +798,170 @@ def ask_mcp():
         arguments = output_item.arguments
         logger.info(f"MCP Tool Called: {tool_name} | Arguments: {arguments}")
 
-    print(resp)
-    # print(resp.output_text) - shows mcp calls, response objects, etc.
-    
-    # Store the response_id for this session
-    if session_id:
-        store_response_id_for_session(session_id, resp.id)
-    
-    return jsonify({'answer': resp.output_text})
+    # Full response object (mcp calls, output items, ...) for debugging
+    logger.debug("MCP response: %s", resp)  # lazy: only formatted when enabled
+    return resp
+
+
+current_response_id = None
+@app.route('/ask_mcp', methods=['POST'])
+@admitted('ask_mcp')
+def ask_mcp():
+    payload = request.get_json(force=True)
+    question = payload.get('question', '').strip()
+    session_id = payload.get('session_id')
+    if not question:
+        return jsonify({'error': 'No question provided'}), 400
+
+    return jsonify(run_mcp_question(question, session_id))
+
+
+# ---------------------------------------------------------------------------
+# Asynchronous MCP jobs - submit, then poll or stream progress
+# ---------------------------------------------------------------------------
+
+# Long-polls and event streams each hold a gunicorn thread for up to 25 s and
+# are not counted by admission control, so cap how many can be open at once.
+# Past the cap, long-polls answer immediately and event streams get a 503.
+JOB_STREAM_MAX_CONNECTIONS = int(os.getenv('JOB_STREAM_MAX_CONNECTIONS', '8'))
+_job_stream_slots = threading.BoundedSemaphore(max(JOB_STREAM_MAX_CONNECTIONS, 1))
+
+
+def _mcp_job(emit, question, session_id=None):
+    # Jobs take the same admission slots as /ask_mcp, since both fan out into
+    # MCP server tool calls. A job has no client waiting on the request, so
+    # it keeps retrying rather than failing when a slot is slow to free up.
+    controller = admission['ask_mcp']
+    while True:
+        try:
+            with controller.admit() as waited:
+                if waited:
+                    logger.info(f"Admitted ask_mcp job after {waited * 1000:.0f} ms in queue")
+                return run_mcp_question(question, session_id, emit=emit)
+        except AdmissionRejected as exc:
+            logger.info(f"ask_mcp job waiting for a slot ({exc.reason}), retrying in {exc.retry_after}s")
+            time.sleep(exc.retry_after)
+
+
+def _persist_job(snapshot):
+    persist_queue.submit('job', snapshot['job_id'], snapshot)
+
+
+def _stored_job(job_id):
+    """Job snapshot written by whichever worker ran it, or None."""
+    try:
+        uuid.UUID(hex=job_id)
+    except ValueError:
+        return None
+    rows = supabase.table('mcp_jobs').select('*').eq('job_id', job_id).limit(1).execute().data
+    if not rows:
+        return None
+    row = rows[0]
+    events = row.get('events') or []
+    return {
+        'job_id': job_id,
+        'kind': row.get('kind'),
+        'status': row.get('status'),
+        'result': row.get('result'),
+        'error': row.get('error'),
+        'events': events,
+        'next_event': len(events),
+    }
+
+
+@app.route('/api/jobs/ask_mcp', methods=['POST'])
+def submit_mcp_job():
+    """Queue an MCP question and return its job id straight away."""
+    payload = request.get_json(force=True)
+    question = payload.get('question', '').strip()
+    if not question:
+        return jsonify({'error': 'No question provided'}), 400
+
+    # Same load shedding as /ask_mcp: refuse now rather than queue a job
+    # that would wait longer than a synchronous request is allowed to
+    admission['ask_mcp'].check()
+    job = jobs.submit('ask_mcp', _mcp_job, {'question': question, 'session_id': payload.get('session_id')})
+    response = jsonify({'job_id': job.id, 'status': job.status})
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status and the events after `since`; `wait` long-polls up to 25 s."""
+    since = max(request.args.get('since', 0, type=int), 0)
+    wait = max(min(request.args.get('wait', 0.0, type=float), 25.0), 0.0)
+    if wait and not _job_stream_slots.acquire(blocking=False):
+        wait = 0.0  # too many open long-polls; answer now, the client backs off
+    try:
+        snapshot = jobs.get(job_id, since=since, wait=wait)
+        if snapshot is None:
+            # Submitted to another worker; fall back to its stored snapshot
+            snapshot = _poll_stored_job(job_id, since, wait)
+            if snapshot is None:
+                return jsonify({'error': 'Job not found'}), 404
+            snapshot['events'] = snapshot['events'][since:]
+    finally:
+        if wait:
+            _job_stream_slots.release()
+    return jsonify(snapshot)
+
+
+def _poll_stored_job(job_id, since, wait):
+    """Re-read the stored snapshot, backing off, until it has news or *wait* runs out."""
+    deadline = time.monotonic() + wait
+    delay = 0.5
+    while True:
+        snapshot = _stored_job(job_id)
+        if snapshot is None or snapshot['status'] in TERMINAL_STATES or snapshot['next_event'] > since:
+            return snapshot
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return snapshot
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 5.0)
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events: one `data:` line per progress event, then the final status."""
+    since = request.args.get('since', 0, type=int)
+    if jobs.get(job_id) is None:
+        snapshot = _stored_job(job_id)
+        if snapshot is None:
+            return jsonify({'error': 'Job not found'}), 404
+        # Not ours: replay what was stored, and the outcome if it is known
+        stored = list(snapshot['events'][since:])
+        if snapshot['status'] in TERMINAL_STATES:
+            stored.append({'type': 'job.' + snapshot['status'], 'result': snapshot['result'], 'error': snapshot['error']})
+        events = iter(stored)
+        slot = False
+    else:
+        if not _job_stream_slots.acquire(blocking=False):
+            response = jsonify({'error': 'Too many open event streams; poll /api/jobs/<job_id> instead'})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        events = jobs.stream(job_id, since=since)
+        slot = True
+
+    def generate():
+        for event in events:
+            if event is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+
+    response = app.response_class(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+    if slot:
+        # Called once the stream ends or the client disconnects
+        response.call_on_close(_job_stream_slots.release)
+    return response
 
 
 # ---------------------------------------------------------------------------
@@ -857,28 +1000,55 @@ def ask_mcp():
 # Helper functions for response_id management
 # ---------------------------------------------------------------------------
 
+def append_messages(session_id, messages):
+    """Append a batch of messages with the atomic `append_chat_messages` RPC."""
+    supabase.rpc('append_chat_messages', {'p_session_id': session_id, 'p_messages': messages}).execute()
+
+
+# Chat bookkeeping (message appends, job snapshots) is written behind the
+# request by a durable background queue so answers never wait on Supabase
+persist_queue = PersistenceQueue({'append': append_messages})
+
+# Latest response id per session, cached in-process and written straight to
+# the session's chat_sessions row (not queued: other workers read it next)
+response_ids = ResponseIdCache(supabase)
+
+
+def store_job(job_id, snapshot):
+    """Upsert a job snapshot so any worker can report its status."""
+    supabase.table('mcp_jobs').upsert({
+        'job_id': job_id,
+        'kind': snapshot['kind'],
+        'status': snapshot['status'],
+        'result': snapshot['result'],
+        'error': snapshot['error'],
+        'events': snapshot['events'],
+        'updated_at': datetime.now(timezone.utc).isoformat(),
+    }).execute()
+
+
+persist_queue.register('job', store_job)
+
+persist_queue.start()
+atexit.register(persist_queue.close)
+
+# Long MCP questions submitted through /api/jobs run here, off the web threads.
+# Registered after the queue so jobs stop before it flushes at exit.
+jobs = JobManager(persist=_persist_job)
+atexit.register(jobs.close)
+
+
 def get_latest_response_id_for_session(session_id):
     """Get the most recent response_id for a session."""
-    try:
-        result = supabase.table('openai_memory_chats').select('response_id').eq('session_id', session_id).not_.is_('response_id', 'null').order('order', desc=True).limit(1).execute()
-        if result.data and result.data[0]['response_id']:
-            return result.data[0]['response_id']
-        return None
-    except Exception as e:
-        print(f"Error getting latest response_id: {e}")
-        return None
+    return response_ids.get(session_id)
 
-def store_response_id_for_session(session_id, response_id):
-    """Store a response_id for the most recent message in a session."""
-    try:
-        # Get the most recent message for this session
-        result = supabase.table('openai_memory_chats').select('id').eq('session_id', session_id).order('order', desc=True).limit(1).execute()
-        if result.data:
-            message_id = result.data[0]['id']
-            # Update the message with the response_id
-            supabase.table('openai_memory_chats').update({'response_id': response_id}).eq('id', message_id).execute()
-    except Exception as e:
-        print(f"Error storing response_id: {e}")
+
+def store_response_id_for_session(session_id, response_id, expected_version):
+    """Store the latest response_id for a session unless another turn moved it on.
+
+    Returns False on a conflict; see `ResponseIdCache.set`.
+    """
+    return response_ids.set(session_id, response_id, expected_version)
 
 # ---------------------------------------------------------------------------
 # Session and Message Persistence Endpoints
@@ -893,80 +1063,138 @@ def create_session():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+SESSIONS_PAGE_SIZE = 50
+SESSIONS_MAX_PAGE_SIZE = 200
+
+
+def _encode_cursor(*parts):
+    """Pack keyset values into an opaque, URL-safe pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(parts).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def _decode_sessions_cursor(cursor):
+    """(last_activity, session_id) from a sessions cursor; ValueError unless both parse.
+
+    The values end up inside a PostgREST filter string, so only a real
+    timestamp and UUID (re-serialized) are let through.
+    """
+    try:
+        last_activity, session_id = _decode_cursor(cursor)
+        return datetime.fromisoformat(last_activity).isoformat(), str(uuid.UUID(session_id))
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
 @app.route('/api/sessions', methods=['GET'])
 def get_sessions():
-    """Get all chat sessions with their metadata."""
+    """Get a page of chat sessions, most recently active first.
+
+    Reads the trigger-maintained `chat_sessions` summary (one row per
+    session) using keyset pagination on (last_activity, session_id). Pass the
+    returned `next_cursor` as `?cursor=` to fetch the following page.
+    """
     try:
-        # Get unique sessions with their latest message timestamp
-        result = supabase.table('openai_memory_chats').select('session_id, timestamp').execute()
-        
-        if not result.data:
-            return jsonify({'sessions': []})
-        
-        # Group by session_id and get the latest timestamp for each
-        sessions = {}
-        for message in result.data:
-            session_id = message['session_id']
-            timestamp = message['timestamp']
-            if session_id not in sessions or timestamp > sessions[session_id]['last_activity']:
-                sessions[session_id] = {
-                    'session_id': session_id,
-                    'last_activity': timestamp
-                }
-        
-        # Convert to list and sort by last activity (newest first)
-        sessions_list = list(sessions.values())
-        sessions_list.sort(key=lambda x: x['last_activity'], reverse=True)
-        
-        return jsonify({'sessions': sessions_list})
+        limit = min(request.args.get('limit', SESSIONS_PAGE_SIZE, type=int), SESSIONS_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+
+        query = (
+            supabase.table('chat_sessions')
+            .select('session_id, last_activity, message_count')
+            .order('last_activity', desc=True)
+            .order('session_id', desc=True)
+            .limit(limit + 1)
+        )
+        if cursor:
+            try:
+                last_activity, last_session_id = _decode_sessions_cursor(cursor)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            query = query.or_(
+                f'last_activity.lt."{last_activity}",'
+                f'and(last_activity.eq."{last_activity}",session_id.lt."{last_session_id}")'
+            )
+
+        rows = query.execute().data or []
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1]['last_activity'], rows[-1]['session_id'])
+
+        return jsonify({'sessions': rows, 'next_cursor': next_cursor})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+
+
 @app.route('/api/sessions/<session_id>/messages', methods=['GET'])
 def get_session_messages(session_id):
-    """Get all messages for a specific session."""
+    """Get a page of messages for a session, in chronological order.
+
+    Query parameters:
+      limit  – page size (default 50, max 200)
+      before – return the newest page of messages with order < before
+               (omit for the newest page of the session)
+      after  – return only messages with order > after (delta mode)
+
+    Responses carry an ETag; a matching If-None-Match gets a 304 without
+    reading any message rows.
+    """
     try:
-        result = supabase.table('openai_memory_chats').select('*').eq('session_id', session_id).order('order').execute()
-        return jsonify({'messages': result.data})
+        limit = min(request.args.get('limit', MESSAGES_PAGE_SIZE, type=int), MESSAGES_MAX_PAGE_SIZE)
+        before = request.args.get('before', type=int)
+        after = request.args.get('after', type=int)
+
+        etag = session_messages_etag(supabase, session_id)
+        if etag and request.if_none_match.contains_weak(etag):
+            return '', 304, {'ETag': f'W/"{etag}"', 'Cache-Control': 'private, no-cache'}
+
+        response = jsonify(load_messages_page(supabase, session_id, limit, before=before, after=after))
+        if etag:
+            response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/sessions/<session_id>/messages', methods=['POST'])
 def save_message(session_id):
-    """Save a message to the database."""
+    """Queue one or more messages for appending to a session.
+
+    Accepts either a single message (`{"content": ..., "response_id": ...}`)
+    or a batch (`{"messages": [{"content": ..., "response_id": ...}, ...]}`),
+    e.g. a user/assistant pair. The write is handed to the persistence queue,
+    which applies it with the atomic `append_chat_messages` RPC in session
+    order, so the request returns 202 without waiting on Supabase. Each
+    message gets a `client_msg_id` (or keeps the one supplied) that makes
+    retried writes idempotent.
+    """
     try:
         payload = request.get_json(force=True)
-        content = payload.get('content')
-        message_type = payload.get('type', 'user')  # 'user' or 'assistant'
-        response_id = payload.get('response_id')  # Optional response_id
-        
-        if not content:
+        messages = payload.get('messages')
+        if messages is None:
+            messages = [payload]
+
+        if not messages or not all(isinstance(m, dict) and m.get('content') for m in messages):
             return jsonify({'error': 'Content is required'}), 400
-        
-        # Get the next order number for this session
-        order_result = supabase.table('openai_memory_chats').select('order').eq('session_id', session_id).order('order', desc=True).limit(1).execute()
-        next_order = 1
-        if order_result.data:
-            next_order = order_result.data[0]['order'] + 1
-        
-        # Insert the message
-        message_data = {
-            'session_id': session_id,
-            'content': content,
-            'order': next_order,
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        # Add response_id if provided
-        if response_id:
-            message_data['response_id'] = response_id
-        
-        result = supabase.table('openai_memory_chats').insert(message_data).execute()
-        
-        if result.data:
-            return jsonify({'message_id': result.data[0]['id']}), 201
-        else:
-            return jsonify({'error': 'Failed to save message'}), 500
+
+        batch = [
+            {
+                'content': m['content'],
+                'response_id': m.get('response_id') or None,
+                'client_msg_id': m.get('client_msg_id') or str(uuid.uuid4()),
+            }
+            for m in messages
+        ]
+        persist_queue.submit('append', session_id, batch)
+        return jsonify({'queued': True, 'client_msg_ids': [m['client_msg_id'] for m in batch]}), 202
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -975,8 +1203,12 @@ def save_message(session_id):
 def delete_session(session_id):
     """Delete a chat session and all its messages."""
     try:
-        # Delete all messages for this session
-        result = supabase.table('openai_memory_chats').delete().eq('session_id', session_id).execute()
+        # Queued appends would re-create the session after the delete
+        persist_queue.cancel(session_id)
+        # Messages and the chat_sessions row (which may exist without any
+        # messages and carries the latest response id) go together
+        supabase.rpc('delete_chat_session', {'p_session_id': session_id}).execute()
+        response_ids.invalidate(session_id)
         return jsonify({'deleted': True}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -992,9 +1224,12 @@ def doc(subpath: str):
 
     We allow nested paths such as `policies/handbook.pdf` but reject absolute
     paths or any component that attempts to traverse outside `DOC_DIR`.
+
+    Existence is checked against the in-memory `doc_index`. Responses are
+    conditional (ETag / Last-Modified → 304) and honour Range requests, so
+    large PDFs stream in pieces and are cached by browsers.
     """
     from flask import abort
-    import os
 
     safe_path = Path(subpath)
 
@@ -1003,24 +1238,24 @@ def doc(subpath: str):
         abort(400)
 
     # Check if file exists
-    full_path = DOC_DIR / safe_path
-    if not full_path.exists():
+    if doc_index.lookup(safe_path.as_posix()) is None:
         # List what files ARE available for debugging
-        available_files = []
-        try:
-            for root, dirs, files in os.walk(DOC_DIR):
-                for file in files:
-                    rel_path = os.path.relpath(os.path.join(root, file), DOC_DIR)
-                    available_files.append(rel_path)
-        except:
-            pass
-        
-        error_msg = f"File not found: {subpath}\n\nAvailable files:\n" + "\n".join(available_files[:10])
+        available_files = doc_index.names(10)
+        error_msg = f"File not found: {subpath}\n\nAvailable files:\n" + "\n".join(available_files)
         return error_msg, 404
 
-    return send_from_directory(DOC_DIR, str(safe_path), as_attachment=False)
+    return send_from_directory(
+        DOC_DIR,
+        safe_path.as_posix(),
+        as_attachment=False,
+        conditional=True,
+        etag=True,
+        max_age=DOC_CACHE_MAX_AGE,
+    )
 
 
 if __name__ == '__main__':
-    # Production NOTE: use a proper WSGI server. For local demo, Flask is fine.
-    app.run(host='127.0.0.1', port=5000, debug=False) 
+    # Local demo only. For production use the threaded gunicorn setup:
+    #   gunicorn -c gunicorn.conf.py persistence_ui_memory:app
+    app.run(host='127.0.0.1', port=5000, debug=False, threaded=True)
+
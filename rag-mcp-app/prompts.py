@@ -0,0 +1,376 @@
+"""Prompt text shared by the RAG and MCP endpoints.
+
+Everything in this module is static so that it can form a stable prompt
+prefix: providers cache identical leading tokens across calls, so the large
+pieces (system prompts, the database schema) always come first and the
+per-request text (context chunks, the user's question) always comes last.
+
+Bump the matching ``*_PROMPT_VERSION`` whenever the text changes so logged
+token/cache statistics can be compared across prompt revisions.
+"""
+
+RAG_PROMPT_VERSION = "rag-v2"
+MCP_PROMPT_VERSION = "mcp-v3"
+
+# ---------------------------------------------------------------------------
+# /ask – document RAG
+# ---------------------------------------------------------------------------
+
+RAG_SYSTEM_PROMPT = (
+    "You are an HR assistant. Answer the user's question strictly based on the context "
+    "provided below. Cite facts with the bracketed numbers that precede each context "
+    "chunk (e.g., [1], [2]). If the context does not contain the answer, reply: "
+    "'I don't know based on the documents.'"
+)
+
+# ---------------------------------------------------------------------------
+# /ask_mcp – demo database over MCP
+# ---------------------------------------------------------------------------
+
+MCP_SYSTEM_PROMPT = """You are an assistant that can query the demo database by converting the user's prompt into a series of SQL queries. Answer the user's question strictly based on the provided context regarding the demo database. Use the MCP tool.
+
+Do not take the user prompt too literally (e.g. if the user prompt mentions find companies that are upset, no need to literally search for the “upset” label if it doesn’t exist. Instead, use whatever related labels, information, etc. that you find fit.)
+"""
+
+# Appended to MCP_SYSTEM_PROMPT when the schema is looked up through the
+# pg_schema tool instead of being sent with the prompt (the default)
+MCP_SCHEMA_TOOL_PROMPT = """Before writing SQL, call `pg_schema` with no arguments to list the tables, then `pg_schema` with `tables=[...]` for the columns, keys and relationships of only the tables you need. Do not guess table or column names.
+"""
+
+# Hand-maintained schema description, sent with the prompt only when
+# MCP_SCHEMA_IN_PROMPT=1. pg_schema reads the live catalog instead.
+MCP_SCHEMA_CONTEXT = """# DATABASE SCHEMA OVERVIEW
+
+## Available Tables (by Category)
+
+### 🔔 Alert Management
+- `alerts` - Main alert records
+- `alert_assignments` - Alert assignments to people
+- `approved_alerts` - Approved alert templates
+- `tag_definitions_on_alerts` - Tags applied to alerts
+
+### 🏢 Company & Organization
+- `companies` - Company information and details
+- `company_assignments` - People assigned to companies
+- `teams` - Team definitions
+- `team_members` - Team membership
+
+### 📧 Email & Communication
+- `emails` - Email records and metadata
+- `threads` - Email thread management
+- `email_anaylsis` - Email analysis results
+- `email_cluster_mapping` - Email clustering
+- `email_question_extractions` - Questions extracted from emails
+- `tags_on_emails` - Tags applied to emails
+- `notes_on_threads` - Notes on email threads
+
+### 👥 People & Employees
+- `people` - People records
+- `employees` - Employee information
+- `user_roles` - User role assignments
+- `role_permissions` - Role-based permissions
+
+### 💰 Payroll & Financial
+- `payroll` - Payroll records
+- `payroll_files` - Payroll file processing
+- `payroll_import` - Imported payroll data
+- `payitems` - Payroll item definitions
+
+### 📊 Analytics & Intelligence
+- `sentiment_trend_data` - Sentiment analysis trends
+- `sentiment_trend_view` - Sentiment trend views
+- `thread_analytics` - Thread analysis metrics
+- `thread_evaluations` - Thread evaluation results
+- `qa_pairs` - Q&A pairs for training
+- `stored_answers` - Cached answers
+
+### 🏷️ Tagging & Classification
+- `tag_definitions` - Tag definition templates
+- `dynamic_tag_definitions` - Dynamic tag definitions
+- `keywords` - Keyword definitions
+- `parent_clusters` - Parent clustering
+- `child_cluster` - Child clustering
+
+### 📄 Document Management
+- `documents` - Document metadata
+- `document_chunks` - Document text chunks
+- `buckets` - Storage buckets
+
+### ⚙️ System & Configuration
+- `app_config` - Application configuration
+- `prompts` - System prompts
+- `assignment_types` - Assignment type definitions
+- `assignments` - General assignments
+
+### 🔧 Utility & Testing
+- `test` - Test data
+- `amiup` - System status
+
+---
+
+## DETAILED TABLE SCHEMAS
+
+### 🔔 Alert Management
+
+#### alerts
+- `id` (integer) - Primary key
+- `date` (timestamp with time zone) - Alert date
+- `company` (text) - Company name
+- `body` (text) - Alert content
+- `status` (text) - Alert status
+- `sender` (text) - Sender information
+- `assignee` (text) - Assigned person
+- `client_status` (text) - Client status
+- `approved` (boolean) - Approval status
+- `email_id` (text) - Related email ID
+- `thread_id` (text) - Related thread ID
+- `tags` (ARRAY) - Applied tags
+- `company_id` (text) - Company reference
+- `is_company_alert` (boolean) - Company-level alert flag
+- `ai_approved` (boolean) - AI approval status
+- `is_sent` (boolean) - Sent status
+
+#### alert_assignments
+- `id` (integer) - Primary key
+- `person_id` (text) - Person reference
+- `subscription_type` (character varying) - Subscription type
+- `company_id` (text) - Company reference
+- `tag_definition_id` (integer) - Tag definition reference
+- `alert_id` (integer) - Alert reference
+- `receive_emails` (boolean) - Email preference
+
+### 🏢 Company & Organization
+
+#### companies
+- `id` (text) - Primary key
+- `name` (text) - Company name
+- `status` (text) - Company status
+- `is_customer` (boolean) - Customer flag
+- `summary` (text) - Company summary
+- `num_employees` (text) - Employee count
+- `client_code` (text) - Client identifier
+- `company_code` (text) - Company code
+- `strategicaccount` (boolean) - Strategic account flag
+- `created_at` (timestamp with time zone) - Creation date
+- `updated_at` (timestamp with time zone) - Last update
+- `last_contacted` (date) - Last contact date
+- `assignee` (text) - Assigned person
+- `payroll_schema` (jsonb) - Payroll configuration
+
+### 📧 Email & Communication
+
+#### emails
+- `id` (text) - Primary key
+- `sent_at` (timestamp without time zone) - Sent date
+- `subject` (text) - Email subject
+- `from_address` (text) - Sender address
+- `body` (text) - Email content
+- `thread_id` (text) - Thread reference
+- `company_id` (text) - Company reference
+- `nps` (smallint) - Net Promoter Score
+- `author_id` (double precision) - Author reference
+- `case_id` (double precision) - Case reference
+- `ai_analysis` (double precision) - AI analysis score
+- `processed_at` (double precision) - Processing timestamp
+- `created_at` (timestamp with time zone) - Creation date
+- `updated_at` (timestamp with time zone) - Last update
+- `customer_complaints` (ARRAY) - Complaint tags
+- `feature_requests` (ARRAY) - Feature request tags
+- `feedback` (ARRAY) - Feedback tags
+- `other_topics` (ARRAY) - Other topic tags
+- `cc_addresses` (ARRAY) - CC recipients
+- `to_addresses` (ARRAY) - TO recipients
+- `processed_for_keywords` (boolean) - Keyword processing status
+
+#### threads
+- `id` (text) - Primary key
+- `subject` (text) - Thread subject
+- `status` (text) - Thread status
+- `company_id` (text) - Company reference
+- `assignee_id` (text) - Assigned person
+- `is_public` (boolean) - Public visibility
+- `created_at` (timestamp with time zone) - Creation date
+- `updated_at` (timestamp with time zone) - Last update
+
+### 👥 People & Employees
+
+#### people
+- `id` (text) - Primary key
+- `firstname` (text) - First name
+- `lastname` (text) - Last name
+- `email` (text) - Email address
+- `phone` (text) - Phone number
+- `title` (text) - Job title
+- `is_internal` (boolean) - Internal employee flag
+- `is_deleted` (boolean) - Deletion status
+- `assignable` (boolean) - Assignment capability
+- `can_follow_alerts` (boolean) - Alert following permission
+- `tags` (jsonb) - Associated tags
+- `created_at` (text) - Creation date
+- `updated_at` (text) - Last update
+
+#### employees
+- `id` (text) - Primary key
+- `first_name` (character varying) - First name
+- `last_name` (character varying) - Last name
+- `middle_name` (text) - Middle name
+- `name_lookup` (ARRAY) - Name search terms
+- `work_location` (character varying) - Work location
+- `state_residency` (character varying) - State of residence
+- `pay_group` (character varying) - Payroll group
+- `pay_type` (character varying) - Payment type
+- `hourly_rate` (numeric) - Hourly rate
+- `emp_number` (numeric) - Employee number
+- `company_code` (text) - Company reference
+- `employment_status` (text) - Employment status
+- `company_id` (text) - Company reference
+- `date_added` (timestamp without time zone) - Hire date
+
+### 💰 Payroll & Financial
+
+#### payroll
+- `id` (integer) - Primary key
+- `session_id` (character varying) - Session identifier
+- `employee_id` (text) - Employee reference
+- `pay_group` (character varying) - Payroll group
+- `pay_item` (character varying) - Payroll item
+- `hours` (numeric) - Hours worked
+- `hourly_rate` (numeric) - Hourly rate
+- `total_dollar_amount` (numeric) - Total amount
+- `override_rate` (numeric) - Override rate
+- `date_added` (timestamp without time zone) - Entry date
+
+#### payroll_files
+- `id` (integer) - Primary key
+- `company_id` (text) - Company reference
+- `company_name` (text) - Company name
+- `email_id` (text) - Related email
+- `date` (timestamp with time zone) - File date
+- `file_id` (text) - File identifier
+- `original_file_name` (text) - Original filename
+- `processed` (boolean) - Processing status
+- `file_type` (character varying) - File type
+- `file_has_payroll_data` (boolean) - Payroll data flag
+- `email_body_has_payroll_data` (boolean) - Email payroll data flag
+- `email_body` (text) - Email content
+- `result` (jsonb) - Processing results
+- `current_data` (jsonb) - Current data
+- `original_data` (jsonb) - Original data
+- `submission_status` (USER-DEFINED) - Submission status
+- `submission_details` (jsonb) - Submission details
+
+### 📊 Analytics & Intelligence
+
+#### sentiment_trend_data
+- `month` (date) - Month
+- `average_nps` (numeric) - Average NPS score
+- `nps_count` (integer) - NPS response count
+- `last_updated` (timestamp with time zone) - Last update
+
+#### thread_analytics
+- `thread_id` (character varying) - Thread reference
+- `total_emails` (integer) - Total email count
+- `questions_extracted` (integer) - Questions extracted
+- `questions_answered` (integer) - Questions answered
+- `avg_resolution_time_hours` (numeric) - Average resolution time
+- `participants` (jsonb) - Participant data
+- `thread_start` (timestamp without time zone) - Thread start
+- `thread_end` (timestamp without time zone) - Thread end
+- `resolution_status` (character varying) - Resolution status
+- `last_analyzed` (timestamp with time zone) - Last analysis
+
+### 🏷️ Tagging & Classification
+
+#### tag_definitions
+- `id` (bigint) - Primary key
+- `prompt_id` (bigint) - Prompt reference
+- `name` (text) - Tag name
+- `display_name` (text) - Display name
+- `type` (text) - Tag type
+- `is_alert` (boolean) - Alert tag flag
+- `bucket_id` (numeric) - Bucket reference
+- `function_name` (text) - Function name
+- `is_company_level_tag` (boolean) - Company-level flag
+- `is_active` (boolean) - Active status
+
+#### keywords
+- `id` (bigint) - Primary key
+- `keyword_name` (text) - Keyword name
+- `bucket_id` (bigint) - Bucket reference
+- `created_at` (timestamp with time zone) - Creation date
+- `updated_at` (timestamp with time zone) - Last update
+
+### 📄 Document Management
+
+#### documents
+- `id` (uuid) - Primary key
+- `bucket` (text) - Storage bucket
+- `object_path` (text) - Object path
+- `filename` (text) - Filename
+- `mime_type` (text) - MIME type
+- `size_bytes` (bigint) - File size
+- `uploaded_at` (timestamp with time zone) - Upload date
+- `text_content` (text) - Document content
+- `owner` (uuid) - Owner reference
+- `created_at` (timestamp with time zone) - Creation date
+
+#### document_chunks
+- `id` (bigint) - Primary key
+- `document_id` (uuid) - Document reference
+- `chunk_index` (integer) - Chunk position
+- `start_char` (integer) - Start character
+- `end_char` (integer) - End character
+- `text` (text) - Chunk text
+- `tokens` (smallint) - Token count
+- `tsv` (tsvector) - Text search vector
+- `embedding` (USER-DEFINED) - Vector embedding
+
+### ⚙️ System & Configuration
+
+#### app_config
+- `key` (text) - Configuration key
+- `value` (text) - Configuration value
+- `description` (text) - Configuration description
+- `updated_at` (timestamp with time zone) - Last update
+
+#### prompts
+- `id` (bigint) - Primary key
+- `name` (text) - Prompt name
+- `prompt` (text) - Prompt content
+- `tag_name` (text) - Associated tag
+- `required` (text) - Required fields
+- `type` (text) - Prompt type
+- `bucket_id` (text) - Bucket reference
+- `display_names` (text) - Display names
+- `created_at` (timestamp with time zone) - Creation date
+- `updated_at` (timestamp with time zone) - Last update
+
+---
+
+## KEY RELATIONSHIPS
+
+### Company Relationships
+- `companies` ↔ `company_assignments` (via company_id)
+- `companies` ↔ `employees` (via company_id)
+- `companies` ↔ `alerts` (via company_id)
+
+### Email Relationships
+- `emails` ↔ `threads` (via thread_id)
+- `emails` ↔ `companies` (via company_id)
+- `emails` ↔ `tags_on_emails` (via email_id)
+
+### People Relationships
+- `people` ↔ `employees` (via id)
+- `people` ↔ `alert_assignments` (via person_id)
+- `people` ↔ `company_assignments` (via person_id)
+
+### Payroll Relationships
+- `payroll` ↔ `employees` (via employee_id)
+- `payroll_files` ↔ `companies` (via company_id)
+- `payroll_import` ↔ `payroll` (via session_id)
+
+### Tagging Relationships
+- `tag_definitions` ↔ `tags_on_emails` (via tag_definition_id)
+- `tag_definitions` ↔ `tag_definitions_on_alerts` (via tag_definition_id)
+- `keywords` ↔ `tags_on_emails` (via keyword_id)
+"""
@@ -1,9 +1,14 @@
 import os
 import json
+import hashlib
+import re
 import ssl
 from typing import Dict, List, Optional, Any, Tuple
+import threading
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 import openai
 import urllib3
 import requests  # Added for Groq HTTP requests
@@ -13,6 +18,52 @@ from datetime import datetime
 import urllib3
 from supabase import create_client  # NEW – Supabase Storage
 
+from concurrency import SingleFlight
+from extractive import best_sentence, is_extractive_hit
+from prompts import RAG_PROMPT_VERSION, RAG_SYSTEM_PROMPT
+
+
+def _rag_user_message(question: str, context: str) -> str:
+    """User turn for RAG generation: retrieved context first, question last.
+
+    Keeping the question at the very end lets the static system prompt plus
+    the context block line up as a prefix across retries of the same query.
+    """
+    return f"Context:\n{context}\n\nQuestion: {question}"
+
+
+def _usage_field(obj: Any, *names: str) -> Optional[int]:
+    """Read the first present attribute/key in *names* from an SDK object or dict."""
+    for name in names:
+        value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def log_token_usage(endpoint: str, prompt_version: str, usage: Any) -> None:
+    """Print token usage and provider prompt-cache hits for one LLM call.
+
+    Understands both Chat Completions (`prompt_tokens`, `prompt_tokens_details`)
+    and Responses API (`input_tokens`, `input_tokens_details`) usage shapes, as
+    well as plain dicts returned by OpenAI-compatible HTTP APIs such as Groq.
+    """
+    if not usage:
+        return
+
+    input_tokens = _usage_field(usage, 'input_tokens', 'prompt_tokens')
+    output_tokens = _usage_field(usage, 'output_tokens', 'completion_tokens')
+    details = _usage_field(usage, 'input_tokens_details', 'prompt_tokens_details')
+    cached_tokens = (_usage_field(details, 'cached_tokens') if details else None) or 0
+
+    hit_ratio = (cached_tokens / input_tokens) if input_tokens else 0.0
+    print(
+        f"[USAGE] endpoint={endpoint} prompt={prompt_version} "
+        f"input_tokens={input_tokens} cached_tokens={cached_tokens} "
+        f"cache_hit={hit_ratio:.0%} output_tokens={output_tokens}"
+    )
+
+
 # Connected to documents database (documents are vector stored)
 
 class RAGService:
@@ -28,6 +79,13 @@ class RAGService:
       OPENAI_API_KEY       — OpenAI key; if missing we fall back to returning the best chunk as the answer
       IGNORE_TLS_ERRORS    — Set to '1' to ignore TLS validation (development only)
       NODE_ENV             — Environment setting
+      RAG_EXTRACTIVE       — Set to '1' to answer high-confidence vector hits extractively (no LLM call)
+      RAG_EXTRACTIVE_MAX_DISTANCE — Max cosine distance of the top hit for the extractive path (default 0.2)
+      RAG_EXTRACTIVE_MIN_GAP      — Min distance gap between the top two hits (default 0.05)
+      RAG_DB_POOL_MAX      — Max pooled Postgres connections shared by request threads (default 10)
+      RAG_SINGLEFLIGHT_SHARED     — Set to '1' to also coalesce identical questions across worker processes
+      RAG_SINGLEFLIGHT_SHARED_TTL — Seconds a shared result may be reused by queued workers (default 30)
+      RAG_SINGLEFLIGHT_SHARED_WAIT — Seconds to wait for another worker's result before answering locally (default 10)
     """
     
     EMBED_MODEL = 'text-embedding-3-small'
@@ -82,8 +140,34 @@ class RAGService:
             'meta-llama/llama-4-scout-17b-16e-instruct',
         )
         
+        # ------------------------------------------------------------------
+        # Extractive fast path (optional)
+        # ------------------------------------------------------------------
+        # When the nearest chunk is a near-exact match and clearly ahead of
+        # the runner-up, return the best sentence from it instead of paying
+        # for a chat completion.
+        self.extractive_enabled = os.getenv('RAG_EXTRACTIVE') == '1'
+        self.extractive_max_distance = float(os.getenv('RAG_EXTRACTIVE_MAX_DISTANCE', '0.2'))
+        self.extractive_min_gap = float(os.getenv('RAG_EXTRACTIVE_MIN_GAP', '0.05'))
+
         if not self.database_url:
             raise ValueError('DATABASE_URL env var not set')
+
+        # Postgres pool shared by all request threads of this process. Created
+        # lazily so that forking servers (gunicorn) open it per worker.
+        self.db_pool_max = int(os.getenv('RAG_DB_POOL_MAX', '10'))
+        self._db_pool: Optional[ThreadedConnectionPool] = None
+        self._db_pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises instead of blocking when exhausted, so
+        # callers queue on this semaphore for a free slot.
+        self._db_pool_slots = threading.BoundedSemaphore(self.db_pool_max)
+
+        # Identical in-flight questions share one pipeline run; optionally
+        # across workers via a Postgres advisory lock.
+        self._single_flight = SingleFlight()
+        self.shared_single_flight = os.getenv('RAG_SINGLEFLIGHT_SHARED') == '1'
+        self.shared_single_flight_ttl = float(os.getenv('RAG_SINGLEFLIGHT_SHARED_TTL', '30'))
+        self.shared_single_flight_wait = float(os.getenv('RAG_SINGLEFLIGHT_SHARED_WAIT', '10'))
             
         self.openai_client = self._create_openai_client()
     
@@ -120,6 +204,10 @@ class RAGService:
     # Connect to postgres database
     def _get_db_connection(self) -> psycopg2.extensions.connection:
         """Create database connection with appropriate SSL settings."""
+        return psycopg2.connect(**self._db_conn_params())
+
+    def _db_conn_params(self) -> Dict[str, Any]:
+        """Connection keyword arguments shared by direct and pooled connections."""
         conn_params = psycopg2.extensions.parse_dsn(self.database_url)
         
         # Handle SSL configuration
@@ -129,7 +217,48 @@ class RAGService:
             conn_params['sslkey'] = None
             conn_params['sslrootcert'] = None
         
-        return psycopg2.connect(**conn_params)
+        return conn_params
+
+    def _acquire_db_connection(self) -> psycopg2.extensions.connection:
+        """Check out a pooled connection for request-path queries."""
+        if self._db_pool is None:
+            with self._db_pool_lock:
+                if self._db_pool is None:
+                    self._db_pool = ThreadedConnectionPool(1, self.db_pool_max, **self._db_conn_params())
+
+        self._db_pool_slots.acquire()
+        try:
+            conn = self._db_pool.getconn()
+        except Exception:
+            self._db_pool_slots.release()
+            raise
+        if conn.closed:
+            # Server closed it while idle; swap for a fresh one
+            self._db_pool.putconn(conn, close=True)
+            conn = self._db_pool.getconn()
+        return conn
+
+    def _release_db_connection(self, conn: psycopg2.extensions.connection) -> None:
+        """Return a connection obtained from `_acquire_db_connection`."""
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()  # end the implicit read transaction
+            except Exception:
+                broken = True
+        try:
+            self._db_pool.putconn(conn, close=broken)
+        except Exception as exc:
+            print(f"[WARN] Failed to return DB connection to pool: {exc}")
+        finally:
+            self._db_pool_slots.release()
+
+    def close(self) -> None:
+        """Close pooled database connections (call on process shutdown)."""
+        with self._db_pool_lock:
+            if self._db_pool is not None:
+                self._db_pool.closeall()
+                self._db_pool = None
     
     # Index question
     async def _embed_question(self, question: str) -> Optional[List[float]]:
@@ -217,12 +346,7 @@ class RAGService:
     # Generation
     def _generate_answer(self, question: str, context: str) -> str:
         """Generate answer using OpenAI's chat completion."""
-        system_prompt = (
-            "You are an HR assistant. Answer the user's question strictly based on the context "
-            "provided below. Cite facts with the bracketed numbers that precede each context "
-            "chunk (e.g., [1], [2]). If the context does not contain the answer, reply: "
-            "'I don't know based on the documents.'"
-        )
+        system_prompt = RAG_SYSTEM_PROMPT
 
         # ------------------------------------------------------------------
         # 1) Prefer Groq if GROQ_API_KEY is configured
@@ -243,10 +367,11 @@ class RAGService:
                 model='gpt-4o-mini',
                 messages=[
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Question: {question}\n\nContext:\n{context}"}
+                    {"role": "user", "content": _rag_user_message(question, context)}
                 ],
                 temperature=0.2
             )
+            log_token_usage('ask', RAG_PROMPT_VERSION, getattr(response, 'usage', None))
             return (
                 response.choices[0].message.content.strip()
                 if response.choices and response.choices[0].message.content
@@ -272,7 +397,7 @@ class RAGService:
             "model": self.groq_chat_model,
             "messages": [
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Question: {question}\n\nContext:\n{context}"},
+                {"role": "user", "content": _rag_user_message(question, context)},
             ],
             "temperature": 0.2,
         }
@@ -285,6 +410,7 @@ class RAGService:
             resp = requests.post(url, json=payload, headers=headers, timeout=30)
             resp.raise_for_status()
             data = resp.json()
+            log_token_usage('ask:groq', RAG_PROMPT_VERSION, data.get("usage"))
             if (
                 data.get("choices")
                 and isinstance(data["choices"], list)
@@ -299,9 +425,145 @@ class RAGService:
     def answer_question(self, question: str) -> Dict[str, Any]:
         """
         Main method to answer a question using RAG.
+
+        Identical questions that arrive while one is already being answered
+        wait for that run and share its result (see `_flight_key`).
         
         Returns:
-            Dict containing 'answer' and 'references'
+            Dict containing 'answer', 'references', 'extractive' (True when the
+            answer was lifted verbatim from the top chunk without an LLM call)
+            and 'shared' (True when the result came from another request's run)
+        """
+        key = self._flight_key(question)
+        result, shared = self._single_flight.do(key, lambda: self._answer_question_shared(key, question))
+        if shared and os.getenv("RAG_VERBOSE") == "1":
+            print(f"[DEBUG] Joined in-flight answer for key {key[:12]}")
+        return {**result, "shared": shared or result.get("shared", False)}
+
+    # ---------------------------------------------------------------------
+    # Request coalescing
+    # ---------------------------------------------------------------------
+
+    def _flight_key(self, question: str) -> str:
+        """Hash of the normalized question plus everything that shapes the answer.
+
+        Case, surrounding whitespace and trailing punctuation are ignored, so
+        "What is the PTO policy?" and "what is the pto policy" coalesce.
+        """
+        normalized = re.sub(r'\s+', ' ', question).strip().rstrip('?!. ').casefold()
+        params = [
+            normalized,
+            self.EMBED_MODEL,
+            str(self.MAX_CHUNKS),
+            RAG_PROMPT_VERSION,
+            self.groq_chat_model if self.groq_api_key else 'gpt-4o-mini',
+            f"{self.extractive_enabled}:{self.extractive_max_distance}:{self.extractive_min_gap}",
+        ]
+        return hashlib.sha256('\x1f'.join(params).encode('utf-8')).hexdigest()
+
+    def _answer_question_shared(self, key: str, question: str) -> Dict[str, Any]:
+        """Run the pipeline once per key across workers when RAG_SINGLEFLIGHT_SHARED=1.
+
+        The leader holds a Postgres advisory lock derived from *key* while it
+        answers and stores the result in `rag_answer_flights` (created by
+        documents_setup.sql). Other workers poll for that row, releasing
+        their connection between polls, and reuse it as long as it is younger
+        than RAG_SINGLEFLIGHT_SHARED_TTL seconds. After
+        RAG_SINGLEFLIGHT_SHARED_WAIT seconds without one they answer locally.
+        """
+        if not self.shared_single_flight:
+            return self._answer_question(question)
+
+        # Advisory locks take a signed 64-bit key
+        lock_id = int(key[:16], 16) - (1 << 63)
+        deadline = time.monotonic() + self.shared_single_flight_wait
+        delay = 0.05
+        while True:
+            conn = self._acquire_db_connection()
+            try:
+                with conn.cursor() as cur:
+                    # Read first: a missing table fails here, before any lock is held
+                    row = self._stored_flight(cur, key)
+                    locked = False
+                    if not row:
+                        cur.execute("SELECT pg_try_advisory_lock(%s)", (lock_id,))
+                        locked = cur.fetchone()[0]
+                conn.commit()
+            except psycopg2.errors.UndefinedTable:
+                print("[WARN] rag_answer_flights is missing (run documents_setup.sql); answering locally")
+                self._release_db_connection(conn)
+                return self._answer_question(question)
+            except Exception:
+                self._release_db_connection(conn)
+                raise
+            if locked:
+                return self._lead_flight(conn, lock_id, key, question)
+            # Follower: the lock is taken; never hold a connection while waiting
+            self._release_db_connection(conn)
+            if row:
+                return {**row[0], "shared": True}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"[WARN] No shared answer for key {key[:12]} after {self.shared_single_flight_wait:.0f}s; answering locally")
+                return self._answer_question(question)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 1.0)
+
+    def _stored_flight(self, cur, key: str) -> Optional[tuple]:
+        cur.execute(
+            """
+            SELECT result FROM rag_answer_flights
+            WHERE key = %s AND created_at > NOW() - make_interval(secs => %s)
+            """,
+            (key, self.shared_single_flight_ttl),
+        )
+        return cur.fetchone()
+
+    def _lead_flight(self, conn, lock_id: int, key: str, question: str) -> Dict[str, Any]:
+        """Answer while holding the advisory lock on *conn*, store the result, then release both."""
+        try:
+            # The previous leader may have finished between our poll and the lock
+            with conn.cursor() as cur:
+                row = self._stored_flight(cur, key)
+            # Session-level lock survives the commit; don't sit idle in a transaction
+            conn.commit()
+            if row:
+                return {**row[0], "shared": True}
+
+            result = self._answer_question(question, conn=conn)
+
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO rag_answer_flights (key, result, created_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (key) DO UPDATE SET result = EXCLUDED.result, created_at = EXCLUDED.created_at
+                    """,
+                    (key, json.dumps(result)),
+                )
+                cur.execute("DELETE FROM rag_answer_flights WHERE created_at < NOW() - INTERVAL '1 hour'")
+            conn.commit()
+            return result
+        finally:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT pg_advisory_unlock(%s)", (lock_id,))
+                    conn.commit()
+                except Exception as exc:
+                    # Closing the connection releases the lock server-side
+                    print(f"[WARN] Failed to release single-flight lock: {exc}")
+                    conn.close()
+            self._release_db_connection(conn)
+
+    def _answer_question(
+        self, question: str, conn: Optional[psycopg2.extensions.connection] = None
+    ) -> Dict[str, Any]:
+        """Run embed, retrieve and generate for one question.
+
+        *conn* lets a caller that already holds a pooled connection reuse it
+        for retrieval instead of checking out a second one.
         """
         verbose = os.getenv("RAG_VERBOSE") == "1"
 
@@ -322,7 +584,9 @@ class RAGService:
                 print(f"Error embedding question: {e}")
         
         # 2. Retrieval - Hybrid search in Postgres
-        conn = self._get_db_connection()
+        own_conn = conn is None
+        if own_conn:
+            conn = self._acquire_db_connection()
         
         try:
             hits = []
@@ -339,12 +603,24 @@ class RAGService:
                     print(f"[DEBUG] Full-text search returned {len(hits)} rows")
             
         finally:
-            conn.close()
+            if own_conn:
+                self._release_db_connection(conn)
         
         if not hits:
             return {
                 "answer": "I don't know based on the documents.",
-                "references": []
+                "references": [],
+                "extractive": False,
+            }
+
+        # Extractive fast path - skip generation for high-confidence lookups
+        if query_vec and self._is_extractive_hit(hits):
+            if verbose:
+                print(f"[DEBUG] Extractive answer (distance={hits[0]['distance']:.4f})")
+            return {
+                "answer": f"{best_sentence(question, hits[0]['cur'])} [1]",
+                "references": self._build_references(hits[:1]),
+                "extractive": True,
             }
         
         import os as _os
@@ -369,7 +645,14 @@ class RAGService:
             # Fallback: show the highest-ranked chunk
             answer = hits[0]['cur']
         
-        # Build references – ensure unique sources and align with [n] identifiers
+        return {
+            "answer": answer,
+            "references": self._build_references(hits),
+            "extractive": False,
+        }
+
+    def _build_references(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Build references – ensure unique sources and align with [n] identifiers."""
         seen = set()
         references = []
         for i, hit in enumerate(hits):
@@ -386,7 +669,7 @@ class RAGService:
                 base_link = supa_url
             else:
                 # Fallback to local filename - but warn user
-                base_link = base_name
+                base_link = os.path.basename(hit.get('filename', 'document'))
                 if hit.get('bucket') and hit.get('object_path'):
                     print(f"[WARN] Supabase Storage unavailable for {hit.get('bucket')}/{hit.get('object_path')}, using local fallback")
 
@@ -396,11 +679,17 @@ class RAGService:
                 "source": f"{base_link}#{hit['chunk_index']}",
                 "snippet": hit['cur']
             })
-        
-        return {
-            "answer": answer,
-            "references": references
-        }
+        return references
+
+    # ---------------------------------------------------------------------
+    # Extractive answering
+    # ---------------------------------------------------------------------
+
+    def _is_extractive_hit(self, hits: List[Dict[str, Any]]) -> bool:
+        """Return True when extractive answering is on and the top hit qualifies."""
+        return self.extractive_enabled and is_extractive_hit(
+            hits, self.extractive_max_distance, self.extractive_min_gap
+        )
 
     # ---------------------------------------------------------------------
     # Helpers
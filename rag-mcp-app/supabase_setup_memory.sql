@@ -42,4 +42,212 @@ CREATE POLICY "Allow anonymous delete" ON openai_memory_chats
 
 -- 5. Grant necessary permissions to the anon role
 GRANT ALL ON openai_memory_chats TO anon;
-GRANT USAGE, SELECT ON SEQUENCE openai_memory_chats_id_seq TO anon;
\ No newline at end of file
+GRANT USAGE, SELECT ON SEQUENCE openai_memory_chats_id_seq TO anon;
+
+-- 6. Session summary table maintained by triggers (backs GET /api/sessions)
+-- One row per session, so listing sessions no longer scans every message.
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    last_activity TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_order INTEGER NOT NULL DEFAULT 0
+);
+
+-- Installs that created chat_sessions before last_order existed
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS last_order INTEGER NOT NULL DEFAULT 0;
+
+-- Keyset pagination index: newest sessions first, session_id as tie-breaker
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_last_activity ON chat_sessions(last_activity DESC, session_id DESC);
+
+-- Triggers run as the table owner so the anon role only needs SELECT on chat_sessions
+CREATE OR REPLACE FUNCTION chat_sessions_on_message_insert() RETURNS TRIGGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    INSERT INTO chat_sessions AS s (session_id, created_at, last_activity, message_count, last_order)
+    VALUES (NEW.session_id, COALESCE(NEW.timestamp, NOW()), COALESCE(NEW.timestamp, NOW()), 1, NEW."order")
+    ON CONFLICT (session_id) DO UPDATE
+        SET last_activity = GREATEST(s.last_activity, EXCLUDED.last_activity),
+            message_count = s.message_count + 1,
+            last_order = GREATEST(s.last_order, EXCLUDED.last_order);
+    RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION chat_sessions_on_message_delete() RETURNS TRIGGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    UPDATE chat_sessions SET message_count = message_count - 1 WHERE session_id = OLD.session_id;
+    DELETE FROM chat_sessions WHERE session_id = OLD.session_id AND message_count <= 0;
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_chat_sessions_insert ON openai_memory_chats;
+CREATE TRIGGER trg_chat_sessions_insert
+    AFTER INSERT ON openai_memory_chats
+    FOR EACH ROW EXECUTE FUNCTION chat_sessions_on_message_insert();
+
+DROP TRIGGER IF EXISTS trg_chat_sessions_delete ON openai_memory_chats;
+CREATE TRIGGER trg_chat_sessions_delete
+    AFTER DELETE ON openai_memory_chats
+    FOR EACH ROW EXECUTE FUNCTION chat_sessions_on_message_delete();
+
+-- Backfill sessions that existed before the triggers were installed
+INSERT INTO chat_sessions (session_id, created_at, last_activity, message_count, last_order)
+SELECT session_id, MIN(timestamp), MAX(timestamp), COUNT(*), MAX("order")
+FROM openai_memory_chats
+GROUP BY session_id
+ON CONFLICT (session_id) DO UPDATE
+    SET last_order = GREATEST(chat_sessions.last_order, EXCLUDED.last_order);
+
+ALTER TABLE chat_sessions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow anonymous select" ON chat_sessions
+    FOR SELECT USING (true);
+
+GRANT SELECT ON chat_sessions TO anon;
+
+
+-- 7. Atomic append of one or more messages (backs POST /api/sessions/<id>/messages)
+-- Reserves a block of order numbers on the session row, then inserts the
+-- batch, all in one call. The row lock taken by the upsert serialises
+-- concurrent appends to the same session, so orders never collide.
+-- p_messages: JSON array of {"content": {...}, "response_id": "..."|null,
+--             "client_msg_id": "<uuid>"|null}
+-- client_msg_id makes retried appends idempotent: a message whose id is
+-- already stored is skipped (its reserved order number is left unused).
+ALTER TABLE openai_memory_chats ADD COLUMN IF NOT EXISTS client_msg_id UUID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_openai_memory_chats_client_msg_id
+    ON openai_memory_chats(client_msg_id) WHERE client_msg_id IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION append_chat_messages(p_session_id TEXT, p_messages JSONB)
+RETURNS TABLE (message_id INTEGER, message_order INTEGER)
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    v_count INTEGER := jsonb_array_length(p_messages);
+    v_last INTEGER;
+BEGIN
+    IF v_count = 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO chat_sessions AS s (session_id, last_order)
+    VALUES (p_session_id, v_count)
+    ON CONFLICT (session_id) DO UPDATE SET last_order = s.last_order + v_count
+    RETURNING s.last_order INTO v_last;
+
+    RETURN QUERY
+    INSERT INTO openai_memory_chats AS c (session_id, content, "order", response_id, client_msg_id, timestamp)
+    SELECT p_session_id,
+           m.value -> 'content',
+           v_last - v_count + m.idx::INTEGER,
+           m.value ->> 'response_id',
+           (m.value ->> 'client_msg_id')::UUID,
+           NOW()
+    FROM jsonb_array_elements(p_messages) WITH ORDINALITY AS m(value, idx)
+    ORDER BY m.idx
+    ON CONFLICT (client_msg_id) WHERE client_msg_id IS NOT NULL DO NOTHING
+    RETURNING c.id, c."order";
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION append_chat_messages(TEXT, JSONB) TO anon;
+
+
+-- 8. Latest OpenAI response id per session (backs the /ask_mcp response-id cache)
+-- response_version increments on every write so app workers can detect
+-- that another worker has moved the conversation on.
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS latest_response_id TEXT;
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS response_version INTEGER NOT NULL DEFAULT 0;
+
+UPDATE chat_sessions s
+SET latest_response_id = m.response_id
+FROM (
+    SELECT DISTINCT ON (session_id) session_id, response_id
+    FROM openai_memory_chats
+    WHERE response_id IS NOT NULL
+    ORDER BY session_id, "order" DESC
+) m
+WHERE s.session_id = m.session_id AND s.latest_response_id IS NULL;
+
+-- Compare-and-set: writes only when p_expected_version matches (or is NULL)
+-- and always returns the row as it is after the call. A successful write
+-- leaves response_version = p_expected_version + 1, also when it creates the row.
+CREATE OR REPLACE FUNCTION set_session_response_id(
+    p_session_id TEXT,
+    p_response_id TEXT,
+    p_expected_version INTEGER DEFAULT NULL
+)
+RETURNS TABLE (latest_response_id TEXT, response_version INTEGER)
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+#variable_conflict use_column
+BEGIN
+    INSERT INTO chat_sessions AS s (session_id, latest_response_id, response_version)
+    VALUES (p_session_id, p_response_id, COALESCE(p_expected_version, 0) + 1)
+    ON CONFLICT (session_id) DO UPDATE
+        SET latest_response_id = EXCLUDED.latest_response_id,
+            response_version = s.response_version + 1
+        WHERE p_expected_version IS NULL OR s.response_version = p_expected_version;
+
+    RETURN QUERY
+    SELECT s.latest_response_id, s.response_version
+    FROM chat_sessions s
+    WHERE s.session_id = p_session_id;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION set_session_response_id(TEXT, TEXT, INTEGER) TO anon;
+
+
+-- 9. Background MCP jobs (backs GET /api/jobs/<job_id> on workers that did not run the job)
+-- Written behind the request by the app's persistence queue when a job is
+-- queued and when it finishes.
+CREATE TABLE IF NOT EXISTS mcp_jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result JSONB,
+    error TEXT,
+    events JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_mcp_jobs_updated_at ON mcp_jobs(updated_at);
+
+ALTER TABLE mcp_jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow anonymous insert" ON mcp_jobs
+    FOR INSERT WITH CHECK (true);
+
+CREATE POLICY "Allow anonymous select" ON mcp_jobs
+    FOR SELECT USING (true);
+
+CREATE POLICY "Allow anonymous update" ON mcp_jobs
+    FOR UPDATE USING (true);
+
+GRANT SELECT, INSERT, UPDATE ON mcp_jobs TO anon;
+
+-- Old jobs can be cleared periodically, e.g.:
+-- DELETE FROM mcp_jobs WHERE updated_at < NOW() - INTERVAL '7 days';
+
+
+-- 10. Delete a session (backs DELETE /api/sessions/<id>)
+-- Removes the messages and the chat_sessions row together. The row can exist
+-- without any messages (set_session_response_id creates it), and would
+-- otherwise keep a stale latest_response_id and show up in the session list.
+CREATE OR REPLACE FUNCTION delete_chat_session(p_session_id TEXT)
+RETURNS INTEGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    deleted INTEGER;
+BEGIN
+    DELETE FROM openai_memory_chats WHERE session_id = p_session_id;
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+    DELETE FROM chat_sessions WHERE session_id = p_session_id;
+    RETURN deleted;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION delete_chat_session(TEXT) TO anon;
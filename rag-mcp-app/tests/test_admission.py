@@ -0,0 +1,78 @@
+"""AdmissionController queueing, rejection reasons and FIFO hand-off."""
+
+import threading
+import time
+
+import pytest
+
+import concurrency
+from concurrency import AdmissionController, AdmissionRejected
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+def test_full_queue_is_rejected_immediately():
+    admission = AdmissionController('ask', max_concurrent=1, max_queue=0, max_wait=30)
+    with admission.admit():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with admission.admit():
+                pass
+        with pytest.raises(AdmissionRejected):
+            admission.check()
+    assert rejected.value.reason == 'queue_full'
+    assert rejected.value.retry_after >= 1
+    assert admission.stats()['rejected']['queue_full'] == 2
+
+
+def test_expected_wait_beyond_the_deadline_is_rejected_up_front(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(concurrency, 'time', clock)
+    admission = AdmissionController('ask', max_concurrent=1, max_queue=5, max_wait=30)
+    with admission.admit():
+        clock.now += 4.0  # average service time is now 4s
+
+    with admission.admit():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with admission.admit(timeout=2):
+                pass
+        admission.check(timeout=10)  # a 10s deadline could still be met
+    assert rejected.value.reason == 'deadline'
+    assert rejected.value.retry_after == 4
+    assert admission.stats()['queued'] == 0
+
+
+def test_deadline_passing_while_queued_is_a_timeout():
+    admission = AdmissionController('ask', max_concurrent=1, max_queue=5, max_wait=0.05)
+    with admission.admit():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with admission.admit():
+                pass
+    assert rejected.value.reason == 'timeout'
+    stats = admission.stats()
+    assert stats['queued'] == 0 and stats['active'] == 0
+
+
+def test_queued_request_takes_the_freed_slot():
+    admission = AdmissionController('ask', max_concurrent=1, max_queue=5, max_wait=5)
+    waited = []
+
+    def queued():
+        with admission.admit() as seconds:
+            waited.append(seconds)
+
+    with admission.admit():
+        worker = threading.Thread(target=queued)
+        worker.start()
+        while admission.stats()['queued'] == 0:
+            time.sleep(0.001)
+    worker.join(5)
+
+    assert waited and waited[0] > 0
+    stats = admission.stats()
+    assert stats['admitted'] == 2 and stats['rejected'] == {'queue_full': 0, 'deadline': 0, 'timeout': 0}
@@ -0,0 +1,107 @@
+"""ResponseIdCache behaviour across workers sharing one chat_sessions table."""
+
+import pytest
+
+pytest.importorskip('supabase')
+
+from chat_store import ResponseIdCache  # noqa: E402
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Select:
+    def __init__(self, db):
+        self.db = db
+        self.session_id = None
+
+    def select(self, _columns):
+        return self
+
+    def eq(self, _column, value):
+        self.session_id = value
+        return self
+
+    def limit(self, _n):
+        return self
+
+    def execute(self):
+        row = self.db.rows.get(self.session_id)
+        return _Result([dict(row)] if row else [])
+
+
+class FakeSessions:
+    """chat_sessions plus the set_session_response_id function, in memory."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def table(self, _name):
+        return _Select(self)
+
+    def rpc(self, name, params):
+        assert name == 'set_session_response_id'
+        session_id, expected = params['p_session_id'], params['p_expected_version']
+        row = self.rows.get(session_id)
+        if row is None:
+            self.rows[session_id] = {
+                'latest_response_id': params['p_response_id'],
+                'response_version': (expected or 0) + 1,
+            }
+        elif expected is None or row['response_version'] == expected:
+            row['latest_response_id'] = params['p_response_id']
+            row['response_version'] += 1
+        return _Call(_Result([dict(self.rows[session_id])]))
+
+
+class _Call:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+@pytest.fixture
+def db():
+    return FakeSessions()
+
+
+def test_stale_worker_cannot_fork_the_conversation(db):
+    worker_a = ResponseIdCache(db, ttl=60)
+    worker_b = ResponseIdCache(db, ttl=60)
+
+    # Turn 1 on worker A; worker B caches the result
+    previous, version = worker_a.current('s1')
+    assert (previous, version) == (None, 0)
+    assert worker_a.set('s1', 'resp-1', version)
+    assert worker_b.current('s1') == ('resp-1', 1)
+
+    # Turn 2 lands on worker A; worker B's cached entry is now stale
+    previous, version = worker_a.current('s1')
+    assert worker_a.set('s1', 'resp-2', version)
+
+    # Turn 3 on worker B continues from its stale id and must be refused
+    stale_previous, stale_version = worker_b.current('s1')
+    assert stale_previous == 'resp-1'
+    assert not worker_b.set('s1', 'resp-3-forked', stale_version)
+    assert db.rows['s1'] == {'latest_response_id': 'resp-2', 'response_version': 2}
+
+    # ...and the re-run picks up the current id and succeeds
+    previous, version = worker_b.current('s1')
+    assert (previous, version) == ('resp-2', 2)
+    assert worker_b.set('s1', 'resp-3', version)
+    assert db.rows['s1'] == {'latest_response_id': 'resp-3', 'response_version': 3}
+
+
+def test_concurrent_first_turns_conflict(db):
+    worker_a = ResponseIdCache(db, ttl=60)
+    worker_b = ResponseIdCache(db, ttl=60)
+    _, version_a = worker_a.current('s2')
+    _, version_b = worker_b.current('s2')
+
+    assert worker_a.set('s2', 'resp-a', version_a)
+    assert not worker_b.set('s2', 'resp-b', version_b)
+    assert worker_b.current('s2') == ('resp-a', 1)
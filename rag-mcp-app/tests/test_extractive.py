@@ -0,0 +1,41 @@
+"""Thresholds of the extractive fast path and sentence selection."""
+
+import pytest
+
+from extractive import best_sentence, is_extractive_hit
+
+
+def hits(*distances):
+    return [{'distance': d, 'cur': ''} for d in distances]
+
+
+@pytest.mark.parametrize('distances, expected', [
+    ((0.10,), True),                # lone close hit
+    ((0.20,), True),                # at the distance limit
+    ((0.21,), False),               # too far
+    ((0.10, 0.16), True),           # clear lead over the runner-up
+    ((0.10, 0.14), False),          # runner-up too close to call
+    ((0.10, None), True),           # runner-up without a distance
+    ((None, 0.10), False),          # keyword hit, no distance
+    ((), False),
+])
+def test_extractive_hit_thresholds(distances, expected):
+    assert is_extractive_hit(hits(*distances), max_distance=0.2, min_gap=0.05) is expected
+
+
+def test_best_sentence_maximizes_content_word_overlap():
+    text = ("The office opens at 8am. Parking is free for employees.\n"
+            "The cafeteria closes at 3pm on Fridays!")
+    assert best_sentence('When does the cafeteria close on Fridays?', text) == \
+        'The cafeteria closes at 3pm on Fridays!'
+
+
+def test_best_sentence_ignores_stopwords_and_prefers_earlier_ties():
+    text = 'What is the policy? Is it the policy for you?'
+    # Only "policy" counts, and both sentences contain it
+    assert best_sentence('what is the policy for you', text) == 'What is the policy?'
+
+
+def test_best_sentence_without_sentence_breaks_returns_the_text():
+    assert best_sentence('anything', '  a single fragment  ') == 'a single fragment'
+    assert best_sentence('anything', '   ') == ''
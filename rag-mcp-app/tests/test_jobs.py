@@ -0,0 +1,72 @@
+"""JobManager admission, progress events and shutdown."""
+
+import threading
+
+import pytest
+
+from concurrency import AdmissionRejected
+from jobs import JobManager
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setenv('MCP_JOB_WORKERS', '1')
+    monkeypatch.setenv('MCP_JOB_MAX_PENDING', '2')
+    persisted = []
+    manager = JobManager(persist=persisted.append)
+    manager.persisted = persisted
+    yield manager
+    manager.close()
+
+
+def blocking(release):
+    def run(emit, **params):
+        emit({'type': 'started', **params})
+        release.wait(5)
+        return params
+    return run
+
+
+def test_submit_is_rejected_once_max_pending_jobs_are_queued(manager):
+    release = threading.Event()
+    running = manager.submit('ask', blocking(release), {'n': 0})
+    assert manager.get(running.id, wait=5)['status'] == 'running'
+    queued = [manager.submit('ask', blocking(release), {'n': n}) for n in (1, 2)]
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        manager.submit('ask', blocking(release), {'n': 3})
+
+    assert rejected.value.endpoint == 'jobs' and rejected.value.reason == 'queue_full'
+    assert rejected.value.retry_after >= 1
+    assert manager.stats()['queued'] == 2
+
+    release.set()
+    for job in [running] + queued:
+        assert manager.get(job.id, since=1, wait=5)['status'] == 'succeeded'
+    assert manager.submit('ask', blocking(release), {'n': 4}).status in ('queued', 'running')
+
+
+def test_events_and_result_are_reported_in_order(manager):
+    release = threading.Event()
+    job = manager.submit('ask', blocking(release), {'q': 'hi'})
+    first = manager.get(job.id, wait=5)
+    assert [e['type'] for e in first['events']] == ['started']
+
+    release.set()
+    events = list(manager.stream(job.id, since=first['next_event'], heartbeat=5))
+
+    assert events == [{'type': 'job.succeeded', 'result': {'q': 'hi'}, 'error': None}]
+    assert [s['status'] for s in manager.persisted] == ['queued', 'succeeded']
+
+
+def test_close_cancels_queued_jobs(manager):
+    release = threading.Event()
+    running = manager.submit('ask', blocking(release), {})
+    manager.get(running.id, wait=5)
+    queued = manager.submit('ask', blocking(release), {})
+
+    manager.close()
+    release.set()
+
+    assert manager.get(queued.id)['status'] == 'cancelled'
+    assert manager.get(running.id, since=1, wait=5)['status'] == 'succeeded'
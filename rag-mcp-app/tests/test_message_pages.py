@@ -0,0 +1,111 @@
+"""Message paging and the session ETag behind GET /api/sessions/<id>/messages."""
+
+import pytest
+
+pytest.importorskip('supabase')
+
+from chat_store import load_messages_page, session_messages_etag  # noqa: E402
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    """The PostgREST builder calls the endpoint uses, over a list of dicts."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def select(self, _columns):
+        return self
+
+    def eq(self, column, value):
+        return _Query(r for r in self.rows if r[column] == value)
+
+    def gt(self, column, value):
+        return _Query(r for r in self.rows if r[column] > value)
+
+    def lt(self, column, value):
+        return _Query(r for r in self.rows if r[column] < value)
+
+    def order(self, column, desc=False):
+        return _Query(sorted(self.rows, key=lambda r: r[column], reverse=desc))
+
+    def limit(self, n):
+        return _Query(self.rows[:n])
+
+    def execute(self):
+        return _Result([dict(r) for r in self.rows])
+
+
+class FakeChats:
+    """openai_memory_chats plus the chat_sessions summary the append RPC maintains."""
+
+    def __init__(self):
+        self.tables = {'openai_memory_chats': [], 'chat_sessions': []}
+
+    def table(self, name):
+        return _Query(self.tables[name])
+
+    def append(self, session_id, count):
+        messages = self.tables['openai_memory_chats']
+        for _ in range(count):
+            order = sum(1 for m in messages if m['session_id'] == session_id) + 1
+            messages.append({'session_id': session_id, 'order': order, 'content': f'm{order}'})
+        sessions = [s for s in self.tables['chat_sessions'] if s['session_id'] != session_id]
+        sessions.append({'session_id': session_id, 'message_count': order, 'last_order': order,
+                         'last_activity': f'2026-01-01T00:00:{order:02d}+00:00'})
+        self.tables['chat_sessions'] = sessions
+
+
+@pytest.fixture
+def db():
+    db = FakeChats()
+    db.append('s1', 5)
+    db.append('s2', 1)
+    return db
+
+
+def orders(page):
+    return [m['order'] for m in page['messages']]
+
+
+def test_etag_is_stable_until_the_session_changes(db):
+    etag = session_messages_etag(db, 's1')
+    # Unchanged session: the client's If-None-Match matches and gets a 304
+    assert session_messages_etag(db, 's1') == etag
+    assert session_messages_etag(db, 's2') != etag
+
+    db.append('s1', 1)
+
+    assert session_messages_etag(db, 's1') != etag
+
+
+def test_session_without_summary_row_has_no_etag(db):
+    assert session_messages_etag(db, 'missing') is None
+
+
+def test_newest_page_then_older_pages(db):
+    page = load_messages_page(db, 's1', limit=2)
+    assert orders(page) == [4, 5] and page['has_more']
+    assert (page['oldest_order'], page['newest_order']) == (4, 5)
+
+    page = load_messages_page(db, 's1', limit=2, before=page['oldest_order'])
+    assert orders(page) == [2, 3] and page['has_more']
+
+    page = load_messages_page(db, 's1', limit=2, before=page['oldest_order'])
+    assert orders(page) == [1] and not page['has_more']
+
+
+def test_delta_returns_only_newer_messages(db):
+    assert orders(load_messages_page(db, 's1', limit=50, after=5)) == []
+    db.append('s1', 3)
+    page = load_messages_page(db, 's1', limit=2, after=5)
+    assert orders(page) == [6, 7] and page['has_more']
+
+
+def test_empty_session(db):
+    page = load_messages_page(db, 'missing', limit=10)
+    assert page == {'messages': [], 'has_more': False, 'oldest_order': None, 'newest_order': None}
@@ -0,0 +1,81 @@
+"""SingleFlight shares one in-flight call between concurrent callers."""
+
+import threading
+import time
+
+import pytest
+
+from concurrency import SingleFlight
+
+
+def run_followers(flight, key, fn, count):
+    """Start *count* callers for *key* and wait until they are all parked on the leader."""
+    outcomes = []
+
+    def follow():
+        try:
+            outcomes.append(flight.do(key, fn))
+        except Exception as exc:
+            outcomes.append(exc)
+
+    threads = [threading.Thread(target=follow) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    while flight._calls[key].waiters < count:
+        time.sleep(0.001)
+    return threads, outcomes
+
+
+def test_followers_receive_the_leaders_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def answer():
+        calls.append(1)
+        release.wait(5)
+        return 'forty-two'
+
+    leader = []
+    leader_thread = threading.Thread(target=lambda: leader.append(flight.do('q', answer)))
+    leader_thread.start()
+    while not calls:
+        time.sleep(0.001)
+    threads, outcomes = run_followers(flight, 'q', answer, 3)
+    release.set()
+    for thread in threads + [leader_thread]:
+        thread.join(5)
+
+    assert calls == [1]
+    assert leader == [('forty-two', False)]
+    assert outcomes == [('forty-two', True)] * 3
+    assert flight.in_flight() == 0
+
+
+def test_followers_receive_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('upstream down')
+
+    leader_thread = threading.Thread(target=lambda: pytest.raises(RuntimeError, flight.do, 'q', fail))
+    leader_thread.start()
+    started.wait(5)
+    threads, outcomes = run_followers(flight, 'q', fail, 2)
+    release.set()
+    for thread in threads + [leader_thread]:
+        thread.join(5)
+
+    assert [str(exc) for exc in outcomes] == ['upstream down'] * 2
+
+
+def test_finished_calls_are_not_cached():
+    flight = SingleFlight()
+    calls = []
+    assert flight.do('q', lambda: calls.append(1) or len(calls)) == (1, False)
+    assert flight.do('q', lambda: calls.append(1) or len(calls)) == (2, False)
+    assert flight.do('other', lambda: 'x') == ('x', False)
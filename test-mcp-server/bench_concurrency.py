@@ -0,0 +1,73 @@
+"""Measure how many MCP tool calls the server runs concurrently.
+
+Fires batches of `pg_query` calls that each sleep in Postgres, at increasing
+concurrency, and prints throughput and latency per level. With blocking
+tools every level takes roughly `calls * sleep` seconds; with tools
+offloaded from the event loop the wall time shrinks as concurrency grows,
+up to the server's tool thread / connection pool size.
+
+Usage:
+    python bench_concurrency.py --levels 1 4 16 32 --calls 32 --sleep 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+from fastmcp import Client
+
+
+async def _timed_call(client, sql):
+    start = time.perf_counter()
+    await client.call_tool("pg_query", {"sql": sql})
+    return time.perf_counter() - start
+
+
+async def run_level(url, concurrency, calls, sleep):
+    sql = f"SELECT pg_sleep({sleep}) AS slept"
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    # One session per concurrent caller, as separate users would have
+    clients = [Client(url) for _ in range(concurrency)]
+    for client in clients:
+        await client.__aenter__()
+    try:
+        async def worker(i):
+            async with semaphore:
+                latencies.append(await _timed_call(clients[i % concurrency], sql))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(calls)))
+        wall = time.perf_counter() - start
+    finally:
+        for client in clients:
+            await client.__aexit__(None, None, None)
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(
+        f"concurrency={concurrency:>3}  calls={calls}  wall={wall:6.2f}s  "
+        f"throughput={calls / wall:6.1f}/s  p50={statistics.median(latencies):5.2f}s  p95={p95:5.2f}s"
+    )
+
+
+async def main():
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.getenv("MCP_SERVER_URL", "http://localhost:8080/mcp/"))
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--calls", type=int, default=32, help="tool calls per level")
+    parser.add_argument("--sleep", type=float, default=0.5, help="seconds each query sleeps in Postgres")
+    args = parser.parse_args()
+
+    print(f"Benchmarking {args.url}")
+    for level in args.levels:
+        await run_level(args.url, level, args.calls, args.sleep)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())